@@ -72,6 +72,7 @@ CREATE TABLE IF NOT EXISTS `StaticMapData` (
   `REV` INT UNSIGNED NOT NULL,
   `hex_id` INT UNSIGNED NOT NULL,
   `shard_id` INT UNSIGNED NOT NULL,
+  `warNumber` INT,
   `regionId` INT,
   `scorchedVictoryTowns` INT,
   `version` INT,
@@ -97,6 +98,7 @@ CREATE TABLE IF NOT EXISTS `DynamicMapData` (
   `regionId` INT,
   `scorchedVictoryTowns` INT,
   `version` INT,
+  `isKeyframe` BOOLEAN NOT NULL DEFAULT 1,
   PRIMARY KEY (id)
 );
 
@@ -110,6 +112,57 @@ CREATE TABLE IF NOT EXISTS `DynamicMapDataItem` (
   `y` DECIMAL(10,9),
   `flags` INT,
   `viewDirection` INT,
+  `deltaOp` CHAR(1),
+  PRIMARY KEY (id)
+);
+
+-- newest row of an entity per shard and hex, `hex_id` is 0 for WarState
+CREATE TABLE IF NOT EXISTS `LatestRow` (
+  `shard_id` INT UNSIGNED NOT NULL,
+  `hex_id` INT UNSIGNED NOT NULL,
+  `entity` VARCHAR(32) NOT NULL,
+  `row_id` INT UNSIGNED NOT NULL,
+  `REV` INT UNSIGNED NOT NULL,
+  PRIMARY KEY (shard_id, hex_id, entity)
+);
+
+-- last MapWarReport counters per time bucket, `hex_id` 0 holds totals of the shard
+CREATE TABLE IF NOT EXISTS `MapWarReportRollup` (
+  `shard_id` INT UNSIGNED NOT NULL,
+  `hex_id` INT UNSIGNED NOT NULL,
+  `resolution` INT UNSIGNED NOT NULL,
+  `bucket` DATETIME NOT NULL,
+  `REV` INT UNSIGNED NOT NULL,
+  `totalEnlistments` INT,
+  `colonialCasualties` INT,
+  `wardenCasualties` INT,
+  `dayOfWar` INT,
+  PRIMARY KEY (shard_id, hex_id, resolution, bucket)
+);
+
+
+-- highest REV of a table and shard thinned by retention per `keep_every` seconds
+CREATE TABLE IF NOT EXISTS `RetentionWatermark` (
+  `entity` VARCHAR(32) NOT NULL,
+  `shard_id` INT UNSIGNED NOT NULL,
+  `keep_every` INT UNSIGNED NOT NULL,
+  `REV` INT UNSIGNED NOT NULL,
+  PRIMARY KEY (entity, shard_id, keep_every)
+);
+
+-- `teamId` and `flags` changes of map items between snapshots of their hex
+CREATE TABLE IF NOT EXISTS `StructureEvent` (
+  `id` INT UNSIGNED AUTO_INCREMENT,
+  `REV` INT UNSIGNED NOT NULL,
+  `shard_id` INT UNSIGNED NOT NULL,
+  `hex_id` INT UNSIGNED NOT NULL,
+  `iconType` INT UNSIGNED,
+  `x` DECIMAL(10,9),
+  `y` DECIMAL(10,9),
+  `teamId` VARCHAR(20),
+  `previousTeamId` VARCHAR(20),
+  `flags` INT,
+  `previousFlags` INT,
   PRIMARY KEY (id)
 );
 
@@ -131,6 +184,35 @@ ALTER TABLE `StaticMapData` ADD FOREIGN KEY (`REV`) REFERENCES `REV` (`REV`);
 ALTER TABLE `DynamicMapData` ADD FOREIGN KEY (`REV`) REFERENCES `REV` (`REV`);
 ALTER TABLE `StaticMapDataItem` ADD FOREIGN KEY (`REV`) REFERENCES `REV` (`REV`);
 ALTER TABLE `DynamicMapDataItem` ADD FOREIGN KEY (`REV`) REFERENCES `REV` (`REV`);
+ALTER TABLE `LatestRow` ADD FOREIGN KEY (`shard_id`) REFERENCES `shard` (`id`);
+ALTER TABLE `LatestRow` ADD FOREIGN KEY (`REV`) REFERENCES `REV` (`REV`);
+ALTER TABLE `MapWarReportRollup` ADD FOREIGN KEY (`shard_id`) REFERENCES `shard` (`id`);
+ALTER TABLE `MapWarReportRollup` ADD FOREIGN KEY (`REV`) REFERENCES `REV` (`REV`);
+ALTER TABLE `RetentionWatermark` ADD FOREIGN KEY (`shard_id`) REFERENCES `shard` (`id`);
+ALTER TABLE `RetentionWatermark` ADD FOREIGN KEY (`REV`) REFERENCES `REV` (`REV`);
+ALTER TABLE `StructureEvent` ADD FOREIGN KEY (`shard_id`) REFERENCES `shard` (`id`);
+ALTER TABLE `StructureEvent` ADD FOREIGN KEY (`hex_id`) REFERENCES `hex` (`id`);
+ALTER TABLE `StructureEvent` ADD FOREIGN KEY (`iconType`) REFERENCES `StructureTypes` (`id`);
+ALTER TABLE `StructureEvent` ADD FOREIGN KEY (`REV`) REFERENCES `REV` (`REV`);
+
+-- indexes of the hot query patterns, see `__table_args__` of the models
+CREATE INDEX IF NOT EXISTS `ix_REV_tmstmp` ON `REV` (`tmstmp`);
+CREATE INDEX IF NOT EXISTS `ix_hex_name` ON `hex` (`name`);
+CREATE INDEX IF NOT EXISTS `ix_WarState_shard_REV` ON `WarState` (`shard_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_WarState_shard_war_REV` ON `WarState` (`shard_id`, `warNumber`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_MapWarReport_shard_hex_REV` ON `MapWarReport` (`shard_id`, `hex_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_MapWarReport_shard_REV` ON `MapWarReport` (`shard_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_StaticMapData_shard_hex_REV` ON `StaticMapData` (`shard_id`, `hex_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_StaticMapData_shard_war_hex_REV` ON `StaticMapData` (`shard_id`, `warNumber`, `hex_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_StaticMapDataItem_parent` ON `StaticMapDataItem` (`StaticMapData_id`, `id`);
+CREATE INDEX IF NOT EXISTS `ix_DynamicMapData_shard_hex_REV` ON `DynamicMapData` (`shard_id`, `hex_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_DynamicMapData_shard_REV` ON `DynamicMapData` (`shard_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_DynamicMapData_keyframe` ON `DynamicMapData` (`shard_id`, `hex_id`, `isKeyframe`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_DynamicMapDataItem_parent` ON `DynamicMapDataItem` (`DynamicMapData_id`, `id`);
+CREATE INDEX IF NOT EXISTS `ix_StructureEvent_shard_REV` ON `StructureEvent` (`shard_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_StructureEvent_shard_hex_REV` ON `StructureEvent` (`shard_id`, `hex_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_StructureEvent_shard_team_REV` ON `StructureEvent` (`shard_id`, `teamId`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_StructureEvent_shard_icon_REV` ON `StructureEvent` (`shard_id`, `iconType`, `REV`);
 
 INSERT INTO REV (tmstmp) VALUES
   (CURRENT_TIMESTAMP());
@@ -0,0 +1,4 @@
+-- Delta storage of DynamicMapDataItem (DYNAMIC_DELTA_STORAGE).
+-- Existing snapshots are full ones, so they all become keyframes.
+ALTER TABLE `DynamicMapData` ADD COLUMN IF NOT EXISTS `isKeyframe` BOOLEAN NOT NULL DEFAULT 1;
+ALTER TABLE `DynamicMapDataItem` ADD COLUMN IF NOT EXISTS `deltaOp` CHAR(1);
@@ -0,0 +1,12 @@
+-- Static map data is stored once per war and read by war number.
+ALTER TABLE `StaticMapData` ADD COLUMN IF NOT EXISTS `warNumber` INT;
+
+-- War of existing rows is the last war state of their shard stored up to their REV.
+UPDATE `StaticMapData` s
+SET s.`warNumber` = (
+  SELECT w.`warNumber` FROM `WarState` w
+  WHERE w.`shard_id` = s.`shard_id` AND w.`REV` <= s.`REV`
+  ORDER BY w.`REV` DESC
+  LIMIT 1
+)
+WHERE s.`warNumber` IS NULL;
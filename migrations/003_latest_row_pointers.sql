@@ -0,0 +1,51 @@
+-- Newest row of an entity per shard and hex, `hex_id` is 0 for WarState.
+CREATE TABLE IF NOT EXISTS `LatestRow` (
+  `shard_id` INT UNSIGNED NOT NULL,
+  `hex_id` INT UNSIGNED NOT NULL,
+  `entity` VARCHAR(32) NOT NULL,
+  `row_id` INT UNSIGNED NOT NULL,
+  `REV` INT UNSIGNED NOT NULL,
+  PRIMARY KEY (shard_id, hex_id, entity),
+  FOREIGN KEY (`shard_id`) REFERENCES `shard` (`id`),
+  FOREIGN KEY (`REV`) REFERENCES `REV` (`REV`)
+);
+
+-- Backfill from existing history. Newest row is the one with the highest REV, then id.
+INSERT INTO `LatestRow` (`shard_id`, `hex_id`, `entity`, `row_id`, `REV`)
+SELECT t.`shard_id`, 0, 'WarState', MAX(t.`id`), t.`REV`
+FROM `WarState` t
+JOIN (
+  SELECT `shard_id`, MAX(`REV`) AS `REV` FROM `WarState` GROUP BY `shard_id`
+) m ON m.`shard_id` = t.`shard_id` AND m.`REV` = t.`REV`
+GROUP BY t.`shard_id`, t.`REV`
+ON DUPLICATE KEY UPDATE `row_id` = VALUES(`row_id`), `REV` = VALUES(`REV`);
+
+INSERT INTO `LatestRow` (`shard_id`, `hex_id`, `entity`, `row_id`, `REV`)
+SELECT t.`shard_id`, t.`hex_id`, 'MapWarReport', MAX(t.`id`), t.`REV`
+FROM `MapWarReport` t
+JOIN (
+  SELECT `shard_id`, `hex_id`, MAX(`REV`) AS `REV`
+  FROM `MapWarReport` GROUP BY `shard_id`, `hex_id`
+) m ON m.`shard_id` = t.`shard_id` AND m.`hex_id` = t.`hex_id` AND m.`REV` = t.`REV`
+GROUP BY t.`shard_id`, t.`hex_id`, t.`REV`
+ON DUPLICATE KEY UPDATE `row_id` = VALUES(`row_id`), `REV` = VALUES(`REV`);
+
+INSERT INTO `LatestRow` (`shard_id`, `hex_id`, `entity`, `row_id`, `REV`)
+SELECT t.`shard_id`, t.`hex_id`, 'StaticMapData', MAX(t.`id`), t.`REV`
+FROM `StaticMapData` t
+JOIN (
+  SELECT `shard_id`, `hex_id`, MAX(`REV`) AS `REV`
+  FROM `StaticMapData` GROUP BY `shard_id`, `hex_id`
+) m ON m.`shard_id` = t.`shard_id` AND m.`hex_id` = t.`hex_id` AND m.`REV` = t.`REV`
+GROUP BY t.`shard_id`, t.`hex_id`, t.`REV`
+ON DUPLICATE KEY UPDATE `row_id` = VALUES(`row_id`), `REV` = VALUES(`REV`);
+
+INSERT INTO `LatestRow` (`shard_id`, `hex_id`, `entity`, `row_id`, `REV`)
+SELECT t.`shard_id`, t.`hex_id`, 'DynamicMapData', MAX(t.`id`), t.`REV`
+FROM `DynamicMapData` t
+JOIN (
+  SELECT `shard_id`, `hex_id`, MAX(`REV`) AS `REV`
+  FROM `DynamicMapData` GROUP BY `shard_id`, `hex_id`
+) m ON m.`shard_id` = t.`shard_id` AND m.`hex_id` = t.`hex_id` AND m.`REV` = t.`REV`
+GROUP BY t.`shard_id`, t.`hex_id`, t.`REV`
+ON DUPLICATE KEY UPDATE `row_id` = VALUES(`row_id`), `REV` = VALUES(`REV`);
@@ -0,0 +1,15 @@
+-- Composite indexes of the hot query patterns: latest per hex, REV ranges per shard
+-- and hex, static data of a war, keyframe lookups, REV by timestamp and items by parent.
+CREATE INDEX IF NOT EXISTS `ix_REV_tmstmp` ON `REV` (`tmstmp`);
+CREATE INDEX IF NOT EXISTS `ix_hex_name` ON `hex` (`name`);
+CREATE INDEX IF NOT EXISTS `ix_WarState_shard_REV` ON `WarState` (`shard_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_WarState_shard_war_REV` ON `WarState` (`shard_id`, `warNumber`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_MapWarReport_shard_hex_REV` ON `MapWarReport` (`shard_id`, `hex_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_MapWarReport_shard_REV` ON `MapWarReport` (`shard_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_StaticMapData_shard_hex_REV` ON `StaticMapData` (`shard_id`, `hex_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_StaticMapData_shard_war_hex_REV` ON `StaticMapData` (`shard_id`, `warNumber`, `hex_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_StaticMapDataItem_parent` ON `StaticMapDataItem` (`StaticMapData_id`, `id`);
+CREATE INDEX IF NOT EXISTS `ix_DynamicMapData_shard_hex_REV` ON `DynamicMapData` (`shard_id`, `hex_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_DynamicMapData_shard_REV` ON `DynamicMapData` (`shard_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_DynamicMapData_keyframe` ON `DynamicMapData` (`shard_id`, `hex_id`, `isKeyframe`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_DynamicMapDataItem_parent` ON `DynamicMapDataItem` (`DynamicMapData_id`, `id`);
@@ -0,0 +1,17 @@
+-- Last MapWarReport counters per time bucket, `hex_id` 0 holds totals of the shard.
+-- Rows are maintained by the ingestor. Fill them from existing history with
+--     python -m src.app.services.report_rollups
+CREATE TABLE IF NOT EXISTS `MapWarReportRollup` (
+  `shard_id` INT UNSIGNED NOT NULL,
+  `hex_id` INT UNSIGNED NOT NULL,
+  `resolution` INT UNSIGNED NOT NULL,
+  `bucket` DATETIME NOT NULL,
+  `REV` INT UNSIGNED NOT NULL,
+  `totalEnlistments` INT,
+  `colonialCasualties` INT,
+  `wardenCasualties` INT,
+  `dayOfWar` INT,
+  PRIMARY KEY (shard_id, hex_id, resolution, bucket),
+  FOREIGN KEY (`shard_id`) REFERENCES `shard` (`id`),
+  FOREIGN KEY (`REV`) REFERENCES `REV` (`REV`)
+);
@@ -0,0 +1,24 @@
+-- `teamId` and `flags` changes of map items between snapshots of their hex, detected
+-- by the ingestor. Events are only recorded from the first poll after this migration.
+CREATE TABLE IF NOT EXISTS `StructureEvent` (
+  `id` INT UNSIGNED AUTO_INCREMENT,
+  `REV` INT UNSIGNED NOT NULL,
+  `shard_id` INT UNSIGNED NOT NULL,
+  `hex_id` INT UNSIGNED NOT NULL,
+  `iconType` INT UNSIGNED,
+  `x` DECIMAL(10,9),
+  `y` DECIMAL(10,9),
+  `teamId` VARCHAR(20),
+  `previousTeamId` VARCHAR(20),
+  `flags` INT,
+  `previousFlags` INT,
+  PRIMARY KEY (id),
+  FOREIGN KEY (`shard_id`) REFERENCES `shard` (`id`),
+  FOREIGN KEY (`hex_id`) REFERENCES `hex` (`id`),
+  FOREIGN KEY (`iconType`) REFERENCES `StructureTypes` (`id`),
+  FOREIGN KEY (`REV`) REFERENCES `REV` (`REV`)
+);
+CREATE INDEX IF NOT EXISTS `ix_StructureEvent_shard_REV` ON `StructureEvent` (`shard_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_StructureEvent_shard_hex_REV` ON `StructureEvent` (`shard_id`, `hex_id`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_StructureEvent_shard_team_REV` ON `StructureEvent` (`shard_id`, `teamId`, `REV`);
+CREATE INDEX IF NOT EXISTS `ix_StructureEvent_shard_icon_REV` ON `StructureEvent` (`shard_id`, `iconType`, `REV`);
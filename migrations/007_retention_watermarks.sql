@@ -0,0 +1,11 @@
+-- Highest REV of a table and shard thinned by retention per `keep_every` seconds.
+-- Retention resumes from it after a restart instead of rescanning the whole history.
+CREATE TABLE IF NOT EXISTS `RetentionWatermark` (
+  `entity` VARCHAR(32) NOT NULL,
+  `shard_id` INT UNSIGNED NOT NULL,
+  `keep_every` INT UNSIGNED NOT NULL,
+  `REV` INT UNSIGNED NOT NULL,
+  PRIMARY KEY (entity, shard_id, keep_every),
+  FOREIGN KEY (`shard_id`) REFERENCES `shard` (`id`),
+  FOREIGN KEY (`REV`) REFERENCES `REV` (`REV`)
+);
@@ -1,35 +1,56 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
+from src.app.api.v1.http_cache import (
+    ResponseFormat,
+    cached_response,
+    encoded_response,
+    response_format,
+)
+from src.app.api.v1.pagination import decode_cursor, set_next_cursor
+from src.app.api.v1.streaming import ndjson_response
 from src.app.schemas.dynamic_map_data import DynamicMapData
-from src.app.database import crud
+from src.app.schemas.dynamic_map_data_compact import to_compact
+from src.app.database import crud, models
 from src.app.database.session import get_db
+from src.app.services.state_cache import state_cache
+from src.app.services.war_archive import war_archive
 
 router = APIRouter(prefix="/dynamic_data")
 
 
 @router.get(
     "/range/{shard_id}",
-    response_model=List[DynamicMapData],
+    response_class=StreamingResponse,
     tags=["dynamic_data"],
 )
 async def read_range_of_dynamic_war_data(
     shard_id: int,
     datetime_from: datetime,
     datetime_to: datetime,
-    war_number: Optional[int] = None,
-    skip: int = 0,
-    limit: int = 100,
-    db: AsyncSession = Depends(get_db),
 ):
     """
-    Endpoint not implemented due to permormance concerns.
+    Streams dynamic map data of all hexes on a shard for a range of dates, as newline-delimited
+    JSON. Each line is one snapshot of a hex with its items, ordered by REV.
     """
-    raise HTTPException(
-        status_code=501,
-        detail="Endpoint not implemented due to permormance concerns.",
+    if datetime_from >= datetime_to:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid datetime range. `from` should be smaller than `to`.",
+        )
+
+    return ndjson_response(
+        lambda db: war_archive.stream_REV(
+            db,
+            models.DynamicMapData,
+            crud.stream_dynamic_map_data_REV,
+            datetime_from,
+            datetime_to,
+            shard_id=shard_id,
+        )
     )
 
 
@@ -43,12 +64,17 @@ async def read_range_of_dynamic_war_data_for_hex(
     datetime_from: datetime,
     datetime_to: datetime,
     hex_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    stream: bool = False,
     db: AsyncSession = Depends(get_db),
 ):
     """
     Returns the dynamic war data for specific hex and shard for a range of dates.
+    With `stream`, the whole range is streamed as newline-delimited JSON, `skip` and `limit` are ignored.
+    Pages are ordered by REV. Pass `X-Next-Cursor` of a full page as `cursor` to get the next one.
     """
     filters = {"shard_id": shard_id}
     if hex_id:
@@ -60,16 +86,32 @@ async def read_range_of_dynamic_war_data_for_hex(
             detail="Invalid datetime range. `from` should be smaller than `to`.",
         )
 
-    dynamic_data = await crud.list_dynamic_map_data_REV(
+    if stream:
+        return ndjson_response(
+            lambda db: war_archive.stream_REV(
+                db,
+                models.DynamicMapData,
+                crud.stream_dynamic_map_data_REV,
+                datetime_from,
+                datetime_to,
+                **filters,
+            )
+        )
+
+    dynamic_data = await war_archive.list_REV(
         db,
+        models.DynamicMapData,
+        crud.list_dynamic_map_data_REV,
         datetime_from=datetime_from,
         datetime_to=datetime_to,
         skip=skip,
         limit=limit,
+        cursor=decode_cursor(cursor),
         **filters,
     )
-    if not dynamic_data:
+    if not dynamic_data and cursor is None:
         raise HTTPException(status_code=404, detail="Dynamic map dat not found.")
+    set_next_cursor(response, dynamic_data, limit)
     return dynamic_data
 
 
@@ -79,16 +121,38 @@ async def read_range_of_dynamic_war_data_for_hex(
     tags=["dynamic_data"],
 )
 async def read_current_dynamic_map_data_for_hex(
-    shard_id: int, hex_id: int, db: AsyncSession = Depends(get_db)
+    request: Request,
+    shard_id: int,
+    hex_id: int,
+    format: Optional[ResponseFormat] = None,
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Returns current/latest dynamic map data for a hex on a specific shard.
+    `format` (or `Accept`) selects the compact form of map items, as JSON or msgpack.
+    Served from `state_cache`, falls back to DB if the shard isn't cached.
     """
+    format = response_format(request, format)
+    cached = state_cache.get(shard_id)
+    if cached is not None:
+        if hex_id not in cached.dynamic_map_data:
+            raise HTTPException(status_code=404, detail="Dynamic map data not found.")
+        bodies = (
+            cached.dynamic_map_data
+            if format == "json"
+            else cached.dynamic_map_data_compact
+        )
+        return await cached_response(
+            request, cached, bodies[hex_id], "dynamic", shard_id, hex_id, format=format
+        )
+
     filters = {"shard_id": shard_id, "hex_id": hex_id}
 
     dynamic_data = await crud.get_dynamic_map_data_latest(db, **filters)
     if dynamic_data is None:
         raise HTTPException(status_code=404, detail="Dynamic map data not found.")
+    if format != "json":
+        return encoded_response(to_compact(dynamic_data), format)
     return dynamic_data
 
 
@@ -98,15 +162,34 @@ async def read_current_dynamic_map_data_for_hex(
     tags=["dynamic_data"],
 )
 async def read_map_war_report_all_hexes(
-    shard_id: int, db: AsyncSession = Depends(get_db)
+    request: Request,
+    shard_id: int,
+    format: Optional[ResponseFormat] = None,
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Returns current/latest dynamic map data for all hexes on a specific shard.
-    This can return 23k lines of formatted json. Be careful of overusing this endpoint.
+    This can return 23k lines of formatted json, the compact form selected by `format`
+    (or `Accept`) is several times smaller. Served prebuilt from `state_cache`,
+    falls back to DB if the shard isn't cached.
     """
+    format = response_format(request, format)
+    cached = state_cache.get(shard_id)
+    if cached is not None:
+        body = (
+            cached.dynamic_map_data_all
+            if format == "json"
+            else cached.dynamic_map_data_compact_all
+        )
+        return await cached_response(
+            request, cached, body, "dynamic", shard_id, "all", format=format
+        )
+
     filters = {"shard_id": shard_id}
 
     dynamic_data = await crud.list_dynamic_map_data_latest(db, **filters)
     if dynamic_data is None:
         raise HTTPException(status_code=404, detail="Dynamic map dat not found.")
+    if format != "json":
+        return encoded_response([to_compact(x) for x in dynamic_data], format)
     return dynamic_data
@@ -5,6 +5,7 @@ from typing import List
 from src.app.schemas import Hex
 from src.app.database import crud
 from src.app.database.session import get_db
+from src.app.services.identity_registry import identity_registry
 
 router = APIRouter(prefix="/hex")
 
@@ -26,7 +27,7 @@ async def read_hex(hex_id: int, db: AsyncSession = Depends(get_db)):
     """
     Retrieve a hex by `id`.
     """
-    hex = await crud.get_hex(db, id=hex_id)
+    hex = identity_registry.hexes_by_id.get(hex_id) or await crud.get_hex(db, id=hex_id)
     if hex is None:
         raise HTTPException(status_code=404, detail="Hex not found")
     return hex
@@ -1,11 +1,22 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from src.app.schemas import MapWarReport
-from src.app.database import crud
+from src.app.schemas.map_war_report import MapWarReportRollup
+from src.app.database import crud, models
+from src.app.api.v1.http_cache import cached_response
+from src.app.api.v1.pagination import decode_cursor, set_next_cursor
+from src.app.api.v1.streaming import ndjson_response
 from src.app.database.session import get_db
+from src.app.services.report_rollups import (
+    RESOLUTIONS,
+    bucket_start,
+    pick_resolution,
+)
+from src.app.services.state_cache import state_cache
+from src.app.services.war_archive import war_archive
 
 router = APIRouter(prefix="/map_report")
 
@@ -24,11 +35,19 @@ async def read_map_war_report_from_to(
     shard_id: int,
     datetime_from: datetime,
     datetime_to: datetime,
+    response: Response,
     hex_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    stream: bool = False,
     db: AsyncSession = Depends(get_db),
 ):
+    """
+    Returns map war reports of a shard, or of one hex, for a range of dates.
+    With `stream`, the whole range is streamed as newline-delimited JSON, `skip` and `limit` are ignored.
+    Pages are ordered by REV. Pass `X-Next-Cursor` of a full page as `cursor` to get the next one.
+    """
     filters = {"shard_id": shard_id}
     if hex_id:
         filters["hex_id"] = hex_id
@@ -39,28 +58,108 @@ async def read_map_war_report_from_to(
             detail="Invalid datetime range. `from` should be smaller than `to`.",
         )
 
-    mapwarreports = await crud.list_map_war_reports_REV(
+    if stream:
+        return ndjson_response(
+            lambda db: war_archive.stream_REV(
+                db,
+                models.MapWarReport,
+                crud.stream_map_war_reports_REV,
+                datetime_from,
+                datetime_to,
+                **filters,
+            )
+        )
+
+    mapwarreports = await war_archive.list_REV(
         db,
+        models.MapWarReport,
+        crud.list_map_war_reports_REV,
         datetime_from=datetime_from,
         datetime_to=datetime_to,
         skip=skip,
         limit=limit,
+        cursor=decode_cursor(cursor),
         **filters,
     )
-    if not mapwarreports:
+    if not mapwarreports and cursor is None:
         raise HTTPException(status_code=404, detail="Map war reports not found.")
+    set_next_cursor(response, mapwarreports, limit)
     return mapwarreports
 
 
+@router.get(
+    "/rollup/{shard_id}",
+    response_model=List[MapWarReportRollup],
+    tags=["map_war_report"],
+)
+@router.get(
+    "/rollup/{shard_id}/{hex_id}",
+    response_model=List[MapWarReportRollup],
+    tags=["map_war_report"],
+)
+async def read_map_war_report_rollup(
+    shard_id: int,
+    datetime_from: datetime,
+    datetime_to: datetime,
+    hex_id: int = 0,
+    resolution: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Enlistments and casualties of a hex, or totals of the shard without `hex_id`, in time buckets.
+    Each bucket holds the last values within it. A hex has no bucket where it didn't change.
+    `resolution` is the bucket size in seconds, one of 300, 3600 and 86400. By default it's
+    the finest one giving at most `ROLLUP_MAX_POINTS` buckets over the range.
+    """
+    if datetime_from >= datetime_to:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid datetime range. `from` should be smaller than `to`.",
+        )
+    if resolution is None:
+        resolution = pick_resolution(datetime_from, datetime_to)
+    elif resolution not in RESOLUTIONS:
+        raise HTTPException(
+            status_code=400, detail=f"Resolution must be one of {RESOLUTIONS}."
+        )
+
+    rollups = await crud.list_map_war_report_rollups(
+        db,
+        shard_id,
+        hex_id,
+        resolution,
+        bucket_start(datetime_from, resolution),
+        datetime_to,
+    )
+    if not rollups:
+        raise HTTPException(status_code=404, detail="Map war report rollups not found.")
+    return rollups
+
+
 @router.get(
     "/{shard_id}/{hex_id}",
     response_model=MapWarReport,
     tags=["map_war_report"],
 )
 async def read_map_war_report(
-    shard_id: int, hex_id: int, db: AsyncSession = Depends(get_db)
+    request: Request, shard_id: int, hex_id: int, db: AsyncSession = Depends(get_db)
 ):
-    """ """
+    """
+    Served from `state_cache`, falls back to DB if the shard isn't cached.
+    """
+    cached = state_cache.get(shard_id)
+    if cached is not None:
+        if hex_id not in cached.map_war_reports:
+            raise HTTPException(status_code=404, detail="Warstate not found.")
+        return await cached_response(
+            request,
+            cached,
+            cached.map_war_reports[hex_id],
+            "map_report",
+            shard_id,
+            hex_id,
+        )
+
     filters = {"shard_id": shard_id, "hex_id": hex_id}
 
     warstate = await crud.get_map_war_report_latest(db, **filters)
@@ -75,9 +174,17 @@ async def read_map_war_report(
     tags=["map_war_report"],
 )
 async def read_map_war_report_all_hexes(
-    shard_id: int, db: AsyncSession = Depends(get_db)
+    request: Request, shard_id: int, db: AsyncSession = Depends(get_db)
 ):
-    """ """
+    """
+    Served from `state_cache`, falls back to DB if the shard isn't cached.
+    """
+    cached = state_cache.get(shard_id)
+    if cached is not None:
+        return await cached_response(
+            request, cached, cached.map_war_reports_all, "map_report", shard_id, "all"
+        )
+
     filters = {"shard_id": shard_id}
 
     warstate = await crud.list_map_war_report_latest(db, **filters)
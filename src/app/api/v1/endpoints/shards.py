@@ -5,6 +5,7 @@ from typing import List
 from src.app.schemas import Shard
 from src.app.database import crud
 from src.app.database.session import get_db
+from src.app.services.identity_registry import identity_registry
 
 router = APIRouter(prefix="/shard")
 
@@ -25,7 +26,9 @@ async def read_shard(shard_id: int, db: AsyncSession = Depends(get_db)):
     """
     Retrieve a shard by `id`.
     """
-    hex = await crud.get_shard(db, id=shard_id)
+    hex = identity_registry.shards_by_id.get(shard_id) or await crud.get_shard(
+        db, id=shard_id
+    )
     if hex is None:
         raise HTTPException(status_code=404, detail="Shard not found")
     return hex
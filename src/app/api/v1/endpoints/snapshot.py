@@ -0,0 +1,60 @@
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from src.app.schemas.snapshot import ShardSnapshot
+from src.app.database import crud, models
+from src.app.database.session import get_db
+from src.app.services.identity_registry import identity_registry
+from src.app.services.rev_index import rev_index
+from src.app.services.war_archive import war_archive
+
+router = APIRouter(prefix="/at")
+
+
+@router.get("/{shard_id}", response_model=ShardSnapshot, tags=["snapshot"])
+@router.get("/{shard_id}/{hex_id}", response_model=ShardSnapshot, tags=["snapshot"])
+async def read_snapshot_at(
+    shard_id: int,
+    tmstmp: datetime,
+    hex_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Returns state of a shard, or of one hex, as it was at `tmstmp`: state of war, and
+    map war report and dynamic map data of every hex, each the last stored at or before
+    the last REV up to `tmstmp`. Times without a timezone are UTC.
+    """
+    if shard_id not in identity_registry.shards_by_id:
+        raise HTTPException(status_code=404, detail="Shard not found.")
+    if tmstmp.tzinfo is not None:
+        tmstmp = tmstmp.astimezone(timezone.utc).replace(tzinfo=None)
+    governing = rev_index.rev_at(tmstmp)
+    if governing is None:
+        raise HTTPException(status_code=404, detail="Nothing stored by then.")
+    rev, rev_tmstmp = governing
+
+    filters = {"shard_id": shard_id}
+    hex_filters = filters | ({"hex_id": hex_id} if hex_id else {})
+    war_states = await war_archive.list_at_REV(
+        db, models.WarState, crud.list_warstates_at_REV, rev, **filters
+    )
+    reports = await war_archive.list_at_REV(
+        db, models.MapWarReport, crud.list_map_war_reports_at_REV, rev, **hex_filters
+    )
+    dynamic = await war_archive.list_at_REV(
+        db,
+        models.DynamicMapData,
+        crud.list_dynamic_map_data_at_REV,
+        rev,
+        **hex_filters,
+    )
+    snapshot = {
+        "REV": rev,
+        "tmstmp": rev_tmstmp,
+        "warState": war_states[0] if war_states else None,
+        "mapWarReports": reports,
+        "dynamicMapData": dynamic,
+    }
+    return ShardSnapshot.model_validate(snapshot, from_attributes=True)
@@ -2,27 +2,69 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
+from src.app.schemas import StaticMapData
 from src.app.database import crud
 from src.app.database.session import get_db
 
 router = APIRouter(prefix="/static_data")
 
 
-@router.get("/{shard_id}", response_model=None)
+async def _resolve_war_number(
+    db: AsyncSession, shard_id: int, war_number: Optional[int]
+) -> int:
+    if war_number:
+        return war_number
+    warstate = await crud.get_warstate_latest(db, shard_id=shard_id)
+    if warstate is None:
+        raise HTTPException(status_code=404, detail="Warstate not found.")
+    return warstate.warNumber
+
+
+@router.get(
+    "/{shard_id}",
+    response_model=List[StaticMapData],
+    tags=["static_data"],
+)
 async def read_static_map_data(
     shard_id: int, war_number: Optional[int] = None, db: AsyncSession = Depends(get_db)
 ):
-    raise HTTPException(status_code=501, detail="Endpoint not implemented.")
+    """
+    Returns static map data of all hexes for a war on a specific shard.
+    Static map data is stored once per war. If no `war_number` is given, the currently active war is used.
+    """
+    filters = {
+        "shard_id": shard_id,
+        "warNumber": await _resolve_war_number(db, shard_id, war_number),
+    }
 
+    static_data = await crud.list_static_map_data_latest(db, **filters)
+    if not static_data:
+        raise HTTPException(status_code=404, detail="Static map data not found.")
+    return static_data
 
-@router.get("/{shard_id}", response_model=None)
-async def read_static_map_data_from_to(
+
+@router.get(
+    "/{shard_id}/{hex_id}",
+    response_model=StaticMapData,
+    tags=["static_data"],
+)
+async def read_static_map_data_for_hex(
     shard_id: int,
+    hex_id: int,
     war_number: Optional[int] = None,
-    datetime_from: Optional[int] = None,
-    datetime_to: Optional[int] = None,
-    skip: int = 0,
-    limit: int = 100,
     db: AsyncSession = Depends(get_db),
 ):
-    raise HTTPException(status_code=501, detail="Endpoint not implemented.")
+    """
+    Returns static map data of a hex for a war on a specific shard.
+    If no `war_number` is given, the currently active war is used.
+    """
+    filters = {
+        "shard_id": shard_id,
+        "hex_id": hex_id,
+        "warNumber": await _resolve_war_number(db, shard_id, war_number),
+    }
+
+    static_data = await crud.list_static_map_data_latest(db, **filters)
+    if not static_data:
+        raise HTTPException(status_code=404, detail="Static map data not found.")
+    return static_data[0]
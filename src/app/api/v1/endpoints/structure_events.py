@@ -0,0 +1,66 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from src.app.schemas.structure_event import StructureEvent
+from src.app.database import crud
+from src.app.api.v1.pagination import decode_cursor, set_next_cursor
+from src.app.database.session import get_db
+
+router = APIRouter(prefix="/events")
+
+
+@router.get(
+    "/{shard_id}",
+    response_model=List[StructureEvent],
+    tags=["structure_events"],
+)
+@router.get(
+    "/{shard_id}/{hex_id}",
+    response_model=List[StructureEvent],
+    tags=["structure_events"],
+)
+async def read_structure_events(
+    shard_id: int,
+    datetime_from: datetime,
+    datetime_to: datetime,
+    response: Response,
+    hex_id: Optional[int] = None,
+    team_id: Optional[str] = None,
+    icon_type: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Returns ownership and flag changes of structures of a shard, or of one hex, for a range
+    of dates. `team_id` keeps changes to that team, `icon_type` changes of that structure type.
+    Pages are ordered by REV. Pass `X-Next-Cursor` of a full page as `cursor` to get the next one.
+    """
+    filters = {"shard_id": shard_id}
+    if hex_id:
+        filters["hex_id"] = hex_id
+    if team_id is not None:
+        filters["teamId"] = team_id
+    if icon_type is not None:
+        filters["iconType"] = icon_type
+
+    if datetime_from >= datetime_to:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid datetime range. `from` should be smaller than `to`.",
+        )
+
+    events = await crud.list_structure_events_REV(
+        db,
+        datetime_from=datetime_from,
+        datetime_to=datetime_to,
+        skip=skip,
+        limit=limit,
+        cursor=decode_cursor(cursor),
+        **filters,
+    )
+    set_next_cursor(response, events, limit)
+    return events
@@ -0,0 +1,81 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Query, WebSocket, status
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional
+
+from src.app.core.config import settings
+from src.app.services.change_feed import Subscription, change_feed
+from src.app.services.identity_registry import identity_registry
+
+router = APIRouter(prefix="/updates")
+
+# Notification of a stored poll, as sent by both endpoints:
+# {"shard_id": 1, "REV": 123, "warNumber": 130, "war_state": true,
+#  "map_war_report": [hex ids], "static_map_data": [...], "dynamic_map_data": [...]}
+# Hex lists hold hexes stored by the poll, an endpoint not polled is left out.
+
+
+async def _wait_for_disconnect(websocket: WebSocket, subscription: Subscription):
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+    change_feed.unsubscribe(subscription)
+
+
+@router.websocket("/ws/{shard_id}")
+async def subscribe_websocket(
+    websocket: WebSocket, shard_id: int, hex_id: Optional[List[int]] = Query(None)
+):
+    """
+    Sends a notification of every poll stored for the shard, or with `hex_id` given,
+    of polls which stored one of those hexes. Slow clients are closed with code 1013,
+    they should reconnect and refetch what they need.
+    """
+    if shard_id not in identity_registry.shards_by_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    subscription = change_feed.subscribe(shard_id, hex_id)
+    receiver = asyncio.create_task(_wait_for_disconnect(websocket, subscription))
+    try:
+        while (message := await subscription.get()) is not None:
+            await websocket.send_text(message.decode())
+        if subscription.dropped:
+            await websocket.close(
+                code=status.WS_1013_TRY_AGAIN_LATER, reason="Too many unread updates."
+            )
+    finally:
+        receiver.cancel()
+        change_feed.unsubscribe(subscription)
+
+
+@router.get("/sse/{shard_id}", response_class=StreamingResponse, tags=["updates"])
+async def subscribe_sse(shard_id: int, hex_id: Optional[List[int]] = Query(None)):
+    """
+    Server-Sent Events version of `/updates/ws/{shard_id}`, notifications are sent
+    as `rev` events. Slow clients get their stream ended.
+    """
+    if shard_id not in identity_registry.shards_by_id:
+        raise HTTPException(status_code=404, detail="Shard not found.")
+    subscription = change_feed.subscribe(shard_id, hex_id)
+
+    async def events() -> AsyncIterator[bytes]:
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(
+                        subscription.get(), settings.FEED_KEEPALIVE
+                    )
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield b"event: rev\ndata: " + message + b"\n\n"
+        finally:
+            change_feed.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
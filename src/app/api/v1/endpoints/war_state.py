@@ -1,11 +1,16 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from src.app.schemas import WarState
-from src.app.database import crud
+from src.app.database import crud, models
+from src.app.api.v1.http_cache import cached_response
+from src.app.api.v1.pagination import decode_cursor, set_next_cursor
+from src.app.api.v1.streaming import ndjson_response
 from src.app.database.session import get_db
+from src.app.services.state_cache import state_cache
+from src.app.services.war_archive import war_archive
 
 router = APIRouter(prefix="/war_state")
 
@@ -18,11 +23,19 @@ async def read_war_state_from_to(
     shard_id: int,
     datetime_from: datetime,
     datetime_to: datetime,
+    response: Response,
     war_number: Optional[int] = None,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    stream: bool = False,
     db: AsyncSession = Depends(get_db),
 ):
+    """
+    Returns states of war of a shard for a range of dates.
+    With `stream`, the whole range is streamed as newline-delimited JSON, `skip` and `limit` are ignored.
+    Pages are ordered by REV. Pass `X-Next-Cursor` of a full page as `cursor` to get the next one.
+    """
     filters = {"shard_id": shard_id}
     if war_number:
         filters["warNumber"] = war_number
@@ -33,29 +46,59 @@ async def read_war_state_from_to(
             detail="Invalid datetime range. `from` should be smaller than `to`.",
         )
 
-    warstates = await crud.list_warstates_REV(
+    if stream:
+        return ndjson_response(
+            lambda db: war_archive.stream_REV(
+                db,
+                models.WarState,
+                crud.stream_warstates_REV,
+                datetime_from,
+                datetime_to,
+                **filters,
+            )
+        )
+
+    warstates = await war_archive.list_REV(
         db,
+        models.WarState,
+        crud.list_warstates_REV,
         datetime_from=datetime_from,
         datetime_to=datetime_to,
         skip=skip,
         limit=limit,
+        cursor=decode_cursor(cursor),
         **filters,
     )
-    if not warstates:
+    if not warstates and cursor is None:
         raise HTTPException(status_code=404, detail="Warstates not found.")
+    set_next_cursor(response, warstates, limit)
     return warstates
 
 
 @router.get("/{shard_id}", response_model=WarState, tags=["war_state"])
 @router.get("/{shard_id}/{war_number}", response_model=WarState, tags=["war_state"])
 async def read_war_state(
-    shard_id: int, war_number: Optional[int] = None, db: AsyncSession = Depends(get_db)
+    request: Request,
+    shard_id: int,
+    war_number: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Get state of war for given shard.
     If no `war_number` is given, the currently active war is returned.
     If `war_number` is given, then the last state of given war is given, as long as that war_number is in database.
+    State of the current war is served from `state_cache`, with ETag and Last-Modified.
     """
+    cached = state_cache.get(shard_id)
+    if (
+        cached is not None
+        and cached.war_state is not None
+        and war_number in (None, cached.war_number)
+    ):
+        return await cached_response(
+            request, cached, cached.war_state, "war_state", shard_id
+        )
+
     filters = {"shard_id": shard_id}
     if war_number:
         filters["warNumber"] = war_number
@@ -0,0 +1,111 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.app.schemas.world_map import WorldMapHex, WorldMapItem
+from src.app.core.config import settings
+from src.app.services.identity_registry import identity_registry
+from src.app.services.spatial_index import SpatialGrid, Source, spatial_index
+from src.app.services.world_map import HEX_HEIGHT, HEX_LAYOUT, HEX_WIDTH, hex_origin
+
+router = APIRouter(prefix="/world")
+
+
+def _grid(shard_id: int, source: str) -> SpatialGrid:
+    if shard_id not in identity_registry.shards_by_id:
+        raise HTTPException(status_code=404, detail="Shard not found.")
+    grid = spatial_index.get(shard_id, source)
+    if grid is None:
+        raise HTTPException(status_code=404, detail="Map items not found.")
+    return grid
+
+
+def _matches(
+    item: Dict[str, Any], icon_type: Optional[List[int]], team_id: Optional[str]
+) -> bool:
+    return (icon_type is None or item.get("iconType") in icon_type) and (
+        team_id is None or item.get("teamId") == team_id
+    )
+
+
+def _take(
+    items: Iterable[Dict[str, Any]],
+    icon_type: Optional[List[int]],
+    team_id: Optional[str],
+    limit: int,
+) -> List[Dict[str, Any]]:
+    out = []
+    for item in items:
+        if _matches(item, icon_type, team_id):
+            out.append(item)
+            if len(out) >= limit:
+                break
+    return out
+
+
+@router.get("/layout", response_model=List[WorldMapHex], tags=["world"])
+async def read_world_layout():
+    """
+    Returns position of every hex in world coordinates, to project hex-local `x` and `y`
+    of map items: `worldX + x * width`, `worldY + y * height`.
+    """
+    out = []
+    for name in sorted(HEX_LAYOUT.keys() | settings.HEX_LAYOUT_JSON.keys()):
+        world_x, world_y = hex_origin(name)
+        out.append(
+            WorldMapHex(
+                name=name,
+                worldX=world_x,
+                worldY=world_y,
+                width=HEX_WIDTH,
+                height=HEX_HEIGHT,
+            )
+        )
+    return out
+
+
+@router.get("/{shard_id}/bbox", response_model=List[WorldMapItem], tags=["world"])
+async def read_items_in_bbox(
+    shard_id: int,
+    x_min: float,
+    y_min: float,
+    x_max: float,
+    y_max: float,
+    source: Source = "dynamic",
+    icon_type: Optional[List[int]] = Query(None),
+    team_id: Optional[str] = None,
+    limit: int = 1000,
+):
+    """
+    Returns latest map items of a shard within a box of world coordinates, across hexes.
+    `source` picks dynamic items (structures) or static ones (place names).
+    Filter by `icon_type` (repeatable) and `team_id`.
+    """
+    if x_min > x_max or y_min > y_max:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid box. `min` should not be larger than `max`.",
+        )
+    grid = _grid(shard_id, source)
+    return _take(grid.bbox(x_min, y_min, x_max, y_max), icon_type, team_id, limit)
+
+
+@router.get("/{shard_id}/radius", response_model=List[WorldMapItem], tags=["world"])
+async def read_items_in_radius(
+    shard_id: int,
+    x: float,
+    y: float,
+    r: float,
+    source: Source = "dynamic",
+    icon_type: Optional[List[int]] = Query(None),
+    team_id: Optional[str] = None,
+    limit: int = 1000,
+):
+    """
+    Returns latest map items of a shard within `r` meters of a point in world coordinates,
+    nearest first, with their `distance`. Filters are those of `/bbox`.
+    """
+    if r <= 0:
+        raise HTTPException(status_code=400, detail="Radius should be positive.")
+    grid = _grid(shard_id, source)
+    items = (item | {"distance": d} for d, item in grid.radius(x, y, r))
+    return _take(items, icon_type, team_id, limit)
@@ -0,0 +1,162 @@
+import gzip
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Callable, Dict, Literal, Optional
+
+import msgspec
+from fastapi import Request, Response
+
+from src.app.core.config import settings
+from src.app.services.state_cache import CachedBody, ShardState
+
+try:
+    import zstandard
+except ImportError:  # optional, see `zstd` extra
+    zstandard = None
+
+# Response formats of dynamic map data. `compact` and `msgpack` are the compact form,
+# see `schemas.dynamic_map_data_compact`, as JSON and MessagePack.
+ResponseFormat = Literal["json", "compact", "msgpack"]
+MEDIA_TYPES: Dict[str, str] = {
+    "json": "application/json",
+    "compact": "application/vnd.foxhole.compact+json",
+    "msgpack": "application/msgpack",
+}
+
+# Content encodings by preference. Cached bodies are compressed once per REV,
+# so levels favour size over speed.
+ENCODERS: Dict[str, Callable[[bytes], bytes]] = {
+    "gzip": lambda x: gzip.compress(x, compresslevel=9),
+}
+if zstandard is not None:
+    ENCODERS = {
+        "zstd": lambda x: zstandard.ZstdCompressor(level=19).compress(x)
+    } | ENCODERS
+
+
+def make_etag(*parts: Any) -> str:
+    return 'W/"' + "-".join(str(x) for x in parts) + '"'
+
+
+def response_format(request: Request, format: Optional[str] = None) -> str:
+    """
+    Format asked for by `format` query parameter, or else by `Accept` header.
+    The first known media type of `Accept` wins, q-values are not weighed.
+    """
+    if format is not None:
+        return format
+    for part in request.headers.get("accept", "").split(","):
+        media_type = part.partition(";")[0].strip().lower()
+        for name, known in MEDIA_TYPES.items():
+            if media_type == known:
+                return name
+    return "json"
+
+
+def content_encoding(request: Request) -> Optional[str]:
+    """
+    Most preferred of `ENCODERS` the client accepts, None for identity.
+    """
+    accepted: Dict[str, float] = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in ENCODERS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def encoded_response(content: Any, format: str) -> Response:
+    """
+    Uncached response of compact `content`, used when DB has to be queried.
+    """
+    if format == "msgpack":
+        body = msgspec.msgpack.encode(content)
+    else:
+        body = msgspec.json.encode(content)
+    return Response(content=body, media_type=MEDIA_TYPES[format])
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    tags = [x.strip().removeprefix("W/") for x in header.split(",")]
+    return etag.removeprefix("W/") in tags
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+async def cached_response(
+    request: Request,
+    shard: ShardState,
+    body: CachedBody,
+    *key: Any,
+    format: str = "json",
+) -> Response:
+    """
+    Response of a `state_cache` body with validators derived from its REV: weak ETag of
+    `key`, `format` and the REV, Last-Modified of the REV. Data only changes with a new
+    REV, so conditional requests matching them get an empty 304.
+    `body` holds JSON of `format`, msgpack is converted from it. Bodies of at least
+    `HTTP_COMPRESS_MIN_SIZE` bytes are compressed by the negotiated encoding.
+    Conversions and compressions are kept in `body`, so each is done once per REV,
+    off the event loop.
+    """
+    etag = (
+        make_etag(*key, body.rev)
+        if format == "json"
+        else make_etag(*key, body.rev, format)
+    )
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.HTTP_CACHE_MAX_AGE}, must-revalidate",
+        "Vary": "Accept, Accept-Encoding",
+    }
+    last_modified = shard.rev_times.get(body.rev)
+    if last_modified is not None:
+        # REV timestamps are stored in UTC
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    else:
+        not_modified = (
+            if_modified_since is not None
+            and last_modified is not None
+            and _not_modified_since(if_modified_since, last_modified)
+        )
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    content = body.content
+    if format == "msgpack":
+        content = await body.variant(
+            format, lambda: msgspec.msgpack.encode(msgspec.json.decode(body.content))
+        )
+    encoding = content_encoding(request)
+    if encoding is not None and len(content) >= settings.HTTP_COMPRESS_MIN_SIZE:
+        raw = content
+        content = await body.variant(
+            f"{format}+{encoding}", lambda: ENCODERS[encoding](raw)
+        )
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type=MEDIA_TYPES[format], headers=headers)
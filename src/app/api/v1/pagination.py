@@ -0,0 +1,34 @@
+import base64
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+
+# header carrying cursor of the next page, absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(row: Any) -> str:
+    """
+    Opaque token of the (REV, id) position of `row`.
+    """
+    raw = f"{row.REV}:{row.id}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[int, int]]:
+    if token is None:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        rev, id_ = raw.split(":")
+        return int(rev), int(id_)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def set_next_cursor(response: Response, page: List[Any], limit: int):
+    """
+    Sets `NEXT_CURSOR_HEADER` if `page` is full, so there may be more rows after it.
+    """
+    if page and len(page) >= limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(page[-1])
@@ -0,0 +1,34 @@
+from typing import Any, AsyncIterator, Callable, Dict
+
+import msgspec
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.database.session import AsyncSessionLocal
+
+# lines are sent in chunks of about this many bytes
+_CHUNK_SIZE = 64 * 1024
+_encoder = msgspec.json.Encoder()
+
+
+def ndjson_response(
+    query: Callable[[AsyncSession], AsyncIterator[Dict[str, Any]]],
+) -> StreamingResponse:
+    """
+    Streams rows of `query` as newline-delimited JSON, one row per line.
+    `query` runs in its own session, as the request's one is closed before the body is sent.
+    """
+
+    async def body() -> AsyncIterator[bytes]:
+        buffer = bytearray()
+        async with AsyncSessionLocal() as db:
+            async for row in query(db):
+                _encoder.encode_into(row, buffer, -1)
+                buffer += b"\n"
+                if len(buffer) >= _CHUNK_SIZE:
+                    yield bytes(buffer)
+                    buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
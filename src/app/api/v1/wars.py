@@ -7,6 +7,10 @@ from src.app.api.v1.endpoints import (
     war_state,
     shards,
     hexes,
+    snapshot,
+    structure_events,
+    updates,
+    world_map,
 )
 
 router = APIRouter()
@@ -17,3 +21,7 @@ router.include_router(war_state.router)
 router.include_router(map_war_report.router)
 router.include_router(dynamic_map_data.router)
 router.include_router(static_map_data.router)
+router.include_router(snapshot.router)
+router.include_router(structure_events.router)
+router.include_router(updates.router)
+router.include_router(world_map.router)
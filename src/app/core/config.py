@@ -1,7 +1,26 @@
-from typing import List
+from typing import Dict, List, Tuple
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+class RetentionTier(BaseModel):
+    """
+    Snapshots older than `after_hours` are thinned to the last one per hex
+    in every `keep_every` seconds. With `finished_wars_only`, the current war is left out.
+    """
+
+    after_hours: float
+    keep_every: int
+    finished_wars_only: bool = False
+
+
+# full resolution for a week, then hourly, then daily for finished wars after 30 days
+_DEFAULT_RETENTION_TIERS = [
+    RetentionTier(after_hours=7 * 24, keep_every=3600),
+    RetentionTier(after_hours=30 * 24, keep_every=86400, finished_wars_only=True),
+]
+
+
 class Settings(BaseSettings):
     """
     Loads environment variables from .env file.
@@ -12,6 +31,75 @@ class Settings(BaseSettings):
     LOG_LEVEL: str
     FLASK_API_DATETIME_FORMAT: str = "%G-%m-%dT%H:%M:%S%:z"
 
+    # Polling interval per War API endpoint, in seconds
+    POLL_INTERVAL_WAR_STATE: float = 60.0
+    POLL_INTERVAL_MAP_WAR_REPORT: float = 60.0
+    POLL_INTERVAL_DYNAMIC_MAP_DATA: float = 60.0
+    # static map data is stored once per war, this only checks for changed versions
+    POLL_INTERVAL_STATIC_MAP_DATA: float = 3600.0
+    # Shards are polled concurrently, each poll is cut off after the timeout
+    MAX_CONCURRENT_SHARD_POLLS: int = 3
+    SHARD_POLL_TIMEOUT: float = 120.0
+    SHARD_RESTART_DELAY: float = 10.0
+
+    # War API HTTP client, shared by all polls
+    WAR_API_HTTP2: bool = False  # needs `h2`, install with `httpx[http2]`
+    WAR_API_TIMEOUT: float = 30.0
+    WAR_API_CONNECT_TIMEOUT: float = 10.0
+    WAR_API_MAX_CONNECTIONS: int = 100
+    WAR_API_MAX_KEEPALIVE_CONNECTIONS: int = 50
+    WAR_API_KEEPALIVE_EXPIRY: float = 60.0
+    WAR_API_MAX_CONCURRENCY_PER_SHARD: int = 16
+
+    # Ingestion pipeline of a poll: fetch workers feed a bounded queue drained by one writer
+    INGEST_FETCH_WORKERS: int = 16
+    INGEST_QUEUE_SIZE: int = 32
+    INGEST_WRITE_BATCH: int = 16  # max payloads written per batch
+
+    # max-age of cacheable latest-data responses, 0 makes clients revalidate every time
+    HTTP_CACHE_MAX_AGE: int = 0
+    # smaller responses are sent uncompressed
+    HTTP_COMPRESS_MIN_SIZE: int = 1024
+
+    # Change feed: notifications a subscriber may leave unread before it's dropped,
+    # and seconds between keep-alive comments of idle SSE streams
+    FEED_QUEUE_SIZE: int = 16
+    FEED_KEEPALIVE: float = 15.0
+
+    # map war report rollups are returned at the finest resolution within this many buckets
+    ROLLUP_MAX_POINTS: int = 500
+
+    # History retention, see `services.retention`. Tiers per table, applied in order.
+    # Compaction runs every RETENTION_INTERVAL seconds, deleting RETENTION_BATCH_SIZE
+    # snapshots per transaction from slices of RETENTION_REV_CHUNK REVs.
+    RETENTION_ENABLED: bool = False
+    RETENTION_POLICIES_JSON: Dict[str, List[RetentionTier]] = {
+        "WarState": _DEFAULT_RETENTION_TIERS,
+        "MapWarReport": _DEFAULT_RETENTION_TIERS,
+        "DynamicMapData": _DEFAULT_RETENTION_TIERS,
+    }
+    RETENTION_INTERVAL: float = 3600.0
+    RETENTION_BATCH_SIZE: int = 20
+    RETENTION_REV_CHUNK: int = 500
+    RETENTION_PAUSE: float = 0.1  # seconds between transactions, lets the ingestor in
+
+    # Spatial index of map items, see `services.spatial_index`. Grid cell size in meters,
+    # and (column, row) of hexes to place in the world grid, overriding `world_map.HEX_LAYOUT`.
+    SPATIAL_CELL_SIZE: float = 250.0
+    HEX_LAYOUT_JSON: Dict[str, Tuple[float, float]] = {}
+
+    # Cold archive of finished wars, see `services.war_archive`. Needs the `archive` extra.
+    # A war is archived ARCHIVE_AFTER_HOURS after the next war started, checked every
+    # ARCHIVE_INTERVAL seconds.
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_DIR: str = "archive"
+    ARCHIVE_AFTER_HOURS: int = 168
+    ARCHIVE_INTERVAL: float = 3600.0
+
+    # Store only changed dynamic map items, with a full keyframe every N snapshots of a hex
+    DYNAMIC_DELTA_STORAGE: bool = False
+    DYNAMIC_KEYFRAME_INTERVAL: int = 12
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
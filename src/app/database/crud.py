@@ -1,12 +1,23 @@
-import asyncio
 from datetime import datetime, timezone
-from typing import Any, Dict, Iterable, List, Optional, Type
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
 
 from sqlalchemy import delete as sa_delete, insert as sa_insert
-from sqlalchemy import select, update as sa_update
+from sqlalchemy import and_, func, literal, or_, select, update as sa_update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 # sqlalchemy.orm imports not needed here
 
+from src.app.database.dynamic_delta import apply_delta
 from src.app.database.models import (
     REV,
     Hex,
@@ -14,10 +25,14 @@ from src.app.database.models import (
     Shard,
     WarState,
     MapWarReport,
+    MapWarReportRollup,
     StaticMapData,
     StaticMapDataItem,
     DynamicMapData,
     DynamicMapDataItem,
+    LatestRow,
+    RetentionWatermark,
+    StructureEvent,
 )
 
 
@@ -28,9 +43,42 @@ async def _get_one(db: AsyncSession, model: Type[Any], **filters) -> Optional[An
     return result.scalars().first()
 
 
-# async def _get_one_last(db: AsyncSession, model: Type[Any], **filters) -> Optional[Any]:
+def _latest_conditions(
+    model: Type[Any], filters: Dict[str, Any]
+) -> Optional[List[Any]]:
+    """
+    Conditions selecting newest rows of `model` through `LatestRow`, or None if `filters`
+    can't be answered by it. Only `shard_id` and, for models with a hex, `hex_id` can.
+    """
+    has_hex = hasattr(model, "hex_id")
+    allowed = {"shard_id", "hex_id"} if has_hex else {"shard_id"}
+    if "shard_id" not in filters or not filters.keys() <= allowed:
+        return None
+    conditions = [
+        LatestRow.entity == model.__tablename__,
+        LatestRow.shard_id == filters["shard_id"],
+    ]
+    if not has_hex:
+        conditions.append(LatestRow.hex_id == 0)
+    elif "hex_id" in filters:
+        conditions.append(LatestRow.hex_id == filters["hex_id"])
+    return conditions
+
+
 async def _get_one_last(db: AsyncSession, model: Type[Any], **filters) -> Optional[Any]:
-    stmt = select(model).filter_by(**filters).order_by(model.REV.desc())
+    """
+    Newest row. Looked up through `LatestRow` when `filters` allow, sorted otherwise.
+    """
+    conditions = _latest_conditions(model, filters)
+    if conditions is not None:
+        stmt = (
+            select(model)
+            .join(LatestRow, LatestRow.row_id == model.id)
+            .where(*conditions)
+            .order_by(LatestRow.REV.desc())
+        )
+    else:
+        stmt = select(model).filter_by(**filters).order_by(model.REV.desc())
     result = await db.execute(stmt)
     return result.scalars().first()
 
@@ -44,16 +92,42 @@ async def _get_many(
 
 
 async def _get_many_last_by_hex_id(
-    db: AsyncSession, model: Type[Any], skip: int = 0, limit: int = 100, **filters
+    db: AsyncSession,
+    model: Type[Any],
+    skip: int = 0,
+    limit: Optional[int] = 100,
+    **filters,
 ) -> List[Any]:
     """
+    Row with the highest REV of every hex, ordered by `hex_id`.
     For proper usage `hex_id` shouldn't be in filters.
+    Looked up through `LatestRow` when `filters` allow, e.g. not for a specific war.
     """
+    pointers = _latest_conditions(model, filters)
+    if pointers is not None:
+        stmt = (
+            select(model)
+            .join(LatestRow, LatestRow.row_id == model.id)
+            .where(*pointers)
+            .order_by(model.hex_id)
+            .offset(skip)
+            .limit(limit)
+        )
+        result = await db.execute(stmt)
+        return list(result.scalars().all())
+
+    conditions = [getattr(model, k) == v for k, v in filters.items()]
+    latest = (
+        select(model.hex_id, func.max(model.REV).label("REV"))
+        .where(*conditions)
+        .group_by(model.hex_id)
+        .subquery()
+    )
     stmt = (
         select(model)
-        .filter_by(**filters)
-        .order_by(model.REV.desc())
-        .group_by(model.hex_id)
+        .where(*conditions)
+        .join(latest, and_(model.hex_id == latest.c.hex_id, model.REV == latest.c.REV))
+        .order_by(model.hex_id)
         .offset(skip)
         .limit(limit)
     )
@@ -61,11 +135,92 @@ async def _get_many_last_by_hex_id(
     return list(result.scalars().all())
 
 
+async def _get_many_at_REV(
+    db: AsyncSession, model: Type[Any], rev: int, **filters
+) -> List[Any]:
+    """
+    Row with the highest REV up to `rev` of every hex, ordered by `hex_id`.
+    Models without a hex get their single row with the highest REV up to `rev`.
+    """
+    conditions = [getattr(model, k) == v for k, v in filters.items()]
+    conditions.append(model.REV <= rev)
+    if not hasattr(model, "hex_id"):
+        stmt = select(model).where(*conditions).order_by(model.REV.desc()).limit(1)
+        result = await db.execute(stmt)
+        return list(result.scalars().all())
+
+    governing = (
+        select(model.hex_id, func.max(model.REV).label("REV"))
+        .where(*conditions)
+        .group_by(model.hex_id)
+        .subquery()
+    )
+    stmt = (
+        select(model)
+        .where(*conditions)
+        .join(
+            governing,
+            and_(model.hex_id == governing.c.hex_id, model.REV == governing.c.REV),
+        )
+        .order_by(model.hex_id)
+    )
+    result = await db.execute(stmt)
+    return list(result.scalars().all())
+
+
+async def _get_children(
+    db: AsyncSession, model: Type[Any], parent_key: str, parent_ids: List[int]
+) -> Dict[int, List[Any]]:
+    """
+    Loads children of all `parent_ids` in one query, instead of a query per parent.
+    Returns them grouped by parent id, in insertion order. Children are never truncated.
+    """
+    out: Dict[int, List[Any]] = {x: [] for x in parent_ids}
+    if not parent_ids:
+        return out
+    stmt = (
+        select(model)
+        .where(getattr(model, parent_key).in_(parent_ids))
+        .order_by(model.id)
+    )
+    result = await db.execute(stmt)
+    for item in result.scalars().all():
+        out[getattr(item, parent_key)].append(item)
+    return out
+
+
+async def _get_REV_range(
+    db: AsyncSession, datetime_from: datetime, datetime_to: datetime
+) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Lowest and highest REV stored within the date range, (None, None) if there is none.
+    """
+    stmt = select(func.min(REV.REV), func.max(REV.REV)).where(
+        REV.tmstmp.between(datetime_from, datetime_to)
+    )
+    result = await db.execute(stmt)
+    rev_from, rev_to = result.one()
+    return rev_from, rev_to
+
+
+async def get_REV_range(
+    db: AsyncSession, datetime_from: datetime, datetime_to: datetime
+) -> Tuple[Optional[int], Optional[int]]:
+    return await _get_REV_range(db, datetime_from, datetime_to)
+
+
 async def _get_many_REV(
-    db: AsyncSession, model: Type[Any], skip: int = 0, limit: int = 100, **filters
+    db: AsyncSession,
+    model: Type[Any],
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[Tuple[int, int]] = None,
+    **filters,
 ) -> List[Any]:
     """
-    special filter key: DATE_RANGE. Should be a list of 2 ISO8601 compliant datetime strings. Will be used to filter by REV timestamp.
+    special filter key: DATE_RANGE. Should be a list of 2 datetimes. Will be used to filter by REV timestamp.
+    Rows are ordered by (REV, id). `cursor` is (REV, id) of the last row of the previous page,
+    rows after it are found by an index seek, while `skip` reads through all skipped rows.
     """
     date_range = None
     if "DATE_RANGE" in filters:
@@ -73,23 +228,56 @@ async def _get_many_REV(
     else:
         raise ValueError("Date range missing.")
 
-    stmt = (
-        (
-            select(model)
-            .filter_by(**filters)
-            .join(REV, model.REV == REV.REV)
-            .where(
-                REV.tmstmp.between(date_range[0].isoformat(), date_range[1].isoformat())
-            )
-        )
-        .offset(skip)
-        .limit(limit)
-    )
+    rev_from, rev_to = await _get_REV_range(db, date_range[0], date_range[1])
+    if rev_from is None:
+        return []
+
+    stmt = select(model).filter_by(**filters).where(model.REV.between(rev_from, rev_to))
+    if cursor is not None:
+        rev, id_ = cursor
+        stmt = stmt.where(or_(model.REV > rev, and_(model.REV == rev, model.id > id_)))
+    stmt = stmt.order_by(model.REV, model.id).offset(skip).limit(limit)
 
     result = await db.execute(stmt)
     return list(result.scalars().all())
 
 
+async def _stream_REV(
+    db: AsyncSession,
+    model: Type[Any],
+    datetime_from: datetime,
+    datetime_to: datetime,
+    after_REV: Optional[int] = None,
+    **filters,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams rows within the date range as dicts, ordered by REV, over a server-side cursor.
+    With `after_REV`, only rows of later REVs are streamed.
+    """
+    rev_from, rev_to = await _get_REV_range(db, datetime_from, datetime_to)
+    if rev_from is None:
+        return
+    if after_REV is not None:
+        rev_from = max(rev_from, after_REV + 1)
+    async for row in _stream_REV_range(db, model, rev_from, rev_to, **filters):
+        yield row
+
+
+async def _stream_REV_range(
+    db: AsyncSession, model: Type[Any], rev_from: int, rev_to: int, **filters
+) -> AsyncIterator[Dict[str, Any]]:
+    table = model.__table__
+    stmt = (
+        select(*table.c)
+        .where(*[table.c[k] == v for k, v in filters.items()])
+        .where(table.c.REV.between(rev_from, rev_to))
+        .order_by(table.c.REV, table.c.id)
+    )
+    result = await db.stream(stmt)
+    async for row in result.mappings():
+        yield dict(row)
+
+
 async def _delete(db: AsyncSession, model: Type[Any], **filters) -> int:
     stmt = sa_delete(model).filter_by(**filters)
     res = await db.execute(stmt)
@@ -151,6 +339,78 @@ async def _upsert(
     return await _get_one(db, model, **{k: data[k] for k in data})
 
 
+async def _bulk_insert(db: AsyncSession, model: Type[Any], rows: List[Dict[str, Any]]):
+    """
+    Inserts all `rows` with a single executemany. Does not commit.
+    """
+    if not rows:
+        return
+    await db.execute(sa_insert(model), rows)
+
+
+async def _bulk_insert_returning_ids(
+    db: AsyncSession, model: Type[Any], rows: List[Dict[str, Any]]
+) -> List[int]:
+    """
+    Inserts all `rows` in bulk and returns their new ids, in the same order as `rows`.
+    Does not commit.
+    """
+    if not rows:
+        return []
+    result = await db.execute(
+        sa_insert(model).returning(model.id, sort_by_parameter_order=True), rows
+    )
+    return list(result.scalars().all())
+
+
+async def _bulk_insert_with_children(
+    db: AsyncSession,
+    model: Type[Any],
+    child_model: Type[Any],
+    parent_key: str,
+    data: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]],
+) -> List[int]:
+    """
+    Inserts parents in one statement, then all of their children in one statement.
+    `data` is a list of (parent, children) pairs; `parent_key` is the child's foreign key column.
+    Returns ids of inserted parents. Does not commit.
+    """
+    parent_ids = await _bulk_insert_returning_ids(db, model, [x[0] for x in data])
+    children = [
+        child | {parent_key: parent_id}
+        for parent_id, (_, items) in zip(parent_ids, data)
+        for child in items
+    ]
+    await _bulk_insert(db, child_model, children)
+    return parent_ids
+
+
+async def _upsert_latest(
+    db: AsyncSession, model: Type[Any], rows: List[Dict[str, Any]], ids: List[int]
+):
+    """
+    Points `LatestRow` of every shard and hex in `rows` at the row inserted for it,
+    `ids` being their new ids in the same order. Does not commit.
+    """
+    if not rows:
+        return
+    pointers = [
+        {
+            "shard_id": row["shard_id"],
+            "hex_id": row.get("hex_id", 0),
+            "entity": model.__tablename__,
+            "row_id": id_,
+            "REV": row["REV"],
+        }
+        for row, id_ in zip(rows, ids)
+    ]
+    stmt = mysql_insert(LatestRow)
+    stmt = stmt.on_duplicate_key_update(
+        row_id=stmt.inserted.row_id, REV=stmt.inserted.REV
+    )
+    await db.execute(stmt, pointers)
+
+
 # Per-model CRUD wrappers
 
 
@@ -165,9 +425,34 @@ async def list_revs(
     return await _get_many(db, REV, skip=skip, limit=limit, **filters)
 
 
-async def create_rev_and_get_id(db: AsyncSession) -> REV:
+async def list_rev_times(db: AsyncSession) -> List[Tuple[int, datetime]]:
+    """
+    (REV, tmstmp) of every REV, ordered by REV.
+    """
+    result = await db.execute(select(REV.REV, REV.tmstmp).order_by(REV.REV))
+    return [(x.REV, x.tmstmp) for x in result.all()]
+
+
+async def get_rev_times(db: AsyncSession, revs: Iterable[int]) -> Dict[int, datetime]:
+    """
+    Timestamps of `revs`, in one query.
+    """
+    revs = list(set(revs))
+    if not revs:
+        return {}
+    result = await db.execute(select(REV.REV, REV.tmstmp).where(REV.REV.in_(revs)))
+    return {x[0]: x[1] for x in result.all()}
+
+
+async def create_rev_and_get_id(db: AsyncSession, commit: bool = True) -> REV:
+    """
+    With `commit=False` the REV is only flushed, so it can be committed together with its data.
+    """
     rev = REV(tmstmp=datetime.now(timezone.utc))  # use utc time
     db.add(rev)
+    if not commit:
+        await db.flush()  # populates rev.REV (autoincrement PK)
+        return rev
     await db.commit()
     await db.refresh(rev)  # populates rev.REV (autoincrement PK)
     return rev
@@ -226,6 +511,26 @@ async def delete_hex(db: AsyncSession, **filters) -> int:
     return await _delete(db, Hex, **filters)
 
 
+async def get_or_create_hexes(
+    db: AsyncSession, names: List[str], rev: int
+) -> List[Hex]:
+    """
+    Returns hexes for all `names`, inserting the missing ones. Does not commit.
+    """
+    result = await db.execute(select(Hex).where(Hex.name.in_(names)))
+    hexes = {x.name: x for x in result.scalars().all()}
+
+    missing = [x for x in dict.fromkeys(names) if x not in hexes]
+    if missing:
+        ids = await _bulk_insert_returning_ids(
+            db, Hex, [{"name": x, "REV": rev} for x in missing]
+        )
+        for id_, name in zip(ids, missing):
+            hexes[name] = Hex(id=id_, name=name, REV=rev)
+
+    return [hexes[x] for x in names]
+
+
 # StructureTypes
 async def get_structure_type(db: AsyncSession, **filters) -> Optional[StructureTypes]:
     return await _get_one(db, StructureTypes, **filters)
@@ -305,10 +610,25 @@ async def list_warstates_REV(
     datetime_to: datetime,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[Tuple[int, int]] = None,
     **filters,
 ) -> List[WarState]:
     filters |= {"DATE_RANGE": [datetime_from, datetime_to]}
-    return await _get_many_REV(db, WarState, skip=skip, limit=limit, **filters)
+    return await _get_many_REV(
+        db, WarState, skip=skip, limit=limit, cursor=cursor, **filters
+    )
+
+
+async def list_warstates_at_REV(
+    db: AsyncSession, rev: int, **filters
+) -> List[WarState]:
+    return await _get_many_at_REV(db, WarState, rev, **filters)
+
+
+def stream_warstates_REV(
+    db: AsyncSession, datetime_from: datetime, datetime_to: datetime, **filters
+) -> AsyncIterator[Dict[str, Any]]:
+    return _stream_REV(db, WarState, datetime_from, datetime_to, **filters)
 
 
 async def list_warstates(
@@ -338,6 +658,11 @@ async def delete_warstate(db: AsyncSession, **filters) -> int:
     return await _delete(db, WarState, **filters)
 
 
+async def bulk_insert_warstates(db: AsyncSession, data: List[Dict[str, Any]]):
+    ids = await _bulk_insert_returning_ids(db, WarState, data)
+    await _upsert_latest(db, WarState, data, ids)
+
+
 # MapWarReport
 async def get_map_war_report(db: AsyncSession, **filters) -> Optional[MapWarReport]:
     return await _get_one(db, MapWarReport, **filters)
@@ -368,10 +693,25 @@ async def list_map_war_reports_REV(
     datetime_to: datetime,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[Tuple[int, int]] = None,
     **filters,
 ) -> List[MapWarReport]:
     filters |= {"DATE_RANGE": [datetime_from, datetime_to]}
-    return await _get_many_REV(db, MapWarReport, skip=skip, limit=limit, **filters)
+    return await _get_many_REV(
+        db, MapWarReport, skip=skip, limit=limit, cursor=cursor, **filters
+    )
+
+
+async def list_map_war_reports_at_REV(
+    db: AsyncSession, rev: int, **filters
+) -> List[MapWarReport]:
+    return await _get_many_at_REV(db, MapWarReport, rev, **filters)
+
+
+def stream_map_war_reports_REV(
+    db: AsyncSession, datetime_from: datetime, datetime_to: datetime, **filters
+) -> AsyncIterator[Dict[str, Any]]:
+    return _stream_REV(db, MapWarReport, datetime_from, datetime_to, **filters)
 
 
 async def upsert_map_war_report(
@@ -395,6 +735,91 @@ async def delete_map_war_report(db: AsyncSession, **filters) -> int:
     return await _delete(db, MapWarReport, **filters)
 
 
+async def bulk_insert_map_war_reports(db: AsyncSession, data: List[Dict[str, Any]]):
+    ids = await _bulk_insert_returning_ids(db, MapWarReport, data)
+    await _upsert_latest(db, MapWarReport, data, ids)
+
+
+# MapWarReportRollup
+async def get_map_war_report_totals(db: AsyncSession, shard_id: int) -> Dict[str, Any]:
+    """
+    Counters of the newest map war reports of all hexes of a shard, summed up.
+    `dayOfWar` is the highest one.
+    """
+    stmt = (
+        select(
+            func.sum(MapWarReport.totalEnlistments).label("totalEnlistments"),
+            func.sum(MapWarReport.colonialCasualties).label("colonialCasualties"),
+            func.sum(MapWarReport.wardenCasualties).label("wardenCasualties"),
+            func.max(MapWarReport.dayOfWar).label("dayOfWar"),
+        )
+        .join(LatestRow, LatestRow.row_id == MapWarReport.id)
+        .where(*_latest_conditions(MapWarReport, {"shard_id": shard_id}))
+    )
+    result = await db.execute(stmt)
+    # SUM of integers comes back as Decimal
+    return {
+        x: int(y) if y is not None else None for x, y in result.mappings().one().items()
+    }
+
+
+async def list_map_war_report_rollups(
+    db: AsyncSession,
+    shard_id: int,
+    hex_id: int,
+    resolution: int,
+    bucket_from: datetime,
+    bucket_to: datetime,
+) -> List[MapWarReportRollup]:
+    stmt = (
+        select(MapWarReportRollup)
+        .where(
+            MapWarReportRollup.shard_id == shard_id,
+            MapWarReportRollup.hex_id == hex_id,
+            MapWarReportRollup.resolution == resolution,
+            MapWarReportRollup.bucket.between(bucket_from, bucket_to),
+        )
+        .order_by(MapWarReportRollup.bucket)
+    )
+    result = await db.execute(stmt)
+    return list(result.scalars().all())
+
+
+async def stream_map_war_report_history(
+    db: AsyncSession,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams all map war reports as dicts with `tmstmp` of their REV, ordered by REV.
+    """
+    table = MapWarReport.__table__
+    stmt = (
+        select(*table.c, REV.tmstmp)
+        .join(REV, REV.REV == table.c.REV)
+        .order_by(table.c.REV, table.c.id)
+    )
+    result = await db.stream(stmt)
+    async for row in result.mappings():
+        yield dict(row)
+
+
+async def upsert_map_war_report_rollups(db: AsyncSession, data: List[Dict[str, Any]]):
+    """
+    Inserts rollup rows, overwriting values of buckets which already have a row.
+    Does not commit.
+    """
+    if not data:
+        return
+    stmt = mysql_insert(MapWarReportRollup)
+    stmt = stmt.on_duplicate_key_update(
+        REV=stmt.inserted.REV,
+        totalEnlistments=stmt.inserted.totalEnlistments,
+        colonialCasualties=stmt.inserted.colonialCasualties,
+        wardenCasualties=stmt.inserted.wardenCasualties,
+        dayOfWar=stmt.inserted.dayOfWar,
+    )
+    await db.execute(stmt, data)
+
+
 # StaticMapData
 async def get_static_map_data(db: AsyncSession, **filters) -> Optional[StaticMapData]:
     # TODO make different getter since this item has children
@@ -407,6 +832,25 @@ async def list_static_map_data(
     return await _get_many(db, StaticMapData, skip=skip, limit=limit, **filters)
 
 
+async def list_static_map_data_latest(
+    db: AsyncSession, **filters
+) -> List[StaticMapData]:
+    """
+    Latest static map data of every hex, with `mapTextItems`.
+    Use `shard_id` and `warNumber` filters to get the copy of a specific war.
+    """
+    data: List[StaticMapData] = await _get_many_last_by_hex_id(
+        db, StaticMapData, limit=None, **filters
+    )
+
+    items = await _get_children(
+        db, StaticMapDataItem, "StaticMapData_id", [x.id for x in data]
+    )
+    for x in data:
+        x.mapTextItems = items[x.id]
+    return data
+
+
 async def list_static_map_data_REV(
     db: AsyncSession,
     datetime_from: datetime,
@@ -440,6 +884,19 @@ async def delete_static_map_data(db: AsyncSession, **filters) -> int:
     return await _delete(db, StaticMapData, **filters)
 
 
+async def bulk_insert_static_map_data(
+    db: AsyncSession, data: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]
+) -> List[int]:
+    """
+    `data` is a list of (StaticMapData, [StaticMapDataItem, ...]) pairs.
+    """
+    ids = await _bulk_insert_with_children(
+        db, StaticMapData, StaticMapDataItem, "StaticMapData_id", data
+    )
+    await _upsert_latest(db, StaticMapData, [x[0] for x in data], ids)
+    return ids
+
+
 # StaticMapDataItem
 async def get_static_map_data_item(
     db: AsyncSession, **filters
@@ -487,6 +944,87 @@ async def delete_static_map_data_item(db: AsyncSession, **filters) -> int:
 
 
 # DynamicMapData
+async def _rebuild_dynamic_snapshots(db: AsyncSession, data: List[DynamicMapData]):
+    """
+    Rebuilds full `mapItems` of delta snapshots (`isKeyframe` False) by replaying deltas
+    of their hex on top of the last keyframe before them. Costs 3 queries for any number of snapshots.
+    """
+    deltas = [x for x in data if not x.isKeyframe]
+    if not deltas:
+        return
+
+    # (shard_id, hex_id) -> [lowest REV, highest REV] to rebuild
+    ranges: Dict[Tuple[int, int], List[int]] = {}
+    for x in deltas:
+        rev_range = ranges.setdefault((x.shard_id, x.hex_id), [x.REV, x.REV])
+        rev_range[0] = min(rev_range[0], x.REV)
+        rev_range[1] = max(rev_range[1], x.REV)
+
+    stmt = (
+        select(
+            DynamicMapData.shard_id,
+            DynamicMapData.hex_id,
+            func.max(DynamicMapData.REV),
+        )
+        .where(
+            DynamicMapData.isKeyframe.is_(True),
+            or_(
+                *[
+                    and_(
+                        DynamicMapData.shard_id == shard_id,
+                        DynamicMapData.hex_id == hex_id,
+                        DynamicMapData.REV <= rev_from,
+                    )
+                    for (shard_id, hex_id), (rev_from, _) in ranges.items()
+                ]
+            ),
+        )
+        .group_by(DynamicMapData.shard_id, DynamicMapData.hex_id)
+    )
+    result = await db.execute(stmt)
+    keyframes = {(x[0], x[1]): x[2] for x in result.all()}
+
+    stmt = (
+        select(
+            DynamicMapData.id,
+            DynamicMapData.shard_id,
+            DynamicMapData.hex_id,
+            DynamicMapData.isKeyframe,
+        )
+        .where(
+            or_(
+                *[
+                    and_(
+                        DynamicMapData.shard_id == shard_id,
+                        DynamicMapData.hex_id == hex_id,
+                        DynamicMapData.REV.between(
+                            keyframes.get((shard_id, hex_id), 0), rev_to
+                        ),
+                    )
+                    for (shard_id, hex_id), (_, rev_to) in ranges.items()
+                ]
+            )
+        )
+        .order_by(DynamicMapData.REV, DynamicMapData.id)
+    )
+    result = await db.execute(stmt)
+    chain = result.all()
+
+    items = await _get_children(
+        db, DynamicMapDataItem, "DynamicMapData_id", [x[0] for x in chain]
+    )
+
+    requested = {x.id: x for x in deltas}
+    snapshots: Dict[Tuple[int, int], Dict[Any, DynamicMapDataItem]] = {}
+    for id_, shard_id, hex_id, is_keyframe in chain:
+        if is_keyframe:
+            snapshots[(shard_id, hex_id)] = {}
+        snapshot = snapshots.setdefault((shard_id, hex_id), {})
+        apply_delta(snapshot, items.get(id_, []))
+        if id_ in requested:
+            requested[id_].mapItems = list(snapshot.values())
+
+
 async def get_dynamic_map_data(db: AsyncSession, **filters) -> Optional[DynamicMapData]:
     # TODO make different getter since this item has children
     return await _get_one(db, DynamicMapData, **filters)
@@ -500,7 +1038,9 @@ async def get_dynamic_map_data_latest(
     )
     if not data:
         return None
-    data.mapItems = await _get_many(db, DynamicMapDataItem, DynamicMapData_id=data.id)
+    items = await _get_children(db, DynamicMapDataItem, "DynamicMapData_id", [data.id])
+    data.mapItems = items[data.id]
+    await _rebuild_dynamic_snapshots(db, [data])
     return data
 
 
@@ -516,10 +1056,12 @@ async def list_dynamic_map_data_latest(
     data: List[DynamicMapData] = await _get_many_last_by_hex_id(
         db, DynamicMapData, **filters
     )
-    tasks = [_get_many(db, DynamicMapDataItem, DynamicMapData_id=x.id) for x in data]
-    items = await asyncio.gather(*tasks)
-    for y, x in enumerate(data):
-        x.mapItems = items[y]
+    items = await _get_children(
+        db, DynamicMapDataItem, "DynamicMapData_id", [x.id for x in data]
+    )
+    for x in data:
+        x.mapItems = items[x.id]
+    await _rebuild_dynamic_snapshots(db, data)
     return data
 
 
@@ -529,18 +1071,170 @@ async def list_dynamic_map_data_REV(
     datetime_to: datetime,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[Tuple[int, int]] = None,
     **filters,
 ) -> List[DynamicMapData]:
     filters |= {"DATE_RANGE": [datetime_from, datetime_to]}
 
-    data = await _get_many_REV(db, DynamicMapData, skip=skip, limit=limit, **filters)
-    tasks = [_get_many(db, DynamicMapDataItem, DynamicMapData_id=x.id) for x in data]
-    items = await asyncio.gather(*tasks)
-    for y, x in enumerate(data):
-        x.mapItems = items[y]
+    data = await _get_many_REV(
+        db, DynamicMapData, skip=skip, limit=limit, cursor=cursor, **filters
+    )
+    items = await _get_children(
+        db, DynamicMapDataItem, "DynamicMapData_id", [x.id for x in data]
+    )
+    for x in data:
+        x.mapItems = items[x.id]
+    await _rebuild_dynamic_snapshots(db, data)
     return data
 
 
+async def list_dynamic_map_data_at_REV(
+    db: AsyncSession, rev: int, **filters
+) -> List[DynamicMapData]:
+    """
+    Snapshot of every hex as it was at `rev`, with full `mapItems`.
+    """
+    data = await _get_many_at_REV(db, DynamicMapData, rev, **filters)
+    items = await _get_children(
+        db, DynamicMapDataItem, "DynamicMapData_id", [x.id for x in data]
+    )
+    for x in data:
+        x.mapItems = items[x.id]
+    await _rebuild_dynamic_snapshots(db, data)
+    return data
+
+
+async def list_dynamic_map_data_of_REV(
+    db: AsyncSession, rev: int, **filters
+) -> List[DynamicMapData]:
+    """
+    All dynamic map data stored by poll `rev`, with full `mapItems`.
+    """
+    data = await _get_many(db, DynamicMapData, limit=None, REV=rev, **filters)
+    items = await _get_children(
+        db, DynamicMapDataItem, "DynamicMapData_id", [x.id for x in data]
+    )
+    for x in data:
+        x.mapItems = items[x.id]
+    await _rebuild_dynamic_snapshots(db, data)
+    return data
+
+
+async def stream_dynamic_map_data_REV(
+    db: AsyncSession,
+    datetime_from: datetime,
+    datetime_to: datetime,
+    after_REV: Optional[int] = None,
+    **filters,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams snapshots within the date range as dicts with full `mapItems`, ordered by REV.
+    With `after_REV`, only snapshots of later REVs are streamed.
+    """
+    rev_from, rev_to = await _get_REV_range(db, datetime_from, datetime_to)
+    if rev_from is None:
+        return
+    if after_REV is not None:
+        rev_from = max(rev_from, after_REV + 1)
+    async for row in stream_dynamic_map_data_REV_range(db, rev_from, rev_to, **filters):
+        yield row
+
+
+async def stream_dynamic_map_data_REV_range(
+    db: AsyncSession, rev_from: int, rev_to: int, **filters
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams snapshots within the REV range as dicts with full `mapItems`, ordered by REV,
+    over a single server-side cursor joining items to their snapshot.
+    Only the last snapshot of every hex is held in memory. Delta snapshots are rebuilt
+    on the fly, each hex with deltas in the range replaying from its own last keyframe
+    before the range. Hexes without deltas, all of them when only keyframes are stored,
+    are read from `rev_from` only.
+    """
+    parents = DynamicMapData.__table__
+    children = DynamicMapDataItem.__table__
+    conditions = [parents.c[k] == v for k, v in filters.items()]
+
+    result = await db.execute(
+        select(parents.c.shard_id, parents.c.hex_id)
+        .where(
+            *conditions,
+            parents.c.isKeyframe.is_(False),
+            parents.c.REV.between(rev_from, rev_to),
+        )
+        .distinct()
+    )
+    delta_hexes = result.all()
+    replays = []
+    if delta_hexes:
+        result = await db.execute(
+            select(parents.c.shard_id, parents.c.hex_id, func.max(parents.c.REV))
+            .where(
+                parents.c.isKeyframe.is_(True),
+                parents.c.REV <= rev_from,
+                or_(
+                    *[
+                        and_(parents.c.shard_id == shard_id, parents.c.hex_id == hex_id)
+                        for shard_id, hex_id in delta_hexes
+                    ]
+                ),
+            )
+            .group_by(parents.c.shard_id, parents.c.hex_id)
+        )
+        replays = [
+            and_(
+                parents.c.shard_id == shard_id,
+                parents.c.hex_id == hex_id,
+                parents.c.REV.between(keyframe, rev_from - 1),
+            )
+            for shard_id, hex_id, keyframe in result.all()
+        ]
+
+    stmt = (
+        select(*parents.c, *children.c)
+        .select_from(parents)
+        .outerjoin(children, children.c.DynamicMapData_id == parents.c.id)
+        .where(*conditions, or_(parents.c.REV.between(rev_from, rev_to), *replays))
+        .order_by(parents.c.REV, parents.c.id, children.c.id)
+    )
+    parent_keys = parents.c.keys()
+    child_keys = children.c.keys()
+    split = len(parent_keys)
+
+    snapshots: Dict[Tuple[int, int], Dict[Any, Dict[str, Any]]] = {}
+    parent: Optional[Dict[str, Any]] = None
+    items: List[Dict[str, Any]] = []
+
+    def replay() -> Optional[Dict[str, Any]]:
+        key = (parent["shard_id"], parent["hex_id"])
+        if parent.pop("isKeyframe"):
+            snapshots[key] = {}
+            apply_delta(snapshots[key], items)
+            map_items = items
+        else:
+            apply_delta(snapshots.setdefault(key, {}), items)
+            map_items = list(snapshots[key].values())
+        if parent["REV"] < rev_from:
+            return None
+        return parent | {
+            "mapItems": [
+                {k: v for k, v in x.items() if k != "deltaOp"} for x in map_items
+            ]
+        }
+
+    result = await db.stream(stmt)
+    async for row in result:
+        if parent is None or row[0] != parent["id"]:
+            if parent is not None and (snapshot := replay()) is not None:
+                yield snapshot
+            parent = dict(zip(parent_keys, row[:split]))
+            items = []
+        if row[split] is not None:
+            items.append(dict(zip(child_keys, row[split:])))
+    if parent is not None and (snapshot := replay()) is not None:
+        yield snapshot
+
+
 async def upsert_dynamic_map_data(
     db: AsyncSession,
     data: Dict[str, Any],
@@ -562,6 +1256,19 @@ async def delete_dynamic_map_data(db: AsyncSession, **filters) -> int:
     return await _delete(db, DynamicMapData, **filters)
 
 
+async def bulk_insert_dynamic_map_data(
+    db: AsyncSession, data: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]
+) -> List[int]:
+    """
+    `data` is a list of (DynamicMapData, [DynamicMapDataItem, ...]) pairs.
+    """
+    ids = await _bulk_insert_with_children(
+        db, DynamicMapData, DynamicMapDataItem, "DynamicMapData_id", data
+    )
+    await _upsert_latest(db, DynamicMapData, [x[0] for x in data], ids)
+    return ids
+
+
 # DynamicMapDataItem
 async def get_dynamic_map_data_item(
     db: AsyncSession, **filters
@@ -608,3 +1315,231 @@ async def upsert_dynamic_map_data_item(
 
 async def delete_dynamic_map_data_item(db: AsyncSession, **filters) -> int:
     return await _delete(db, DynamicMapDataItem, **filters)
+
+
+# StructureEvent
+async def list_structure_events_REV(
+    db: AsyncSession,
+    datetime_from: datetime,
+    datetime_to: datetime,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[Tuple[int, int]] = None,
+    **filters,
+) -> List[StructureEvent]:
+    filters |= {"DATE_RANGE": [datetime_from, datetime_to]}
+    return await _get_many_REV(
+        db, StructureEvent, skip=skip, limit=limit, cursor=cursor, **filters
+    )
+
+
+async def bulk_insert_structure_events(db: AsyncSession, data: List[Dict[str, Any]]):
+    await _bulk_insert(db, StructureEvent, data)
+
+
+# Retention
+# snapshot models with children: child model and its foreign key column
+_CHILDREN: Dict[Type[Any], Tuple[Type[Any], str]] = {
+    StaticMapData: (StaticMapDataItem, "StaticMapData_id"),
+    DynamicMapData: (DynamicMapDataItem, "DynamicMapData_id"),
+}
+
+
+async def get_REV_before(db: AsyncSession, tmstmp: datetime) -> Optional[int]:
+    """
+    Highest REV stored before `tmstmp`.
+    """
+    stmt = select(func.max(REV.REV)).where(REV.tmstmp < tmstmp)
+    result = await db.execute(stmt)
+    return result.scalar()
+
+
+async def get_war_start_REV(db: AsyncSession, shard_id: int) -> Optional[int]:
+    """
+    First REV of the current war of a shard. Anything stored before it belongs
+    to finished wars.
+    """
+    current = (
+        select(func.max(WarState.warNumber))
+        .where(WarState.shard_id == shard_id)
+        .scalar_subquery()
+    )
+    stmt = select(func.min(WarState.REV)).where(
+        WarState.shard_id == shard_id, WarState.warNumber == current
+    )
+    result = await db.execute(stmt)
+    return result.scalar()
+
+
+async def list_retention_rows(
+    db: AsyncSession, model: Type[Any], shard_id: int, rev_from: int, rev_to: int
+) -> List[Any]:
+    """
+    Snapshots of a shard within the REV range, as (id, hex_id, REV, tmstmp, isKeyframe)
+    rows ordered by REV. `hex_id` is 0 for models without a hex.
+    """
+    stmt = (
+        select(
+            model.id,
+            model.hex_id if hasattr(model, "hex_id") else literal(0).label("hex_id"),
+            model.REV,
+            REV.tmstmp,
+            model.isKeyframe
+            if hasattr(model, "isKeyframe")
+            else literal(True).label("isKeyframe"),
+        )
+        .join(REV, REV.REV == model.REV)
+        .where(model.shard_id == shard_id, model.REV.between(rev_from, rev_to))
+        .order_by(model.REV, model.id)
+    )
+    result = await db.execute(stmt)
+    return list(result.all())
+
+
+async def delete_snapshots(db: AsyncSession, model: Type[Any], ids: List[int]) -> int:
+    """
+    Deletes snapshots by id, with their children. Does not commit, so callers
+    can keep transactions small.
+    """
+    if not ids:
+        return 0
+    if model in _CHILDREN:
+        child_model, parent_key = _CHILDREN[model]
+        await db.execute(
+            sa_delete(child_model).where(getattr(child_model, parent_key).in_(ids))
+        )
+    result = await db.execute(sa_delete(model).where(model.id.in_(ids)))
+    return result.rowcount
+
+
+async def materialize_dynamic_keyframes(db: AsyncSession, ids: List[int]):
+    """
+    Turns delta snapshots into keyframes holding full `mapItems`, so snapshots before
+    them can be deleted. Does not commit.
+    """
+    if not ids:
+        return
+    result = await db.execute(
+        select(DynamicMapData).where(
+            DynamicMapData.id.in_(ids), DynamicMapData.isKeyframe.is_(False)
+        )
+    )
+    data = list(result.scalars().all())
+    if not data:
+        return
+    await _rebuild_dynamic_snapshots(db, data)
+
+    fields = ("teamId", "iconType", "x", "y", "flags", "viewDirection")
+    items = [
+        {x: getattr(item, x) for x in fields}
+        | {"REV": parent.REV, "DynamicMapData_id": parent.id}
+        for parent in data
+        for item in parent.mapItems
+    ]
+    await db.execute(
+        sa_delete(DynamicMapDataItem).where(
+            DynamicMapDataItem.DynamicMapData_id.in_([x.id for x in data])
+        )
+    )
+    await _bulk_insert(db, DynamicMapDataItem, items)
+    await db.execute(
+        sa_update(DynamicMapData)
+        .where(DynamicMapData.id.in_([x.id for x in data]))
+        .values(isKeyframe=True)
+    )
+
+
+async def list_retention_watermarks(
+    db: AsyncSession,
+) -> Dict[Tuple[str, int, int], int]:
+    """
+    Highest thinned REV by (table, shard id, `keep_every`).
+    """
+    result = await db.execute(select(RetentionWatermark))
+    return {(x.entity, x.shard_id, x.keep_every): x.REV for x in result.scalars().all()}
+
+
+async def upsert_retention_watermark(
+    db: AsyncSession, model: Type[Any], shard_id: int, keep_every: int, rev: int
+):
+    """
+    Does not commit.
+    """
+    stmt = mysql_insert(RetentionWatermark)
+    stmt = stmt.on_duplicate_key_update(REV=stmt.inserted.REV)
+    await db.execute(
+        stmt,
+        [
+            {
+                "entity": model.__tablename__,
+                "shard_id": shard_id,
+                "keep_every": keep_every,
+                "REV": rev,
+            }
+        ],
+    )
+
+
+# Archive
+async def list_war_starts(db: AsyncSession, shard_id: int) -> List[Tuple[int, int]]:
+    """
+    (warNumber, first REV) of every war stored for a shard, ordered by REV.
+    """
+    stmt = (
+        select(WarState.warNumber, func.min(WarState.REV).label("REV"))
+        .where(WarState.shard_id == shard_id)
+        .group_by(WarState.warNumber)
+        .order_by("REV")
+    )
+    result = await db.execute(stmt)
+    return [(x.warNumber, x.REV) for x in result.all()]
+
+
+async def list_latest_row_ids(
+    db: AsyncSession, model: Type[Any], shard_id: int, rev_to: int
+) -> Set[int]:
+    """
+    Ids of the rows of a shard up to `rev_to` `LatestRow` points at.
+    """
+    stmt = select(LatestRow.row_id).where(
+        LatestRow.shard_id == shard_id,
+        LatestRow.entity == model.__tablename__,
+        LatestRow.REV <= rev_to,
+    )
+    result = await db.execute(stmt)
+    return set(result.scalars().all())
+
+
+async def list_first_ids_after_REV(
+    db: AsyncSession, model: Type[Any], shard_id: int, rev: int
+) -> List[int]:
+    """
+    Ids of the first row of every hex of a shard stored after `rev`.
+    """
+    first = (
+        select(model.hex_id, func.min(model.REV).label("REV"))
+        .where(model.shard_id == shard_id, model.REV > rev)
+        .group_by(model.hex_id)
+        .subquery()
+    )
+    stmt = select(model.id).join(
+        first,
+        and_(
+            model.shard_id == shard_id,
+            model.hex_id == first.c.hex_id,
+            model.REV == first.c.REV,
+        ),
+    )
+    result = await db.execute(stmt)
+    return list(result.scalars().all())
+
+
+def stream_snapshots_REV_range(
+    db: AsyncSession, model: Type[Any], rev_from: int, rev_to: int, **filters
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams rows within the REV range as dicts, as the range endpoints return them.
+    """
+    if model is DynamicMapData:
+        return stream_dynamic_map_data_REV_range(db, rev_from, rev_to, **filters)
+    return _stream_REV_range(db, model, rev_from, rev_to, **filters)
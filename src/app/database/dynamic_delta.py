@@ -0,0 +1,56 @@
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# values of DynamicMapDataItem.deltaOp, keyframe items have it empty
+DELTA_ADDED = "A"  # item added or changed since previous snapshot of the hex
+DELTA_REMOVED = "R"  # item removed since previous snapshot of the hex
+
+# fields that can change on an item staying in place
+DELTA_FIELDS = ("teamId", "flags", "viewDirection")
+
+# item identity within a hex: (iconType, x, y)
+ItemKey = Tuple[Any, Any, Any]
+
+
+def _get(item: Any, field: str) -> Any:
+    if isinstance(item, dict):
+        return item.get(field)
+    return getattr(item, field)
+
+
+def item_key(item: Any) -> ItemKey:
+    """
+    Works both on parsed War API dicts and on `DynamicMapDataItem` rows.
+    """
+    return (_get(item, "iconType"), _get(item, "x"), _get(item, "y"))
+
+
+def index_items(items: Iterable[Any]) -> Optional[Dict[ItemKey, Any]]:
+    """
+    Returns items by `item_key`, or None if two items share a key and can't be told apart.
+    """
+    out: Dict[ItemKey, Any] = {}
+    for item in items:
+        key = item_key(item)
+        if key in out:
+            return None
+        out[key] = item
+    return out
+
+
+def item_values(item: Any, fields: Iterable[str]) -> Tuple[Any, ...]:
+    return tuple(_get(item, x) for x in fields)
+
+
+def item_changed(old: Any, new: Any) -> bool:
+    return any(_get(old, x) != _get(new, x) for x in DELTA_FIELDS)
+
+
+def apply_delta(snapshot: Dict[ItemKey, Any], items: Iterable[Any]):
+    """
+    Applies delta `items` of one snapshot onto the previous `snapshot` in place.
+    """
+    for item in items:
+        if _get(item, "deltaOp") == DELTA_REMOVED:
+            snapshot.pop(item_key(item), None)
+        else:
+            snapshot[item_key(item)] = item
@@ -1,8 +1,10 @@
 from sqlalchemy import (
+    Boolean,
     Integer,
     String,
     DateTime,
     ForeignKey,
+    Index,
     Float,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -15,12 +17,14 @@ Base = declarative_base()
 
 class REV(Base):
     __tablename__ = "REV"
+    __table_args__ = (Index("ix_REV_tmstmp", "tmstmp"),)
     REV: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     tmstmp: Mapped[DateTime] = mapped_column(DateTime)
 
 
 class Hex(Base):
     __tablename__ = "hex"
+    __table_args__ = (Index("ix_hex_name", "name"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     REV: Mapped[int] = mapped_column(Integer, ForeignKey("REV.REV"))
     name: Mapped[str] = mapped_column(String(150))
@@ -49,6 +53,10 @@ class Shard(Base):
 
 class WarState(Base):
     __tablename__ = "WarState"
+    __table_args__ = (
+        Index("ix_WarState_shard_REV", "shard_id", "REV"),
+        Index("ix_WarState_shard_war_REV", "shard_id", "warNumber", "REV"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     REV: Mapped[int] = mapped_column(Integer, ForeignKey("REV.REV"))
     shard_id: Mapped[int] = mapped_column(Integer, ForeignKey("shard.id"))
@@ -68,6 +76,10 @@ class WarState(Base):
 
 class MapWarReport(Base):
     __tablename__ = "MapWarReport"
+    __table_args__ = (
+        Index("ix_MapWarReport_shard_hex_REV", "shard_id", "hex_id", "REV"),
+        Index("ix_MapWarReport_shard_REV", "shard_id", "REV"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     REV: Mapped[int] = mapped_column(Integer, ForeignKey("REV.REV"))
     hex_id: Mapped[int] = mapped_column(Integer, ForeignKey("hex.id"))
@@ -83,12 +95,41 @@ class MapWarReport(Base):
     shard = relationship("Shard")
 
 
+# Last MapWarReport counters of a hex within a time bucket, maintained at ingest.
+# `hex_id` 0 holds totals of the whole shard, `resolution` is the bucket size in seconds.
+class MapWarReportRollup(Base):
+    __tablename__ = "MapWarReportRollup"
+    shard_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("shard.id"), primary_key=True
+    )
+    hex_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    resolution: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bucket: Mapped[DateTime] = mapped_column(DateTime, primary_key=True)
+    REV: Mapped[int] = mapped_column(Integer, ForeignKey("REV.REV"))
+    totalEnlistments: Mapped[int] = mapped_column(Integer, nullable=True)
+    colonialCasualties: Mapped[int] = mapped_column(Integer, nullable=True)
+    wardenCasualties: Mapped[int] = mapped_column(Integer, nullable=True)
+    dayOfWar: Mapped[int] = mapped_column(Integer, nullable=True)
+
+
 class StaticMapData(Base):
     __tablename__ = "StaticMapData"
+    __table_args__ = (
+        Index("ix_StaticMapData_shard_hex_REV", "shard_id", "hex_id", "REV"),
+        Index(
+            "ix_StaticMapData_shard_war_hex_REV",
+            "shard_id",
+            "warNumber",
+            "hex_id",
+            "REV",
+        ),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     REV: Mapped[int] = mapped_column(Integer, ForeignKey("REV.REV"))
     hex_id: Mapped[int] = mapped_column(Integer, ForeignKey("hex.id"))
     shard_id: Mapped[int] = mapped_column(Integer, ForeignKey("shard.id"))
+    # war the data was stored for, static data is stored once per war
+    warNumber: Mapped[int] = mapped_column(Integer, nullable=True)
     regionId: Mapped[int] = mapped_column(Integer, nullable=True)
     scorchedVictoryTowns: Mapped[int] = mapped_column(Integer, nullable=True)
     version: Mapped[int] = mapped_column(Integer, nullable=True)
@@ -103,6 +144,7 @@ class StaticMapData(Base):
 
 class StaticMapDataItem(Base):
     __tablename__ = "StaticMapDataItem"
+    __table_args__ = (Index("ix_StaticMapDataItem_parent", "StaticMapData_id", "id"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     REV: Mapped[int] = mapped_column(Integer, ForeignKey("REV.REV"))
     StaticMapData_id: Mapped[int] = mapped_column(
@@ -119,6 +161,11 @@ class StaticMapDataItem(Base):
 
 class DynamicMapData(Base):
     __tablename__ = "DynamicMapData"
+    __table_args__ = (
+        Index("ix_DynamicMapData_shard_hex_REV", "shard_id", "hex_id", "REV"),
+        Index("ix_DynamicMapData_shard_REV", "shard_id", "REV"),
+        Index("ix_DynamicMapData_keyframe", "shard_id", "hex_id", "isKeyframe", "REV"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     REV: Mapped[int] = mapped_column(Integer, ForeignKey("REV.REV"))
     hex_id: Mapped[int] = mapped_column(Integer, ForeignKey("hex.id"))
@@ -126,6 +173,8 @@ class DynamicMapData(Base):
     regionId: Mapped[int] = mapped_column(Integer, nullable=True)
     scorchedVictoryTowns: Mapped[int] = mapped_column(Integer, nullable=True)
     version: Mapped[int] = mapped_column(Integer, nullable=True)
+    # False if items hold only changes since previous snapshot of the hex
+    isKeyframe: Mapped[bool] = mapped_column(Boolean, default=True)
 
     rev = relationship("REV")
     hex = relationship("Hex")
@@ -137,6 +186,7 @@ class DynamicMapData(Base):
 
 class DynamicMapDataItem(Base):
     __tablename__ = "DynamicMapDataItem"
+    __table_args__ = (Index("ix_DynamicMapDataItem_parent", "DynamicMapData_id", "id"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     REV: Mapped[int] = mapped_column(Integer, ForeignKey("REV.REV"))
     DynamicMapData_id: Mapped[int] = mapped_column(
@@ -150,6 +200,58 @@ class DynamicMapDataItem(Base):
     y: Mapped[float] = mapped_column(Float, nullable=True)
     flags: Mapped[int] = mapped_column(Integer, nullable=True)
     viewDirection: Mapped[int] = mapped_column(Integer, nullable=True)
+    # see `dynamic_delta`, empty for items of keyframes
+    deltaOp: Mapped[str] = mapped_column(String(1), nullable=True)
 
     rev = relationship("REV")
     dynamic_map = relationship("DynamicMapData", back_populates="items")
+
+
+# Points at the newest row of an entity (its table name) per shard and hex,
+# upserted in the same transaction as the row. `hex_id` is 0 for WarState.
+class LatestRow(Base):
+    __tablename__ = "LatestRow"
+    shard_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("shard.id"), primary_key=True
+    )
+    hex_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    entity: Mapped[str] = mapped_column(String(32), primary_key=True)
+    row_id: Mapped[int] = mapped_column(Integer)
+    REV: Mapped[int] = mapped_column(Integer, ForeignKey("REV.REV"))
+
+
+# Highest REV of a table and shard already thinned to the last snapshot per hex in every
+# `keep_every` seconds, so retention resumes there after a restart.
+class RetentionWatermark(Base):
+    __tablename__ = "RetentionWatermark"
+    entity: Mapped[str] = mapped_column(String(32), primary_key=True)
+    shard_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("shard.id"), primary_key=True
+    )
+    keep_every: Mapped[int] = mapped_column(Integer, primary_key=True)
+    REV: Mapped[int] = mapped_column(Integer, ForeignKey("REV.REV"))
+
+
+# Change of `teamId` or `flags` of a map item staying in place, between two stored
+# snapshots of its hex. Detected by the ingestor, see `structure_events`.
+class StructureEvent(Base):
+    __tablename__ = "StructureEvent"
+    __table_args__ = (
+        Index("ix_StructureEvent_shard_REV", "shard_id", "REV"),
+        Index("ix_StructureEvent_shard_hex_REV", "shard_id", "hex_id", "REV"),
+        Index("ix_StructureEvent_shard_team_REV", "shard_id", "teamId", "REV"),
+        Index("ix_StructureEvent_shard_icon_REV", "shard_id", "iconType", "REV"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    REV: Mapped[int] = mapped_column(Integer, ForeignKey("REV.REV"))
+    shard_id: Mapped[int] = mapped_column(Integer, ForeignKey("shard.id"))
+    hex_id: Mapped[int] = mapped_column(Integer, ForeignKey("hex.id"))
+    iconType: Mapped[int] = mapped_column(
+        Integer, ForeignKey("StructureTypes.id"), nullable=True
+    )
+    x: Mapped[float] = mapped_column(Float, nullable=True)
+    y: Mapped[float] = mapped_column(Float, nullable=True)
+    teamId: Mapped[str] = mapped_column(String(20), nullable=True)
+    previousTeamId: Mapped[str] = mapped_column(String(20), nullable=True)
+    flags: Mapped[int] = mapped_column(Integer, nullable=True)
+    previousFlags: Mapped[int] = mapped_column(Integer, nullable=True)
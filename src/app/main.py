@@ -1,35 +1,37 @@
 import asyncio
 import logging
 from contextlib import asynccontextmanager
+import httpx
 from fastapi import FastAPI
-from src.app.services.data_ingestor import fetch_and_store_war_data
+from fastapi.middleware.gzip import GZipMiddleware
+from src.app.services import war_api_client
+from src.app.services.scheduler import PollScheduler
 from src.app.api.v1 import wars
 from src.app.core.config import settings
+from src.app.database.session import AsyncSessionLocal
+from src.app.services.identity_registry import identity_registry
+from src.app.services.retention import retention_engine
+from src.app.services.rev_index import rev_index
+from src.app.services.spatial_index import spatial_index
+from src.app.services.state_cache import state_cache
+from src.app.services.structure_events import structure_event_detector
+from src.app.services.war_archive import pq, war_archive
+from src.app.services.war_lifecycle import war_lifecycle
 
 # Set up logging
 logging.basicConfig(level=settings.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
-# Polling interval (in seconds)
-POLL_INTERVAL = 300  # 5 minutes
 
-
-async def background_poller():
+async def background_poller(client: httpx.AsyncClient):
     """
     A simple background task that runs forever, polling the API.
+    Each shard and endpoint is polled on its own interval, see `PollScheduler`.
     """
     logger.info("Background poller started.")
     BASE_URLS = settings.WAR_API_BASE_URLS_JSON
 
-    while True:
-        for base_url in BASE_URLS:
-            try:
-                await fetch_and_store_war_data(base_url)
-            except Exception as e:
-                logger.error(f"Error in background poller: {e}", exc_info=True)
-
-        logger.info(f"Polling complete. Sleeping for {POLL_INTERVAL} seconds.")
-        await asyncio.sleep(POLL_INTERVAL)
+    await PollScheduler(client, BASE_URLS).run()
 
 
 @asynccontextmanager
@@ -39,8 +41,33 @@ async def lifespan(app: FastAPI):
     """
     # On startup
     logger.info("Application startup...")
+    # local files only, ranges must know what's archived even if DB isn't up yet
+    war_archive.load()
+    try:
+        async with AsyncSessionLocal() as db:
+            await identity_registry.warm(db)
+            await war_lifecycle.warm(db)
+            await state_cache.warm(db, identity_registry.shards_by_id)
+            await rev_index.warm(db)
+            await spatial_index.warm(db, identity_registry.shards_by_id)
+            await structure_event_detector.warm(db, identity_registry.shards_by_id)
+    except Exception as e:
+        logger.error(f"Could not warm registries and caches: {e}", exc_info=True)
+    client = war_api_client.create_client()
     # Start the background task
-    task = asyncio.create_task(background_poller())
+    task = asyncio.create_task(background_poller(client))
+    retention_task = (
+        asyncio.create_task(retention_engine.run())
+        if settings.RETENTION_ENABLED
+        else None
+    )
+    if settings.ARCHIVE_ENABLED and pq is None:
+        logger.error("ARCHIVE_ENABLED needs the `archive` extra, archiving is off.")
+    archive_task = (
+        asyncio.create_task(war_archive.run())
+        if settings.ARCHIVE_ENABLED and pq is not None
+        else None
+    )
 
     yield  # The application is now running
 
@@ -51,6 +78,19 @@ async def lifespan(app: FastAPI):
         await task
     except asyncio.CancelledError:
         logger.info("Background poller successfully cancelled.")
+    if retention_task is not None:
+        retention_task.cancel()
+        try:
+            await retention_task
+        except asyncio.CancelledError:
+            logger.info("Retention successfully cancelled.")
+    if archive_task is not None:
+        archive_task.cancel()
+        try:
+            await archive_task
+        except asyncio.CancelledError:
+            logger.info("Archiver successfully cancelled.")
+    await client.aclose()
 
 
 # Initialize the FastAPI app
@@ -61,6 +101,9 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Compresses responses not compressed already, cached ones come precompressed
+app.add_middleware(GZipMiddleware, minimum_size=settings.HTTP_COMPRESS_MIN_SIZE)
+
 # Include the API router
 app.include_router(wars.router, prefix="/war_api", tags=["war_api_data"])
 
@@ -0,0 +1,54 @@
+from typing import Any, Dict, List, Optional
+
+import msgspec
+
+# Compact form of `DynamicMapData`, for clients reading whole shards. Map items are sent
+# as parallel arrays instead of objects, without their ids and REV, which only repeat
+# those of the snapshot. `teamId` is dictionary-encoded: values index into `teams`.
+
+
+class MapItemColumns(msgspec.Struct):
+    teams: List[Optional[str]] = []
+    teamId: List[int] = []
+    iconType: List[Optional[int]] = []
+    x: List[Optional[float]] = []
+    y: List[Optional[float]] = []
+    flags: List[Optional[int]] = []
+    viewDirection: List[Optional[int]] = []
+
+
+class DynamicMapDataCompact(msgspec.Struct):
+    id: int
+    REV: int
+    hex_id: int
+    shard_id: int
+    regionId: Optional[int]
+    scorchedVictoryTowns: Optional[int]
+    version: Optional[int]
+    mapItems: MapItemColumns
+
+
+def to_compact(data: Any) -> DynamicMapDataCompact:
+    """
+    Compact form of a `DynamicMapData` row with full `mapItems`.
+    """
+    teams: Dict[Optional[str], int] = {}
+    columns = MapItemColumns()
+    for item in data.mapItems:
+        columns.teamId.append(teams.setdefault(item.teamId, len(teams)))
+        columns.iconType.append(item.iconType)
+        columns.x.append(item.x)
+        columns.y.append(item.y)
+        columns.flags.append(item.flags)
+        columns.viewDirection.append(item.viewDirection)
+    columns.teams = list(teams)
+    return DynamicMapDataCompact(
+        id=data.id,
+        REV=data.REV,
+        hex_id=data.hex_id,
+        shard_id=data.shard_id,
+        regionId=data.regionId,
+        scorchedVictoryTowns=data.scorchedVictoryTowns,
+        version=data.version,
+        mapItems=columns,
+    )
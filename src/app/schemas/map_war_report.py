@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -14,3 +17,18 @@ class MapWarReport(BaseModel):
 
     class Config:
         from_attributes = True  # Renamed from orm_mode in Pydantic v2
+
+
+class MapWarReportRollup(BaseModel):
+    shard_id: int
+    hex_id: int
+    resolution: int
+    bucket: datetime
+    REV: int
+    totalEnlistments: Optional[int]
+    colonialCasualties: Optional[int]
+    wardenCasualties: Optional[int]
+    dayOfWar: Optional[int]
+
+    class Config:
+        from_attributes = True  # Renamed from orm_mode in Pydantic v2
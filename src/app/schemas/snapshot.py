@@ -0,0 +1,17 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from .dynamic_map_data import DynamicMapData
+from .map_war_report import MapWarReport
+from .war_state import WarState
+
+
+class ShardSnapshot(BaseModel):
+    # last REV stored at or before the asked time, and when it was stored
+    REV: int
+    tmstmp: datetime
+    warState: Optional[WarState]
+    mapWarReports: List[MapWarReport]
+    dynamicMapData: List[DynamicMapData]
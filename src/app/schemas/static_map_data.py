@@ -1,6 +1,27 @@
+from typing import List, Optional
 from pydantic import BaseModel
 
 
+class StaticMapDataItem(BaseModel):
+    id: int
+    REV: int
+    StaticMapData_id: int
+    text: Optional[str]
+    x: Optional[float]
+    y: Optional[float]
+    mapMarkerType: Optional[str]
+
+
 class StaticMapData(BaseModel):
+    id: int
+    REV: int
+    hex_id: int
+    shard_id: int
+    warNumber: Optional[int]
+    regionId: Optional[int]
+    scorchedVictoryTowns: Optional[int]
+    version: Optional[int]
+    mapTextItems: List[StaticMapDataItem]
+
     class Config:
         from_attributes = True  # Renamed from orm_mode in Pydantic v2
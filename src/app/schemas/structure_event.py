@@ -0,0 +1,24 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class StructureEvent(BaseModel):
+    """
+    Change of `teamId` or `flags` of a map item between two stored snapshots of its hex.
+    """
+
+    id: int
+    REV: int
+    shard_id: int
+    hex_id: int
+    iconType: Optional[int]
+    x: Optional[float]
+    y: Optional[float]
+    teamId: Optional[str]
+    previousTeamId: Optional[str]
+    flags: Optional[int]
+    previousFlags: Optional[int]
+
+    class Config:
+        from_attributes = True  # Renamed from orm_mode in Pydantic v2
@@ -0,0 +1,121 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Type
+
+import msgspec
+
+from src.app.schemas.warapiEndpointEnum import warapiEndpoints
+
+# Typed War API payloads, decoded straight from response bytes.
+# Fields we don't store (`mapItemsC`, `mapItemsW`, `lastUpdated`, ...) are not declared,
+# so the decoder skips them without allocating anything.
+
+
+class EpochMillis(datetime):
+    """
+    War API timestamp, sent as milliseconds since epoch. Converted while decoding.
+    """
+
+
+def _dec_hook(type_: Type, obj: Any) -> Any:
+    if type_ is EpochMillis:
+        return EpochMillis.fromtimestamp(int(obj / 1000))
+    raise NotImplementedError(f"Unsupported type {type_}")
+
+
+class WarStatePayload(msgspec.Struct):
+    warNumber: int
+    warId: Optional[str] = None
+    winner: Optional[str] = None
+    conquestStartTime: Optional[EpochMillis] = None
+    conquestEndTime: Optional[EpochMillis] = None
+    resistanceStartTime: Optional[EpochMillis] = None
+    scheduledConquestEndTime: Optional[EpochMillis] = None
+    requiredVictoryTowns: Optional[int] = None
+    shortRequiredVictoryTowns: Optional[int] = None
+
+
+class MapWarReportPayload(msgspec.Struct):
+    totalEnlistments: Optional[int] = None
+    colonialCasualties: Optional[int] = None
+    wardenCasualties: Optional[int] = None
+    dayOfWar: Optional[int] = None
+    version: Optional[int] = None
+
+
+class MapItemPayload(msgspec.Struct):
+    teamId: Optional[str] = None
+    iconType: Optional[int] = None
+    x: Optional[float] = None
+    y: Optional[float] = None
+    flags: Optional[int] = None
+    viewDirection: Optional[int] = None
+
+
+class MapTextItemPayload(msgspec.Struct):
+    text: Optional[str] = None
+    x: Optional[float] = None
+    y: Optional[float] = None
+    mapMarkerType: Optional[str] = None
+
+
+class DynamicMapDataPayload(msgspec.Struct):
+    regionId: Optional[int] = None
+    scorchedVictoryTowns: Optional[int] = None
+    version: Optional[int] = None
+    mapItems: List[MapItemPayload] = []
+
+
+class StaticMapDataPayload(msgspec.Struct):
+    regionId: Optional[int] = None
+    scorchedVictoryTowns: Optional[int] = None
+    version: Optional[int] = None
+    mapTextItems: List[MapTextItemPayload] = []
+
+
+class WarDataPayload(msgspec.Struct):
+    """
+    Whole poll of a shard, as dumped in `war_data.json`.
+    """
+
+    war_state: Optional[WarStatePayload] = None
+    map_list: Optional[List[str]] = None
+    map_war_report: Optional[Dict[str, MapWarReportPayload]] = None
+    static_map_data: Optional[Dict[str, StaticMapDataPayload]] = None
+    dynamic_map_data: Optional[Dict[str, DynamicMapDataPayload]] = None
+
+
+_decoders: Dict[str, msgspec.json.Decoder] = {
+    warapiEndpoints.war_state.name: msgspec.json.Decoder(
+        WarStatePayload, dec_hook=_dec_hook
+    ),
+    warapiEndpoints.map_list.name: msgspec.json.Decoder(List[str]),
+    warapiEndpoints.map_war_report.name: msgspec.json.Decoder(MapWarReportPayload),
+    warapiEndpoints.static_map_data.name: msgspec.json.Decoder(StaticMapDataPayload),
+    warapiEndpoints.dynamic_map_data.name: msgspec.json.Decoder(DynamicMapDataPayload),
+}
+_war_data_decoder = msgspec.json.Decoder(WarDataPayload, dec_hook=_dec_hook)
+
+
+def decode_payload(endpoint: warapiEndpoints, raw: bytes) -> Any:
+    return _decoders[endpoint.name].decode(raw)
+
+
+def decode_war_data(raw: bytes) -> Dict[str, Any]:
+    """
+    Decodes whole poll into the same dict `war_api_client.get_current_war_data` returns.
+    """
+    war_data = _war_data_decoder.decode(raw)
+    return {
+        x: getattr(war_data, x)
+        for x in war_data.__struct_fields__
+        if getattr(war_data, x) is not None
+    }
+
+
+def to_row(payload: msgspec.Struct, exclude: tuple = ()) -> Dict[str, Any]:
+    """
+    Plain dict of payload fields, ready to be extended into a DB row.
+    """
+    return {
+        x: getattr(payload, x) for x in payload.__struct_fields__ if x not in exclude
+    }
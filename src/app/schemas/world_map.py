@@ -0,0 +1,33 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class WorldMapItem(BaseModel):
+    """
+    Map item with its position in world coordinates, in meters from the center of Deadlands.
+    Dynamic items (structures) carry team and icon, static ones (place names) text.
+    """
+
+    hex_id: int
+    x: float
+    y: float
+    worldX: float
+    worldY: float
+    teamId: Optional[str] = None
+    iconType: Optional[int] = None
+    flags: Optional[int] = None
+    viewDirection: Optional[int] = None
+    text: Optional[str] = None
+    mapMarkerType: Optional[str] = None
+    # meters from the center of a radius query
+    distance: Optional[float] = None
+
+
+class WorldMapHex(BaseModel):
+    name: str
+    # top left corner of the hex's bounding box, and its size, in meters
+    worldX: float
+    worldY: float
+    width: float
+    height: float
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import msgspec
+
+from src.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# per-map entities of a notification, listing hex ids stored by the poll
+HEX_KEYS = ["map_war_report", "static_map_data", "dynamic_map_data"]
+
+
+class Subscription:
+    """
+    Stored polls of a shard, as encoded JSON notifications, optionally only those
+    which changed one of `hex_ids`. `get` returns None once the subscription is closed.
+    """
+
+    def __init__(self, shard_id: int, hex_ids: Optional[Iterable[int]] = None):
+        self.shard_id = shard_id
+        self.hex_ids: Optional[Set[int]] = set(hex_ids) if hex_ids else None
+        self.dropped = False
+        self._queue: asyncio.Queue[Optional[bytes]] = asyncio.Queue(
+            maxsize=settings.FEED_QUEUE_SIZE
+        )
+
+    async def get(self) -> Optional[bytes]:
+        return await self._queue.get()
+
+    def offer(self, message: bytes) -> bool:
+        """
+        Queues `message` without waiting, False if the queue is full.
+        """
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def close(self):
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+
+class ChangeFeed:
+    """
+    In-process pub/sub of stored polls, keyed by shard id. The ingestor publishes
+    a notification after every committed poll; it is encoded once and put into
+    the queue of each subscriber. Queues are bounded by `FEED_QUEUE_SIZE`,
+    a subscriber which lets its queue fill up is dropped instead of holding
+    the ingestor back or buffering without limit.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+
+    def subscribe(
+        self, shard_id: int, hex_ids: Optional[Iterable[int]] = None
+    ) -> Subscription:
+        subscription = Subscription(shard_id, hex_ids)
+        self._subscribers.setdefault(shard_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.get(subscription.shard_id, set()).discard(subscription)
+        subscription.close()
+
+    def subscriber_count(self, shard_id: int) -> int:
+        return len(self._subscribers.get(shard_id, ()))
+
+    def publish(self, shard_id: int, notification: Dict[str, Any]):
+        """
+        Sends `notification` of a committed poll to subscribers of the shard.
+        Subscribers of hexes get it only if the poll stored one of them,
+        with hex lists narrowed down to their hexes.
+        """
+        subscribers = self._subscribers.get(shard_id)
+        if not subscribers:
+            return
+        encoded = msgspec.json.encode(notification)
+        for subscription in list(subscribers):
+            message: Optional[bytes] = encoded
+            if subscription.hex_ids is not None:
+                message = _narrow(notification, subscription.hex_ids)
+            if message is None:
+                continue
+            if not subscription.offer(message):
+                logger.warning(
+                    f"Dropping slow subscriber of shard {shard_id}, "
+                    f"{settings.FEED_QUEUE_SIZE} notifications unread."
+                )
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+
+
+def _narrow(notification: Dict[str, Any], hex_ids: Set[int]) -> Optional[bytes]:
+    narrowed: Dict[str, List[int]] = {
+        x: [y for y in notification[x] if y in hex_ids]
+        for x in HEX_KEYS
+        if x in notification
+    }
+    if not any(narrowed.values()):
+        return None
+    return msgspec.json.encode(notification | narrowed)
+
+
+change_feed = ChangeFeed()
@@ -1,194 +1,302 @@
-from datetime import datetime
 import logging
-from typing import Any, Dict, List, Tuple
-from src.app.database.models import REV, Hex, Shard
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import httpx
+from src.app.database.models import REV, Shard
 from src.app.services import war_api_client
+from src.app.services.change_feed import change_feed
+from src.app.services.report_rollups import store_rollups
+from src.app.services.rev_index import rev_index
+from src.app.services.spatial_index import spatial_index
 from src.app.database import crud
+from src.app.core.config import settings
 from src.app.database.session import AsyncSessionLocal
+from src.app.schemas.war_api_payloads import (
+    DynamicMapDataPayload,
+    MapWarReportPayload,
+    StaticMapDataPayload,
+    WarStatePayload,
+    decode_war_data,
+    to_row,
+)
+from src.app.schemas.warapiEndpointEnum import warapiEndpoints
+from src.app.services.delta_encoder import dynamic_delta_encoder
+from src.app.services.identity_registry import identity_registry
+from src.app.services.ingest_pipeline import run_ingest_pipeline
+from src.app.services.state_cache import state_cache
+from src.app.services.structure_events import structure_event_detector
+from src.app.services.version_registry import version_registry
+from src.app.services.war_lifecycle import war_lifecycle
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-async def fetch_and_store_war_data(base_url: str):
+# per-map endpoints, in the order they are written
+MAP_ENDPOINTS = [
+    warapiEndpoints.map_war_report,
+    warapiEndpoints.static_map_data,
+    warapiEndpoints.dynamic_map_data,
+]
+
+
+async def fetch_and_store_war_data(
+    client: httpx.AsyncClient,
+    base_url: str,
+    endpoints: Optional[Iterable[warapiEndpoints]] = None,
+) -> Optional[Dict[str, Any]]:
     """
     High-level service function to orchestrate fetching and storing data.
+    Fetches only `endpoints` if given. War state and map list are fetched first,
+    per-map endpoints are then written while still being fetched, see `run_ingest_pipeline`.
+    Returns stored war state and map list, or None if nothing was stored.
     """
     logger.info("Starting data ingestion...")
+    # leftovers of a poll cancelled by timeout
+    version_registry.discard(base_url)
+    requested = set(warapiEndpoints) if endpoints is None else set(endpoints)
+    map_endpoints = [x for x in MAP_ENDPOINTS if x in requested]
+    head = requested - set(MAP_ENDPOINTS)
+    if map_endpoints:
+        head.add(warapiEndpoints.map_list)
     try:
-        # 1. Fetch data from external API
+        # 1. Fetch war state and map list from external API
         mock = False
         if not mock:
-            war_data = await war_api_client.get_current_war_data(base_url)
+            war_data = await war_api_client.get_current_war_data(client, base_url, head)
         else:
-            with open("war_data.json", "r") as file:
-                import json
-
-                war_data = json.load(file)
-                del json
+            with open("war_data.json", "rb") as file:
+                war_data = decode_war_data(file.read())
+            map_endpoints = []
 
         if not war_data:
             logger.warning("No data received from War API.")
-            return
+            return None
 
         # 2. Get a new DB session
         async with AsyncSessionLocal() as db:
-            rev = await crud.create_rev_and_get_id(db)
+            rev = await crud.create_rev_and_get_id(db, commit=False)
 
-            shard = await crud.get_shard(db, url=base_url)
+            shard = await identity_registry.get_shard(db, base_url)
 
             logger.info(
                 f"Inserting data for shard {shard.name if shard else '_unknown_'}."
             )
-            # 3. Pass data to CRUD function to create or update
-            await insert_scraped_data(db, war_data, rev, shard)
+            # 3. Write data as it is fetched, commit once everything is written
+            writer = PollWriter(db, rev, shard)
+            for key, value in war_data.items():
+                await writer.write(key, value)
+            if map_endpoints:
+                await run_ingest_pipeline(
+                    client,
+                    base_url,
+                    war_data.get(warapiEndpoints.map_list.name, []),
+                    map_endpoints,
+                    lambda endpoint, value: writer.write(endpoint.name, value),
+                )
+            await writer.commit()
+            war_state = war_data.get("war_state")
             logger.info(
-                f"Successfully upserted War {war_data.get('war_state', {}).get('warNumber')}. "
+                f"Successfully upserted War {war_state.warNumber if war_state else None}. "
                 f"Shard {shard.name if shard else '_unkown_'}"
             )
+            return war_data
 
     except Exception as e:
+        version_registry.discard(base_url)
         logger.error(f"Error during data ingestion: {e}", exc_info=True)
+        return None
 
 
-async def insert_scraped_data(
-    db, war_data: Dict[str, Any], rev: REV, shard: Shard
-) -> Any:
-    hexes: List[Hex] = []
+class PollWriter:
+    """
+    Writes a poll of a shard part by part, in bulk, one statement per table and part.
+    Everything is a single transaction, committed by `commit`, and registries are
+    only updated after it. War state and map list must be written before per-map data.
+    Hexes whose `version` didn't change since the last stored poll are skipped.
+    """
 
-    for key, value in war_data.items():
+    def __init__(self, db, rev: REV, shard: Shard):
+        self.db = db
+        self.rev = rev
+        self.shard = shard
+        self.hex_ids: Dict[str, int] = {}
+        self.war_id: Optional[str] = None
+        self.war_number: Optional[int] = None
+        self.static_stored = False
+        # hex ids stored per per-map endpoint, published after commit
+        self.stored_hexes: Dict[str, List[int]] = {}
+        self.stored_reports: List[Dict[str, Any]] = []
+        dynamic_delta_encoder.discard(shard.id)
+        spatial_index.discard(shard.id)
+        structure_event_detector.discard(shard.id)
+        identity_registry.discard(shard.url)
+
+    async def write(self, key: str, value: Any):
+        db, rev, shard = self.db, self.rev, self.shard
         match key:
             case "war_state":
                 logger.info("Inserting war state.")
                 value = parse_war_state(value, rev, shard)
-                await crud.upsert_warstate(db, value)
+                self.war_id = value.get("warId")
+                self.war_number = value.get("warNumber")
+                if self.war_number is not None and war_lifecycle.is_new_war(
+                    shard.url, self.war_number
+                ):
+                    logger.info(f"War {self.war_number} started on shard {shard.name}.")
+                    # static map data of the new war must be stored even if versions match
+                    version_registry.forget(
+                        shard.url, warapiEndpoints.static_map_data.name
+                    )
+                await crud.bulk_insert_warstates(db, [value])
 
             case "map_list":
                 logger.info("Inserting map list.")
-                value = parse_map_list(value, rev)
-                for hex in value:
-                    try:
-                        out_hex = await crud.upsert_hex(
-                            db, hex, key_fields=["name"], strict_insert=True
-                        )
-                    except ValueError:
-                        logger.debug(f"Hex {hex} is already in DB.")
-                        out_hex = await crud.get_hex(db, name=hex["name"])
-                    hexes.append(out_hex)
+                self.hex_ids = await identity_registry.resolve_hexes(
+                    db, shard.url, value, rev.REV
+                )
 
             case "map_war_report":
-                logger.info("Inserting map war report.")
-                value = parse_map_war_report(value, rev, shard, hexes)
-                for mapwardata in value:
-                    await crud.upsert_map_war_report(db, mapwardata)
+                logger.info(f"Inserting map war report of {len(value)} hexes.")
+                value = skip_unchanged_hexes(
+                    value, shard, warapiEndpoints.map_war_report
+                )
+                value = parse_map_war_report(value, rev, shard, self.hex_ids)
+                await crud.bulk_insert_map_war_reports(db, value)
+                self.stored_reports.extend(value)
+                self.stored_hexes.setdefault(key, []).extend(x["hex_id"] for x in value)
 
             case "static_map_data":
-                logger.info("Inserting static map data.")
-                value = parse_static_map_data(value, rev, shard, hexes)
-                for static_map_data in value:
-                    out_static_data = await crud.upsert_static_map_data(
-                        db, static_map_data[0], strict_insert=True
-                    )
-                    upsert_items = [
-                        x | {"StaticMapData_id": out_static_data.id}
-                        for x in static_map_data[1]
-                    ]
-                    for item in upsert_items:
-                        await crud.upsert_static_map_data_item(
-                            db, item, strict_insert=True
-                        )
+                logger.info(f"Inserting static map data of {len(value)} hexes.")
+                value = skip_unchanged_hexes(
+                    value, shard, warapiEndpoints.static_map_data
+                )
+                static_war_number = (
+                    self.war_number
+                    if self.war_number is not None
+                    else war_lifecycle.current_war(shard.url)
+                )
+                value = parse_static_map_data(
+                    value, rev, shard, self.hex_ids, static_war_number
+                )
+                spatial_index.stage(shard.id, "static", value, self.hex_ids)
+                await crud.bulk_insert_static_map_data(db, value)
+                self.static_stored = True
+                self.stored_hexes.setdefault(key, []).extend(
+                    x["hex_id"] for x, _ in value
+                )
 
             case "dynamic_map_data":
-                logger.info("Inserting dynamic map data.")
-                value = parse_dynamic_map_data(value, rev, shard, hexes)
-                for dynamic_map_data in value:
-                    out_dynamic_data = await crud.upsert_dynamic_map_data(
-                        db, dynamic_map_data[0], strict_insert=True
-                    )
-                    upsert_items = [
-                        x | {"DynamicMapData_id": out_dynamic_data.id}
-                        for x in dynamic_map_data[1]
-                    ]
-                    for item in upsert_items:
-                        await crud.upsert_dynamic_map_data_item(
-                            db, item, strict_insert=True
-                        )
+                logger.info(f"Inserting dynamic map data of {len(value)} hexes.")
+                value = skip_unchanged_hexes(
+                    value, shard, warapiEndpoints.dynamic_map_data
+                )
+                value = parse_dynamic_map_data(value, rev, shard, self.hex_ids)
+                spatial_index.stage(shard.id, "dynamic", value, self.hex_ids)
+                events = structure_event_detector.detect(shard.id, value)
+                if settings.DYNAMIC_DELTA_STORAGE:
+                    value = encode_dynamic_map_data(value, rev, shard)
+                await crud.bulk_insert_dynamic_map_data(db, value)
+                await crud.bulk_insert_structure_events(db, events)
+                self.stored_hexes.setdefault(key, []).extend(
+                    x["hex_id"] for x, _ in value
+                )
 
             case _:
                 logger.warning(f"Unknown key {key}")
 
+    async def commit(self):
+        await store_rollups(self.db, self.rev, self.stored_reports)
+        await self.db.commit()
+        rev_index.add(self.rev.REV, self.rev.tmstmp)
+        version_registry.commit(self.shard.url)
+        dynamic_delta_encoder.commit(self.shard.id)
+        spatial_index.commit(self.shard.id)
+        structure_event_detector.commit(self.shard.id)
+        identity_registry.commit(self.shard.url)
+        war_lifecycle.observe(
+            self.shard.url, self.war_id, self.war_number, self.static_stored
+        )
+        await state_cache.refresh(
+            self.db,
+            self.shard.id,
+            self.rev.REV,
+            self.hex_ids.values() if self.hex_ids else None,
+        )
+        if self.war_number is not None or any(self.stored_hexes.values()):
+            change_feed.publish(
+                self.shard.id,
+                {
+                    "shard_id": self.shard.id,
+                    "REV": self.rev.REV,
+                    "warNumber": self.war_number,
+                    "war_state": self.war_number is not None,
+                }
+                | self.stored_hexes,
+            )
+
 
-def parse_war_state(data: Dict[str, Any], rev: REV, shard: Shard) -> Dict[str, Any]:
+def skip_unchanged_hexes(
+    data: Dict[str, Any], shard: Shard, endpoint: warapiEndpoints
+) -> Dict[str, Any]:
     """
-    Ensured date fields are of datetime format
+    Drops hexes whose `version` is already stored and stages versions of the rest.
     """
-    fields = [
-        "conquestStartTime",
-        "conquestEndTime",
-        "resistanceStartTime",
-        "scheduledConquestEndTime",
-    ]
-    for field in fields:
-        if field not in data:
-            continue
-        if not data[field]:
+    out = {}
+    for key, value in data.items():
+        version = value.version
+        if version_registry.is_stored(shard.url, key, endpoint.name, version):
             continue
-        data[field] = datetime.fromtimestamp(int(data[field] / 1000))
+        version_registry.stage(shard.url, key, endpoint.name, version=version)
+        out[key] = value
 
-    data["REV"] = rev.REV
-    data["shard_id"] = shard.id
-
-    return data
+    logger.info(f"Skipping {len(data) - len(out)} unchanged hexes of {endpoint.name}.")
+    return out
 
 
-def parse_map_list(data: List[Dict[str, Any]], rev: REV) -> List[Dict[str, Any]]:
-    data = [{"id": None, "name": x, "REV": rev.REV} for x in data]
-    return data
+def parse_war_state(data: WarStatePayload, rev: REV, shard: Shard) -> Dict[str, Any]:
+    """
+    Date fields are already converted to datetime by the decoder.
+    """
+    return to_row(data) | {"REV": rev.REV, "shard_id": shard.id}
 
 
 def parse_map_war_report(
-    data: Dict[str, Dict[str, Any]], rev: REV, shard: Shard, hexes: List[Hex]
+    data: Dict[str, MapWarReportPayload],
+    rev: REV,
+    shard: Shard,
+    hex_ids: Dict[str, int],
 ) -> List[Dict[str, Any]]:
     out = []
     for key, value in data.items():
-        hex = [x for x in hexes if x.name == key][0]
         item = {
             "REV": rev.REV,
-            "hex_id": hex.id,
+            "hex_id": hex_ids[key],
             "shard_id": shard.id,
-        } | value
+        } | to_row(value)
         out.append(item)
     return out
 
 
 def parse_static_map_data(
-    data: Dict[str, Dict[str, Any]], rev: REV, shard: Shard, hexes: List[Hex]
+    data: Dict[str, StaticMapDataPayload],
+    rev: REV,
+    shard: Shard,
+    hex_ids: Dict[str, int],
+    war_number: Optional[int],
 ) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
     out: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]] = []
 
     for key, value in data.items():
-        hex = [x for x in hexes if x.name == key][0]
-
         # adding id from other tables
         item: Dict[str, Any] = {
             "REV": rev.REV,
-            "hex_id": hex.id,
+            "hex_id": hex_ids[key],
             "shard_id": shard.id,
-        } | value
-
-        # removing unused data
-        to_pop = ["mapItemsW", "mapItems", "lastUpdated", "mapItemsC"]
-        for x in to_pop:
-            item.pop(x)
+            "warNumber": war_number,
+        } | to_row(value, exclude=("mapTextItems",))
 
         # separating sub-items
-        try:
-            data_items: List[Dict[str, Any]] = item.pop("mapTextItems")
-        except (ValueError, IndexError):
-            data_items = []
-
-        for data_item in data_items:
-            data_item |= {"REV": rev.REV}
+        data_items = [to_row(x) | {"REV": rev.REV} for x in value.mapTextItems]
 
         out.append((item, data_items))
 
@@ -196,34 +304,39 @@ def parse_static_map_data(
 
 
 def parse_dynamic_map_data(
-    data: Dict[str, Dict[str, Any]], rev: REV, shard: Shard, hexes: List[Hex]
+    data: Dict[str, DynamicMapDataPayload],
+    rev: REV,
+    shard: Shard,
+    hex_ids: Dict[str, int],
 ) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
     out: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]] = []
 
     for key, value in data.items():
-        hex = [x for x in hexes if x.name == key][0]
-
         # adding id from other tables
         item: Dict[str, Any] = {
             "REV": rev.REV,
-            "hex_id": hex.id,
+            "hex_id": hex_ids[key],
             "shard_id": shard.id,
-        } | value
-
-        # removing unused data
-        to_pop = ["mapItemsW", "mapTextItems", "lastUpdated", "mapItemsC"]
-        for x in to_pop:
-            item.pop(x)
+        } | to_row(value, exclude=("mapItems",))
 
         # separating sub-items
-        try:
-            data_items: List[Dict[str, Any]] = item.pop("mapItems")
-        except (ValueError, IndexError):
-            data_items = []
-
-        for data_item in data_items:
-            data_item |= {"REV": rev.REV}
+        data_items = [to_row(x) | {"REV": rev.REV} for x in value.mapItems]
 
         out.append((item, data_items))
 
     return out
+
+
+def encode_dynamic_map_data(
+    data: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]], rev: REV, shard: Shard
+) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    """
+    Replaces items of parsed dynamic map data with deltas against previous snapshot of the hex.
+    """
+    out: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]] = []
+    for item, data_items in data:
+        is_keyframe, data_items = dynamic_delta_encoder.encode(
+            shard.id, item["hex_id"], rev.REV, data_items
+        )
+        out.append((item | {"isKeyframe": is_keyframe}, data_items))
+    return out
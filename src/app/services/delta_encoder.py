@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.app.core.config import settings
+from src.app.database.dynamic_delta import (
+    DELTA_ADDED,
+    DELTA_REMOVED,
+    ItemKey,
+    index_items,
+    item_changed,
+)
+
+
+@dataclass
+class HexSnapshot:
+    items: Optional[Dict[ItemKey, Dict[str, Any]]]  # None if items can't be keyed
+    since_keyframe: int
+
+
+class DynamicDeltaEncoder:
+    """
+    Keeps last stored dynamic map items of every hex in memory and turns new snapshots
+    into deltas against them. A full keyframe is written every `keyframe_interval` snapshots,
+    for hexes not seen since startup and whenever items of a hex can't be keyed uniquely.
+    Like `VersionRegistry`, new snapshots are staged until the poll is committed.
+    """
+
+    def __init__(self, keyframe_interval: int):
+        self.keyframe_interval = keyframe_interval
+        self._current: Dict[Tuple[int, int], HexSnapshot] = {}
+        self._staged: Dict[int, Dict[Tuple[int, int], HexSnapshot]] = {}
+
+    def encode(
+        self, shard_id: int, hex_id: int, rev: int, items: List[Dict[str, Any]]
+    ) -> Tuple[bool, List[Dict[str, Any]]]:
+        """
+        Returns if the snapshot is a keyframe and the item rows to store for it.
+        """
+        indexed = index_items(items)
+        previous = self._current.get((shard_id, hex_id))
+
+        staged = self._staged.setdefault(shard_id, {})
+        if (
+            previous is None
+            or previous.items is None
+            or indexed is None
+            or previous.since_keyframe + 1 >= self.keyframe_interval
+        ):
+            staged[(shard_id, hex_id)] = HexSnapshot(indexed, 0)
+            return True, items
+
+        staged[(shard_id, hex_id)] = HexSnapshot(indexed, previous.since_keyframe + 1)
+
+        rows = [
+            item | {"deltaOp": DELTA_ADDED}
+            for key, item in indexed.items()
+            if key not in previous.items or item_changed(previous.items[key], item)
+        ]
+        rows += [
+            item | {"REV": rev, "deltaOp": DELTA_REMOVED}
+            for key, item in previous.items.items()
+            if key not in indexed
+        ]
+        return False, rows
+
+    def commit(self, shard_id: int):
+        self._current.update(self._staged.pop(shard_id, {}))
+
+    def discard(self, shard_id: int):
+        self._staged.pop(shard_id, None)
+
+
+dynamic_delta_encoder = DynamicDeltaEncoder(settings.DYNAMIC_KEYFRAME_INTERVAL)
@@ -0,0 +1,71 @@
+from typing import Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.database import crud
+from src.app.database.models import Hex, Shard
+
+
+class IdentityRegistry:
+    """
+    Process-wide cache of identities that practically never change:
+    hexes by name and id, shards by url and id, and structure type names by id.
+    Shared by the ingestor and the API. Warmed at startup, hexes are only
+    looked up in DB again when map list brings names the registry doesn't know.
+    Hexes created during a poll are staged until the poll is committed.
+    """
+
+    def __init__(self):
+        self.hexes: Dict[str, Hex] = {}
+        self.hexes_by_id: Dict[int, Hex] = {}
+        self.shards: Dict[str, Shard] = {}
+        self.shards_by_id: Dict[int, Shard] = {}
+        self.structure_types: Dict[int, str] = {}
+        self._staged_hexes: Dict[str, Dict[str, Hex]] = {}
+
+    async def warm(self, db: AsyncSession):
+        hexes = await crud.list_hexes(db, limit=None)
+        self.hexes = {x.name: x for x in hexes}
+        self.hexes_by_id = {x.id: x for x in hexes}
+
+        shards = await crud.list_shards(db, limit=None)
+        self.shards = {x.url: x for x in shards}
+        self.shards_by_id = {x.id: x for x in shards}
+
+        structure_types = await crud.list_structure_types(db, limit=None)
+        self.structure_types = {x.id: x.name for x in structure_types}
+
+    async def get_shard(self, db: AsyncSession, url: str) -> Optional[Shard]:
+        if url not in self.shards:
+            shard = await crud.get_shard(db, url=url)
+            if shard is None:
+                return None
+            self.shards[url] = shard
+            self.shards_by_id[shard.id] = shard
+        return self.shards[url]
+
+    async def resolve_hexes(
+        self, db: AsyncSession, shard_url: str, names: List[str], rev: int
+    ) -> Dict[str, int]:
+        """
+        Returns hex ids by name for all `names`, creating the unknown ones in `db`.
+        Created hexes are staged under `shard_url`. Does not commit.
+        """
+        staged = self._staged_hexes.setdefault(shard_url, {})
+        missing = [x for x in names if x not in self.hexes and x not in staged]
+        if missing:
+            for hex in await crud.get_or_create_hexes(db, missing, rev):
+                staged[hex.name] = hex
+
+        return {x: (self.hexes.get(x) or staged[x]).id for x in names}
+
+    def commit(self, shard_url: str):
+        for hex in self._staged_hexes.pop(shard_url, {}).values():
+            self.hexes[hex.name] = hex
+            self.hexes_by_id[hex.id] = hex
+
+    def discard(self, shard_url: str):
+        self._staged_hexes.pop(shard_url, None)
+
+
+identity_registry = IdentityRegistry()
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+
+import httpx
+
+from src.app.core.config import settings
+from src.app.schemas.warapiEndpointEnum import warapiEndpoints
+from src.app.services import war_api_client
+
+logger = logging.getLogger(__name__)
+
+# marks the end of fetching in the result queue
+_DONE = object()
+
+Writer = Callable[[warapiEndpoints, Dict[str, Any]], Awaitable[None]]
+
+
+@dataclass
+class PipelineStats:
+    fetched: int = 0
+    batches: int = 0
+    max_queue_depth: int = 0
+    fetch_seconds: float = 0.0
+    total_seconds: float = 0.0
+
+
+async def run_ingest_pipeline(
+    client: httpx.AsyncClient,
+    base_url: str,
+    maps: List[str],
+    endpoints: List[warapiEndpoints],
+    write: Writer,
+) -> PipelineStats:
+    """
+    Fetches per-map `endpoints` of all `maps` and passes payloads to `write` as they arrive.
+    `INGEST_FETCH_WORKERS` fetchers feed a queue bounded by `INGEST_QUEUE_SIZE`, drained by
+    a single writer, as a poll is one transaction. The writer takes whatever is queued, up to
+    `INGEST_WRITE_BATCH` payloads, and writes it grouped by endpoint, in `endpoints` order.
+    When the writer falls behind, the full queue blocks the fetchers.
+    Endpoints which brought nothing (all 304) are written empty at the end.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    stats = PipelineStats()
+
+    jobs: asyncio.Queue[Tuple[warapiEndpoints, str]] = asyncio.Queue()
+    for endpoint in endpoints:
+        for map_ in maps:
+            jobs.put_nowait((endpoint, map_))
+    results: asyncio.Queue[Any] = asyncio.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+
+    async def fetch():
+        while not jobs.empty():
+            endpoint, map_ = jobs.get_nowait()
+            payload = await war_api_client.get_from_map_endpoint(
+                client,
+                base_url,
+                endpoint.value.format(map_name=map_),
+                map_,
+                endpoint,
+            )
+            await results.put((endpoint, payload))
+            stats.fetched += 1
+
+    async def close(fetchers: List[asyncio.Task]):
+        await asyncio.wait(fetchers)
+        stats.fetch_seconds = loop.time() - start
+        await results.put(_DONE)
+
+    async def drain():
+        written: Set[warapiEndpoints] = set()
+        done = False
+        while not done:
+            batch = [await results.get()]
+            stats.max_queue_depth = max(stats.max_queue_depth, results.qsize() + 1)
+            while len(batch) < settings.INGEST_WRITE_BATCH and not results.empty():
+                batch.append(results.get_nowait())
+            if batch[-1] is _DONE:
+                batch.pop()
+                done = True
+
+            grouped: Dict[warapiEndpoints, Dict[str, Any]] = {}
+            for endpoint, payload in batch:
+                grouped.setdefault(endpoint, {}).update(payload)
+            for endpoint in endpoints:
+                if grouped.get(endpoint):
+                    await write(endpoint, grouped[endpoint])
+                    written.add(endpoint)
+            if batch:
+                stats.batches += 1
+                logger.debug(
+                    f"Wrote {len(batch)} payloads of {base_url}, "
+                    f"{results.qsize()} queued."
+                )
+
+        for endpoint in endpoints:
+            if endpoint not in written:
+                await write(endpoint, {})
+
+    workers = max(1, min(settings.INGEST_FETCH_WORKERS, jobs.qsize()))
+    async with asyncio.TaskGroup() as tg:
+        fetchers = [tg.create_task(fetch()) for _ in range(workers)]
+        tg.create_task(close(fetchers))
+        tg.create_task(drain())
+
+    stats.total_seconds = loop.time() - start
+    logger.info(
+        f"Pipeline of {base_url}: {stats.fetched} payloads by {workers} fetchers "
+        f"in {stats.fetch_seconds:.2f}s, written in {stats.batches} batches, "
+        f"{stats.total_seconds:.2f}s total. "
+        f"Max queue depth {stats.max_queue_depth}/{settings.INGEST_QUEUE_SIZE}."
+    )
+    return stats
@@ -0,0 +1,154 @@
+"""
+Time-bucketed rollups of map war reports, see `MapWarReportRollup`.
+The ingestor stores them with every poll. Fill them from existing history,
+with the poller stopped, by running
+
+    python -m src.app.services.report_rollups
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.core.config import settings
+from src.app.database import crud
+from src.app.database.models import REV
+from src.app.database.session import AsyncSessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+# bucket sizes in seconds: 5 minutes, hour, day
+RESOLUTIONS = [300, 3600, 86400]
+COUNTERS = ["totalEnlistments", "colonialCasualties", "wardenCasualties", "dayOfWar"]
+_EPOCH = datetime(1970, 1, 1)
+
+
+def bucket_start(tmstmp: datetime, resolution: int) -> datetime:
+    # REV timestamps are UTC
+    seconds = int((tmstmp.replace(tzinfo=None) - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=seconds - seconds % resolution)
+
+
+def pick_resolution(datetime_from: datetime, datetime_to: datetime) -> int:
+    """
+    Finest resolution giving at most `ROLLUP_MAX_POINTS` buckets over the range.
+    """
+    span = (datetime_to - datetime_from).total_seconds()
+    for resolution in RESOLUTIONS:
+        if span / resolution <= settings.ROLLUP_MAX_POINTS:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def rollup_rows(
+    shard_id: int,
+    rev: int,
+    tmstmp: datetime,
+    reports: List[Dict[str, Any]],
+    totals: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    """
+    Rows of a poll for every resolution: one per hex of `reports`, and hex 0 of `totals`.
+    """
+    rows = []
+    for resolution in RESOLUTIONS:
+        bucket = bucket_start(tmstmp, resolution)
+        for values in [*reports, totals | {"hex_id": 0}]:
+            rows.append(
+                {
+                    "shard_id": shard_id,
+                    "hex_id": values["hex_id"],
+                    "resolution": resolution,
+                    "bucket": bucket,
+                    "REV": rev,
+                }
+                | {x: values.get(x) for x in COUNTERS}
+            )
+    return rows
+
+
+async def store_rollups(db: AsyncSession, rev: REV, reports: List[Dict[str, Any]]):
+    """
+    Updates rollups with map war reports stored by a poll. Call after they are inserted,
+    in the same transaction, as shard totals are read through `LatestRow`.
+    """
+    if not reports:
+        return
+    shard_id = reports[0]["shard_id"]
+    totals = await crud.get_map_war_report_totals(db, shard_id)
+    await crud.upsert_map_war_report_rollups(
+        db, rollup_rows(shard_id, rev.REV, rev.tmstmp, reports, totals)
+    )
+
+
+def _totals(latest: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Same as `crud.get_map_war_report_totals`, of newest reports kept in memory.
+    """
+    totals: Dict[str, Optional[int]] = {}
+    for x in COUNTERS:
+        values = [y[x] for y in latest.values() if y[x] is not None]
+        if not values:
+            totals[x] = None
+        elif x == "dayOfWar":
+            totals[x] = max(values)
+        else:
+            totals[x] = sum(values)
+    return totals
+
+
+async def backfill(batch_size: int = 5000) -> int:
+    """
+    Rebuilds rollups of all stored map war reports by replaying them in REV order.
+    Returns number of rows written.
+    """
+    written = 0
+    pending: List[Dict[str, Any]] = []
+    # shard_id -> hex_id -> newest report
+    latest: Dict[int, Dict[int, Dict[str, Any]]] = {}
+    poll: List[Dict[str, Any]] = []
+
+    def close_poll():
+        shard = latest.setdefault(poll[0]["shard_id"], {})
+        shard.update({x["hex_id"]: x for x in poll})
+        pending.extend(
+            rollup_rows(
+                poll[0]["shard_id"],
+                poll[0]["REV"],
+                poll[0]["tmstmp"],
+                poll,
+                _totals(shard),
+            )
+        )
+        poll.clear()
+
+    async with AsyncSessionLocal() as reader, AsyncSessionLocal() as writer:
+        async for row in crud.stream_map_war_report_history(reader):
+            # a REV is a poll of a single shard
+            if poll and row["REV"] != poll[0]["REV"]:
+                close_poll()
+                if len(pending) >= batch_size:
+                    await crud.upsert_map_war_report_rollups(writer, pending)
+                    await writer.commit()
+                    written += len(pending)
+                    pending.clear()
+            poll.append(row)
+        if poll:
+            close_poll()
+        await crud.upsert_map_war_report_rollups(writer, pending)
+        await writer.commit()
+        written += len(pending)
+    return written
+
+
+async def _main():
+    logger.info(f"Wrote {await backfill()} rollup rows.")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    asyncio.run(_main())
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from src.app.core.config import RetentionTier, settings
+from src.app.database import crud
+from src.app.database.models import DynamicMapData, MapWarReport, Shard, WarState
+from src.app.database.session import AsyncSessionLocal
+from src.app.services.report_rollups import bucket_start
+
+logger = logging.getLogger(__name__)
+
+# tables `RETENTION_POLICIES_JSON` may name
+MODELS: Dict[str, Type[Any]] = {
+    x.__tablename__: x for x in [WarState, MapWarReport, DynamicMapData]
+}
+
+
+@dataclass
+class Compaction:
+    """
+    Snapshots of a REV slice to delete, and delta snapshots to turn into keyframes first.
+    """
+
+    delete: List[int] = field(default_factory=list)
+    keyframes: List[int] = field(default_factory=list)
+
+
+def close_bucket(model: Type[Any], rows: List[Any], out: Compaction):
+    """
+    Keeps the last snapshot of a hex in a bucket and deletes the rest. A kept delta
+    snapshot would lose its base, so it is materialized into a keyframe.
+    """
+    kept, dropped = rows[-1], rows[:-1]
+    if not dropped:
+        return
+    out.delete.extend(x.id for x in dropped)
+    if model is DynamicMapData and not kept.isKeyframe:
+        out.keyframes.append(kept.id)
+
+
+def tier_cutoff(
+    now: datetime, tier: RetentionTier, war_start: Optional[datetime] = None
+) -> datetime:
+    """
+    Snapshots before the cutoff are thinned by `tier`. It is a bucket boundary, so a bucket
+    is never thinned in two parts each keeping a snapshot. With `finished_wars_only`, it is
+    the start of the bucket the current war started in.
+    """
+    cutoff = bucket_start(now - timedelta(hours=tier.after_hours), tier.keep_every)
+    if tier.finished_wars_only and war_start is not None:
+        cutoff = min(cutoff, bucket_start(war_start, tier.keep_every))
+    return cutoff
+
+
+# hex_id -> (bucket, snapshots of the hex in it so far)
+OpenBuckets = Dict[int, Tuple[datetime, List[Any]]]
+
+
+def compact_slice(
+    model: Type[Any],
+    rows: List[Any],
+    keep_every: int,
+    open_buckets: OpenBuckets,
+    last: bool,
+) -> Compaction:
+    """
+    Closes buckets of hexes of a REV slice, rows ordered by REV. Buckets still open at the
+    end of the slice carry over to the next one in `open_buckets`, the `last` slice
+    closes them all.
+    """
+    out = Compaction()
+    for row in rows:
+        bucket = bucket_start(row.tmstmp, keep_every)
+        current = open_buckets.get(row.hex_id)
+        if current is None or current[0] != bucket:
+            if current is not None:
+                close_bucket(model, current[1], out)
+            current = open_buckets[row.hex_id] = (bucket, [])
+        current[1].append(row)
+    if last:
+        for _, bucket_rows in open_buckets.values():
+            close_bucket(model, bucket_rows, out)
+    return out
+
+
+class RetentionEngine:
+    """
+    Thins out history per `RETENTION_POLICIES_JSON` in the background.
+    Each tier keeps the last snapshot per hex in every bucket of its `keep_every`,
+    for snapshots older than its age, cut at bucket boundaries. Tables are walked by shard
+    in slices of `RETENTION_REV_CHUNK` REVs, and deleted in transactions of
+    `RETENTION_BATCH_SIZE` snapshots, so the ingestor is never locked out for long.
+    The newest snapshot of a hex is always the last one of its bucket, so `LatestRow`
+    pointers stay valid. The highest REV compacted per table, shard and `keep_every` is
+    stored in `RetentionWatermark`, so runs resume there, also after a restart.
+    """
+
+    def __init__(self):
+        # (table, shard id, keep_every) -> highest REV compacted
+        self._compacted: Dict[Tuple[str, int, int], int] = {}
+
+    async def run(self):
+        while True:
+            try:
+                await self.compact_all()
+            except Exception as e:
+                logger.error(f"Retention run failed: {e}", exc_info=True)
+            await asyncio.sleep(settings.RETENTION_INTERVAL)
+
+    async def compact_all(self) -> int:
+        """
+        Applies every tier of every table to every shard. Returns number of deleted snapshots.
+        """
+        async with AsyncSessionLocal() as db:
+            shards: List[Shard] = await crud.list_shards(db, limit=None)
+            self._compacted = await crud.list_retention_watermarks(db)
+        deleted = 0
+        for table, tiers in settings.RETENTION_POLICIES_JSON.items():
+            if table not in MODELS:
+                logger.warning(f"No retention for unknown table {table}.")
+                continue
+            for tier in tiers:
+                for shard in shards:
+                    deleted += await self.compact(MODELS[table], shard.id, tier)
+        logger.info(f"Retention run deleted {deleted} snapshots.")
+        return deleted
+
+    async def compact(
+        self, model: Type[Any], shard_id: int, tier: RetentionTier
+    ) -> int:
+        # REV timestamps are UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        async with AsyncSessionLocal() as db:
+            war_start = None
+            if tier.finished_wars_only:
+                war_start_rev = await crud.get_war_start_REV(db, shard_id)
+                if war_start_rev is None:
+                    return 0
+                war_start = (await crud.get_rev(db, war_start_rev)).tmstmp
+            cutoff = tier_cutoff(now, tier, war_start)
+            rev_to = await crud.get_REV_before(db, cutoff)
+        key = (model.__tablename__, shard_id, tier.keep_every)
+        rev_from = self._compacted.get(key, 0) + 1
+        if rev_to is None or rev_to < rev_from:
+            return 0
+
+        deleted = 0
+        open_buckets: OpenBuckets = {}
+        while rev_from <= rev_to:
+            slice_to = min(rev_from + settings.RETENTION_REV_CHUNK - 1, rev_to)
+            async with AsyncSessionLocal() as db:
+                rows = await crud.list_retention_rows(
+                    db, model, shard_id, rev_from, slice_to
+                )
+
+            out = compact_slice(
+                model, rows, tier.keep_every, open_buckets, slice_to == rev_to
+            )
+            deleted += await self.apply(model, out)
+            rev_from = slice_to + 1
+
+        async with AsyncSessionLocal() as db:
+            await crud.upsert_retention_watermark(
+                db, model, shard_id, tier.keep_every, rev_to
+            )
+            await db.commit()
+        self._compacted[key] = rev_to
+        if deleted:
+            logger.info(
+                f"Deleted {deleted} snapshots of {model.__tablename__} "
+                f"of shard {shard_id} older than {cutoff}, "
+                f"keeping one per {tier.keep_every} seconds."
+            )
+        return deleted
+
+    async def apply(self, model: Type[Any], out: Compaction) -> int:
+        """
+        Materializes keyframes, then deletes, each in small committed batches.
+        Keyframes go first, so every commit leaves history readable.
+        """
+        batch = settings.RETENTION_BATCH_SIZE
+        deleted = 0
+        for i in range(0, len(out.keyframes), batch):
+            async with AsyncSessionLocal() as db:
+                await crud.materialize_dynamic_keyframes(
+                    db, out.keyframes[i : i + batch]
+                )
+                await db.commit()
+            await asyncio.sleep(settings.RETENTION_PAUSE)
+        for i in range(0, len(out.delete), batch):
+            async with AsyncSessionLocal() as db:
+                deleted += await crud.delete_snapshots(
+                    db, model, out.delete[i : i + batch]
+                )
+                await db.commit()
+            await asyncio.sleep(settings.RETENTION_PAUSE)
+        return deleted
+
+
+retention_engine = RetentionEngine()
@@ -0,0 +1,62 @@
+import bisect
+from array import array
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.database import crud
+
+
+def _seconds(tmstmp: datetime) -> float:
+    """
+    POSIX time of a REV timestamp. Naive timestamps are UTC, as REVs are stored.
+    """
+    if tmstmp.tzinfo is None:
+        tmstmp = tmstmp.replace(tzinfo=timezone.utc)
+    return tmstmp.timestamp()
+
+
+class RevIndex:
+    """
+    Timestamps of all committed REVs, sorted by (tmstmp, REV), to find the REV in effect
+    at a given time by binary search, without touching DB. Kept as two flat arrays,
+    16 bytes a REV. Loaded at startup and extended by the ingestor after every committed poll.
+    """
+
+    def __init__(self):
+        self._times = array("d")
+        self._revs = array("q")
+
+    async def warm(self, db: AsyncSession):
+        self._times = array("d")
+        self._revs = array("q")
+        for rev, tmstmp in await crud.list_rev_times(db):
+            if tmstmp is not None:
+                self.add(rev, tmstmp)
+
+    def add(self, rev: int, tmstmp: datetime):
+        seconds = _seconds(tmstmp)
+        if not self._times or seconds >= self._times[-1]:
+            # polls commit in REV order, almost always
+            self._times.append(seconds)
+            self._revs.append(rev)
+            return
+        index = bisect.bisect_right(self._times, seconds)
+        self._times.insert(index, seconds)
+        self._revs.insert(index, rev)
+
+    def rev_at(self, tmstmp: datetime) -> Optional[Tuple[int, datetime]]:
+        """
+        Last REV stored at or before `tmstmp`, with its timestamp (naive UTC).
+        None if nothing was stored by then.
+        """
+        index = bisect.bisect_right(self._times, _seconds(tmstmp))
+        if not index:
+            return None
+        seconds = self._times[index - 1]
+        at = datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+        return self._revs[index - 1], at
+
+
+rev_index = RevIndex()
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import math
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+
+from src.app.core.config import settings
+from src.app.schemas.warapiEndpointEnum import warapiEndpoints
+from src.app.services.data_ingestor import fetch_and_store_war_data
+from src.app.services.war_lifecycle import war_lifecycle
+
+logger = logging.getLogger(__name__)
+
+
+def default_intervals() -> Dict[warapiEndpoints, float]:
+    """
+    Polling interval in seconds per endpoint. Static map data is stored once per war,
+    its polls only check for changed `version` with conditional requests, see `PollScheduler`.
+    Map list is fetched together with any per-map endpoint.
+    """
+    return {
+        warapiEndpoints.war_state: settings.POLL_INTERVAL_WAR_STATE,
+        warapiEndpoints.static_map_data: settings.POLL_INTERVAL_STATIC_MAP_DATA,
+        warapiEndpoints.map_war_report: settings.POLL_INTERVAL_MAP_WAR_REPORT,
+        warapiEndpoints.dynamic_map_data: settings.POLL_INTERVAL_DYNAMIC_MAP_DATA,
+    }
+
+
+def next_tick(previous: float, interval: float, now: float) -> float:
+    """
+    Next point of the `previous + k * interval` grid after `now`.
+    Keeps the schedule drift-free and skips ticks missed by a slow poll instead of bursting.
+    """
+    if now < previous:
+        return previous
+    return previous + (math.floor((now - previous) / interval) + 1) * interval
+
+
+class PollScheduler:
+    """
+    Polls every shard on its own timers, one per endpoint type.
+    Shards run as independent supervised pipelines: a slow, hanging or crashing shard
+    doesn't delay the others. At most `MAX_CONCURRENT_SHARD_POLLS` polls run at once
+    and each is cut off after `SHARD_POLL_TIMEOUT` seconds.
+    Static map data is also fetched with every poll while `war_lifecycle` has none
+    stored for the current war of the shard. Failed polls are retried on the next tick.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        base_urls: List[str],
+        intervals: Optional[Dict[warapiEndpoints, float]] = None,
+    ):
+        self.client = client
+        self.base_urls = base_urls
+        self.intervals = intervals if intervals is not None else default_intervals()
+        self._poll_slots = asyncio.Semaphore(settings.MAX_CONCURRENT_SHARD_POLLS)
+
+    async def run(self):
+        await asyncio.gather(*[self.supervise_shard(x) for x in self.base_urls])
+
+    async def supervise_shard(self, base_url: str):
+        """
+        Restarts pipeline of a shard if it crashes, without affecting other shards.
+        """
+        while True:
+            try:
+                await self.run_shard(base_url)
+            except Exception as e:
+                logger.error(
+                    f"Pipeline of {base_url} crashed, restarting in "
+                    f"{settings.SHARD_RESTART_DELAY} seconds: {e}",
+                    exc_info=True,
+                )
+                await asyncio.sleep(settings.SHARD_RESTART_DELAY)
+
+    async def poll_shard(
+        self, base_url: str, endpoints: Set[warapiEndpoints]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Single bounded and timed poll of a shard. Returns stored data, or None on failure.
+        """
+        loop = asyncio.get_running_loop()
+        async with self._poll_slots:
+            start = loop.time()
+            try:
+                war_data = await asyncio.wait_for(
+                    fetch_and_store_war_data(self.client, base_url, endpoints),
+                    settings.SHARD_POLL_TIMEOUT,
+                )
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"Poll of {base_url} timed out after {settings.SHARD_POLL_TIMEOUT} seconds."
+                )
+                return None
+            logger.info(
+                f"Poll of {sorted(x.name for x in endpoints)} of {base_url} "
+                f"took {loop.time() - start:.2f} seconds."
+            )
+            return war_data
+
+    async def run_shard(self, base_url: str):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        due_at = {endpoint: start for endpoint in self.intervals}
+        if warapiEndpoints.static_map_data in due_at and not war_lifecycle.needs_static(
+            base_url
+        ):
+            due_at[warapiEndpoints.static_map_data] += self.intervals[
+                warapiEndpoints.static_map_data
+            ]
+
+        while True:
+            now = loop.time()
+            endpoints = {x for x, y in due_at.items() if y <= now}
+            if war_lifecycle.needs_static(base_url):
+                endpoints.add(warapiEndpoints.static_map_data)
+
+            if endpoints:
+                await self.poll_shard(base_url, endpoints)
+
+            now = loop.time()
+            for endpoint in endpoints & due_at.keys():
+                due_at[endpoint] = next_tick(
+                    due_at[endpoint], self.intervals[endpoint], now
+                )
+
+            await asyncio.sleep(max(0.0, min(due_at.values()) - loop.time()))
@@ -0,0 +1,191 @@
+import logging
+import math
+from typing import Any, Dict, Iterable, List, Literal, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.core.config import settings
+from src.app.database import crud
+from src.app.services.identity_registry import identity_registry
+from src.app.services.world_map import project
+
+logger = logging.getLogger(__name__)
+
+# dynamic map items (structures) or static map text items (place names)
+Source = Literal["dynamic", "static"]
+
+# item fields kept in the index, per source
+FIELDS: Dict[str, Tuple[str, ...]] = {
+    "dynamic": ("teamId", "iconType", "flags", "viewDirection"),
+    "static": ("text", "mapMarkerType"),
+}
+
+Cell = Tuple[int, int]
+# (parent row, item rows) as parsed by the ingestor or loaded from DB
+Snapshot = Tuple[Dict[str, Any], List[Dict[str, Any]]]
+
+
+def world_items(source: str, hex_name: str, snapshot: Snapshot) -> List[Dict[str, Any]]:
+    """
+    Items of a hex snapshot with `worldX` and `worldY`, projected all at once.
+    Empty for a hex of unknown position, items without coordinates are left out.
+    """
+    parent, items = snapshot
+    items = [x for x in items if x.get("x") is not None and x.get("y") is not None]
+    world = project(hex_name, [x["x"] for x in items], [x["y"] for x in items])
+    if world is None:
+        return []
+    fields = FIELDS[source]
+    return [
+        {"hex_id": parent["hex_id"], "x": item["x"], "y": item["y"]}
+        | {k: item.get(k) for k in fields}
+        | {"worldX": wx, "worldY": wy}
+        for item, wx, wy in zip(items, *world)
+    ]
+
+
+class SpatialGrid:
+    """
+    Uniform grid of items in world coordinates, in square cells of `cell_size` meters.
+    Items are kept per hex, so a hex is replaced whole when a poll stores it.
+    """
+
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self._hexes: Dict[int, Dict[Cell, List[Dict[str, Any]]]] = {}
+        # cell -> hexes with items in it
+        self._cells: Dict[Cell, Set[int]] = {}
+
+    def _cell(self, x: float, y: float) -> Cell:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def replace_hex(self, hex_id: int, items: List[Dict[str, Any]]):
+        for cell in self._hexes.pop(hex_id, {}):
+            self._cells[cell].discard(hex_id)
+            if not self._cells[cell]:
+                del self._cells[cell]
+        cells: Dict[Cell, List[Dict[str, Any]]] = {}
+        for item in items:
+            cells.setdefault(self._cell(item["worldX"], item["worldY"]), []).append(
+                item
+            )
+        if cells:
+            self._hexes[hex_id] = cells
+        for cell in cells:
+            self._cells.setdefault(cell, set()).add(hex_id)
+
+    def bbox(
+        self, x_min: float, y_min: float, x_max: float, y_max: float
+    ) -> Iterable[Dict[str, Any]]:
+        """
+        Items within the box, bounds included, by cell.
+        """
+        cx_min, cy_min = self._cell(x_min, y_min)
+        cx_max, cy_max = self._cell(x_max, y_max)
+        if (cx_max - cx_min + 1) * (cy_max - cy_min + 1) > len(self._cells):
+            # box larger than the map, walk occupied cells only
+            cells = [
+                x
+                for x in self._cells
+                if cx_min <= x[0] <= cx_max and cy_min <= x[1] <= cy_max
+            ]
+        else:
+            cells = [
+                (cx, cy)
+                for cx in range(cx_min, cx_max + 1)
+                for cy in range(cy_min, cy_max + 1)
+                if (cx, cy) in self._cells
+            ]
+        for cell in cells:
+            for hex_id in self._cells[cell]:
+                for item in self._hexes[hex_id][cell]:
+                    if (
+                        x_min <= item["worldX"] <= x_max
+                        and y_min <= item["worldY"] <= y_max
+                    ):
+                        yield item
+
+    def radius(
+        self, x: float, y: float, r: float
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Items within `r` meters of the point, with their distance, nearest first.
+        """
+        out = []
+        for item in self.bbox(x - r, y - r, x + r, y + r):
+            distance = math.hypot(item["worldX"] - x, item["worldY"] - y)
+            if distance <= r:
+                out.append((distance, item))
+        out.sort(key=lambda x: x[0])
+        return out
+
+
+class SpatialIndex:
+    """
+    Latest map items of every shard in world coordinates, see `world_map`, in a
+    `SpatialGrid` per shard and source. Loaded from DB at startup. The ingestor projects
+    items of every hex it stores as it parses them, and stages them until the poll is
+    committed, like `DynamicDeltaEncoder`.
+    """
+
+    def __init__(self):
+        self._shards: Dict[Tuple[int, str], SpatialGrid] = {}
+        self._staged: Dict[int, Dict[Tuple[str, int], List[Dict[str, Any]]]] = {}
+
+    def get(self, shard_id: int, source: str) -> Optional[SpatialGrid]:
+        return self._shards.get((shard_id, source))
+
+    def _grid(self, shard_id: int, source: str) -> SpatialGrid:
+        key = (shard_id, source)
+        if key not in self._shards:
+            self._shards[key] = SpatialGrid(settings.SPATIAL_CELL_SIZE)
+        return self._shards[key]
+
+    async def warm(self, db: AsyncSession, shard_ids: Iterable[int]):
+        """
+        Loads latest items of every shard. Needs warm `identity_registry`.
+        """
+        for shard_id in shard_ids:
+            dynamic = await crud.list_dynamic_map_data_latest(db, shard_id=shard_id)
+            static = await crud.list_static_map_data_latest(db, shard_id=shard_id)
+            for source, rows, key in [
+                ("dynamic", dynamic, "mapItems"),
+                ("static", static, "mapTextItems"),
+            ]:
+                grid = self._grid(shard_id, source)
+                fields = ("x", "y") + FIELDS[source]
+                for row in rows:
+                    hex = identity_registry.hexes_by_id.get(row.hex_id)
+                    if hex is None:
+                        continue
+                    items = [
+                        {k: getattr(x, k, None) for k in fields}
+                        for x in getattr(row, key)
+                    ]
+                    snapshot = ({"hex_id": row.hex_id}, items)
+                    grid.replace_hex(
+                        row.hex_id, world_items(source, hex.name, snapshot)
+                    )
+        logger.info(f"Spatial index holds {len(self._shards)} grids.")
+
+    def stage(
+        self, shard_id: int, source: str, data: List[Snapshot], hex_ids: Dict[str, int]
+    ):
+        """
+        Projects parsed snapshots of a poll, `hex_ids` are ids of the poll's hexes by name.
+        """
+        names = {v: k for k, v in hex_ids.items()}
+        staged = self._staged.setdefault(shard_id, {})
+        for snapshot in data:
+            hex_id = snapshot[0]["hex_id"]
+            staged[(source, hex_id)] = world_items(source, names[hex_id], snapshot)
+
+    def commit(self, shard_id: int):
+        for (source, hex_id), items in self._staged.pop(shard_id, {}).items():
+            self._grid(shard_id, source).replace_hex(hex_id, items)
+
+    def discard(self, shard_id: int):
+        self._staged.pop(shard_id, None)
+
+
+spatial_index = SpatialIndex()
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional
+
+import msgspec
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.database import crud
+from src.app.schemas import DynamicMapData, MapWarReport, WarState
+from src.app.schemas.dynamic_map_data_compact import to_compact
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedBody:
+    content: bytes  # serialized JSON response
+    rev: int  # newest REV the response contains
+    # other encodings of `content` (msgpack, compressed), built on first request
+    variants: Dict[str, bytes] = field(default_factory=dict, repr=False)
+    # variants being built, awaited by every request asking for them meanwhile
+    building: Dict[str, "asyncio.Task[bytes]"] = field(default_factory=dict, repr=False)
+
+    async def variant(self, key: str, build: Callable[[], bytes]) -> bytes:
+        """
+        Builds a variant once, in a worker thread so the event loop isn't blocked.
+        A request cancelled meanwhile doesn't cancel the build for the others.
+        """
+        if key in self.variants:
+            return self.variants[key]
+        task = self.building.get(key)
+        if task is None:
+            task = self.building[key] = asyncio.create_task(self._build(key, build))
+        return await asyncio.shield(task)
+
+    async def _build(self, key: str, build: Callable[[], bytes]) -> bytes:
+        try:
+            self.variants[key] = await asyncio.to_thread(build)
+            return self.variants[key]
+        finally:
+            self.building.pop(key, None)
+
+
+def _dump(schema, row) -> CachedBody:
+    content = schema.model_validate(row, from_attributes=True).model_dump_json()
+    return CachedBody(content.encode(), row.REV)
+
+
+def _dump_compact(row) -> CachedBody:
+    return CachedBody(msgspec.json.encode(to_compact(row)), row.REV)
+
+
+def _join(parts: Dict[int, CachedBody]) -> CachedBody:
+    return CachedBody(
+        b"[" + b",".join(parts[x].content for x in sorted(parts)) + b"]",
+        max((x.rev for x in parts.values()), default=0),
+    )
+
+
+@dataclass
+class ShardState:
+    """
+    Latest stored state of a shard, as serialized JSON responses.
+    Per-hex entries are keyed by hex id, whole-shard lists are ordered by it.
+    Dynamic map data is also kept in compact form, see `dynamic_map_data_compact`.
+    `rev_times` holds timestamps of the REVs the responses contain.
+    """
+
+    war_number: Optional[int] = None
+    war_state: Optional[CachedBody] = None
+    map_war_reports: Dict[int, CachedBody] = field(default_factory=dict)
+    map_war_reports_all: CachedBody = field(default_factory=lambda: _join({}))
+    dynamic_map_data: Dict[int, CachedBody] = field(default_factory=dict)
+    dynamic_map_data_all: CachedBody = field(default_factory=lambda: _join({}))
+    dynamic_map_data_compact: Dict[int, CachedBody] = field(default_factory=dict)
+    dynamic_map_data_compact_all: CachedBody = field(default_factory=lambda: _join({}))
+    rev_times: Dict[int, datetime] = field(default_factory=dict)
+
+    def revs(self) -> Iterable[int]:
+        if self.war_state is not None:
+            yield self.war_state.rev
+        yield from (x.rev for x in self.map_war_reports.values())
+        yield from (x.rev for x in self.dynamic_map_data.values())
+        # newer than every hex in them once hexes are pruned, see `prune_hexes`
+        yield self.map_war_reports_all.rev
+        yield self.dynamic_map_data_all.rev
+
+
+# per-hex entries of `ShardState`, each with its whole-shard list in `<name>_all`
+_PER_HEX = ["map_war_reports", "dynamic_map_data", "dynamic_map_data_compact"]
+
+
+def prune_hexes(state: ShardState, hex_ids: Iterable[int], rev: int) -> ShardState:
+    """
+    Drops hexes missing in the map list of the shard stored by poll `rev`, e.g. regions
+    left out of a new war. Whole-shard lists that lose hexes change at `rev`, so they
+    don't get validators of an older list back.
+    """
+    hex_ids = set(hex_ids)
+    out = replace(state)
+    for name in _PER_HEX:
+        parts: Dict[int, CachedBody] = getattr(state, name)
+        if parts.keys() <= hex_ids:
+            continue
+        parts = {x: y for x, y in parts.items() if x in hex_ids}
+        joined = _join(parts)
+        setattr(out, name, parts)
+        setattr(out, f"{name}_all", CachedBody(joined.content, max(joined.rev, rev)))
+    return out
+
+
+class StateCache:
+    """
+    Current state of every shard, keyed by shard id, serving the latest-data endpoints
+    without touching DB. Rebuilt from DB at startup and refreshed by the ingestor after
+    every committed poll, from the rows of that poll only. A refreshed state is built
+    aside and swapped in at once, so readers never see a half-applied poll.
+    A shard whose refresh failed is dropped, and its requests fall back to DB.
+    """
+
+    def __init__(self):
+        self._shards: Dict[int, ShardState] = {}
+
+    def get(self, shard_id: int) -> Optional[ShardState]:
+        return self._shards.get(shard_id)
+
+    def invalidate(self, shard_id: int):
+        self._shards.pop(shard_id, None)
+
+    async def warm(self, db: AsyncSession, shard_ids: Iterable[int]):
+        for shard_id in shard_ids:
+            self._shards[shard_id] = await self._load(db, shard_id)
+
+    async def refresh(
+        self,
+        db: AsyncSession,
+        shard_id: int,
+        rev: int,
+        hex_ids: Optional[Iterable[int]] = None,
+    ):
+        """
+        Applies rows stored by poll `rev` of the shard. Call only after the poll is committed.
+        A shard not cached yet is loaded whole. `hex_ids` are hexes of the map list
+        stored by the poll, if it stored one, other hexes are dropped.
+        """
+        try:
+            if shard_id in self._shards:
+                state = await self._apply(db, shard_id, rev)
+            else:
+                state = await self._load(db, shard_id)
+            if hex_ids is not None:
+                state = prune_hexes(state, hex_ids, rev)
+                await self._update_rev_times(db, state)
+        except Exception as e:
+            logger.error(
+                f"Could not refresh state cache of shard {shard_id}: {e}", exc_info=True
+            )
+            self.invalidate(shard_id)
+            return
+        self._shards[shard_id] = state
+
+    async def _load(self, db: AsyncSession, shard_id: int) -> ShardState:
+        state = ShardState()
+        war_state = await crud.get_warstate_latest(db, shard_id=shard_id)
+        if war_state is not None:
+            state.war_number = war_state.warNumber
+            state.war_state = _dump(WarState, war_state)
+
+        reports = await crud.list_map_war_report_latest(db, shard_id=shard_id)
+        state.map_war_reports = {x.hex_id: _dump(MapWarReport, x) for x in reports}
+        state.map_war_reports_all = _join(state.map_war_reports)
+
+        dynamic = await crud.list_dynamic_map_data_latest(db, shard_id=shard_id)
+        state.dynamic_map_data = {x.hex_id: _dump(DynamicMapData, x) for x in dynamic}
+        state.dynamic_map_data_all = _join(state.dynamic_map_data)
+        state.dynamic_map_data_compact = {x.hex_id: _dump_compact(x) for x in dynamic}
+        state.dynamic_map_data_compact_all = _join(state.dynamic_map_data_compact)
+
+        state.rev_times = await crud.get_rev_times(db, state.revs())
+        return state
+
+    async def _apply(self, db: AsyncSession, shard_id: int, rev: int) -> ShardState:
+        state = replace(self._shards[shard_id])
+
+        war_state = await crud.get_warstate(db, shard_id=shard_id, REV=rev)
+        if war_state is not None:
+            state.war_number = war_state.warNumber
+            state.war_state = _dump(WarState, war_state)
+
+        reports = await crud.list_map_war_reports(
+            db, limit=None, shard_id=shard_id, REV=rev
+        )
+        if reports:
+            state.map_war_reports = state.map_war_reports | {
+                x.hex_id: _dump(MapWarReport, x) for x in reports
+            }
+            state.map_war_reports_all = _join(state.map_war_reports)
+
+        dynamic = await crud.list_dynamic_map_data_of_REV(db, rev, shard_id=shard_id)
+        if dynamic:
+            state.dynamic_map_data = state.dynamic_map_data | {
+                x.hex_id: _dump(DynamicMapData, x) for x in dynamic
+            }
+            state.dynamic_map_data_all = _join(state.dynamic_map_data)
+            state.dynamic_map_data_compact = state.dynamic_map_data_compact | {
+                x.hex_id: _dump_compact(x) for x in dynamic
+            }
+            state.dynamic_map_data_compact_all = _join(state.dynamic_map_data_compact)
+
+        await self._update_rev_times(db, state)
+        return state
+
+    async def _update_rev_times(self, db: AsyncSession, state: ShardState):
+        revs = set(state.revs())
+        rev_times = {x: y for x, y in state.rev_times.items() if x in revs}
+        rev_times |= await crud.get_rev_times(db, revs - rev_times.keys())
+        state.rev_times = rev_times
+
+
+state_cache = StateCache()
@@ -0,0 +1,90 @@
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.database import crud
+from src.app.database.dynamic_delta import ItemKey, index_items, item_values
+
+logger = logging.getLogger(__name__)
+
+# item fields whose changes are events
+EVENT_FIELDS = ("teamId", "flags")
+
+# (teamId, flags) of an item
+ItemState = Tuple[Any, ...]
+# item states of a hex by `item_key`, None if items can't be keyed uniquely
+HexStates = Optional[Dict[ItemKey, ItemState]]
+# (parent row, item rows) as parsed by the ingestor
+Snapshot = Tuple[Dict[str, Any], List[Dict[str, Any]]]
+
+
+def item_states(items: Iterable[Any]) -> HexStates:
+    indexed = index_items(items)
+    if indexed is None:
+        return None
+    return {key: item_values(item, EVENT_FIELDS) for key, item in indexed.items()}
+
+
+class StructureEventDetector:
+    """
+    Keeps `teamId` and `flags` of the last stored dynamic map items of every hex, and turns
+    changes of items present in both the previous and the new snapshot of a hex into
+    `StructureEvent` rows. Items appearing or disappearing are not events. Hexes whose items
+    can't be keyed uniquely are skipped. Loaded from DB at startup, so no change is missed
+    across restarts, and staged until the poll is committed, like `DynamicDeltaEncoder`.
+    """
+
+    def __init__(self):
+        self._current: Dict[Tuple[int, int], HexStates] = {}
+        self._staged: Dict[int, Dict[Tuple[int, int], HexStates]] = {}
+
+    async def warm(self, db: AsyncSession, shard_ids: Iterable[int]):
+        for shard_id in shard_ids:
+            rows = await crud.list_dynamic_map_data_latest(db, shard_id=shard_id)
+            for row in rows:
+                self._current[(shard_id, row.hex_id)] = item_states(row.mapItems)
+        logger.info(f"Structure event detector holds {len(self._current)} hexes.")
+
+    def detect(self, shard_id: int, data: List[Snapshot]) -> List[Dict[str, Any]]:
+        """
+        Event rows of parsed snapshots of a poll, stages the snapshots.
+        """
+        staged = self._staged.setdefault(shard_id, {})
+        events = []
+        for parent, items in data:
+            key = (shard_id, parent["hex_id"])
+            states = item_states(items)
+            staged[key] = states
+            previous = self._current.get(key)
+            if previous is None or states is None:
+                continue
+            for item_key, (team_id, flags) in states.items():
+                before = previous.get(item_key)
+                if before is None or before == (team_id, flags):
+                    continue
+                icon_type, x, y = item_key
+                events.append(
+                    {
+                        "REV": parent["REV"],
+                        "shard_id": shard_id,
+                        "hex_id": parent["hex_id"],
+                        "iconType": icon_type,
+                        "x": x,
+                        "y": y,
+                        "teamId": team_id,
+                        "previousTeamId": before[0],
+                        "flags": flags,
+                        "previousFlags": before[1],
+                    }
+                )
+        return events
+
+    def commit(self, shard_id: int):
+        self._current.update(self._staged.pop(shard_id, {}))
+
+    def discard(self, shard_id: int):
+        self._staged.pop(shard_id, None)
+
+
+structure_event_detector = StructureEventDetector()
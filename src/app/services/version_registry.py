@@ -0,0 +1,87 @@
+from dataclasses import dataclass, replace
+from typing import Dict, Optional, Tuple
+
+# (shard base url, map name, endpoint name)
+RegistryKey = Tuple[str, str, str]
+
+
+@dataclass
+class RegistryEntry:
+    etag: Optional[str] = None
+    version: Optional[int] = None
+
+
+class VersionRegistry:
+    """
+    Remembers ETag and `version` of the last stored War API payload per (shard, hex, endpoint).
+    Values seen during a poll are staged and become current only after the poll is committed,
+    so a failed write doesn't make the next poll skip data that was never stored.
+    """
+
+    def __init__(self):
+        self._current: Dict[RegistryKey, RegistryEntry] = {}
+        self._staged: Dict[str, Dict[RegistryKey, RegistryEntry]] = {}
+
+    def get_etag(self, base_url: str, map_name: str, endpoint: str) -> Optional[str]:
+        entry = self._current.get((base_url, map_name, endpoint))
+        return entry.etag if entry else None
+
+    def is_stored(
+        self, base_url: str, map_name: str, endpoint: str, version: Optional[int]
+    ) -> bool:
+        """
+        Checks if payload with `version` was already stored. Unversioned payloads never are.
+        """
+        if version is None:
+            return False
+        entry = self._current.get((base_url, map_name, endpoint))
+        return entry is not None and entry.version == version
+
+    def stage(
+        self,
+        base_url: str,
+        map_name: str,
+        endpoint: str,
+        etag: Optional[str] = None,
+        version: Optional[int] = None,
+    ):
+        key = (base_url, map_name, endpoint)
+        staged = self._staged.setdefault(base_url, {})
+        entry = staged.setdefault(key, replace(self._current.get(key, RegistryEntry())))
+        if etag is not None:
+            entry.etag = etag
+        if version is not None:
+            entry.version = version
+
+    def remember(
+        self, base_url: str, map_name: str, endpoint: str, version: Optional[int]
+    ):
+        """
+        Marks `version` as stored, e.g. when warming from DB.
+        """
+        key = (base_url, map_name, endpoint)
+        self._current[key] = replace(
+            self._current.get(key, RegistryEntry()), version=version
+        )
+
+    def forget(self, base_url: str, endpoint: str):
+        """
+        Drops everything known about `endpoint` of `base_url` shard, so it's fetched and stored again.
+        """
+        self._current = {
+            key: entry
+            for key, entry in self._current.items()
+            if key[0] != base_url or key[2] != endpoint
+        }
+
+    def commit(self, base_url: str):
+        """
+        Makes values staged for `base_url` current. Call after the poll was committed to DB.
+        """
+        self._current.update(self._staged.pop(base_url, {}))
+
+    def discard(self, base_url: str):
+        self._staged.pop(base_url, None)
+
+
+version_registry = VersionRegistry()
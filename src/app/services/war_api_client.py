@@ -1,77 +1,116 @@
 from asyncio import create_task
 import asyncio
-from typing import Any, Dict, List
+import importlib.util
+import logging
+from typing import Any, Dict, Iterable, List, Optional
 import httpx
 
+from src.app.core.config import settings
+from src.app.schemas.war_api_payloads import decode_payload
 from src.app.schemas.warapiEndpointEnum import warapiEndpoints
+from src.app.services.version_registry import version_registry
 
+logger = logging.getLogger(__name__)
 
-async def get_current_war_data(base_url: str) -> dict:
+# caps number of requests in flight per shard, see `get_shard_semaphore`
+_shard_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def create_client() -> httpx.AsyncClient:
     """
-    Fetches the main /war endpoint from the external API.
+    Creates long-lived client with keep-alive connection pool, meant to be shared by all polls.
+    HTTP/2 is used only if enabled and the optional `h2` package is installed.
     """
-    async with httpx.AsyncClient() as client:
-        try:
-            if not touch_base_url(client, base_url):
-                print(f"Server not available. {base_url}")
-                raise
-            out_json = {}
+    http2 = settings.WAR_API_HTTP2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning(
+            "WAR_API_HTTP2 is set, but `h2` is not installed. Falling back to HTTP/1.1."
+        )
+        http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(
+            settings.WAR_API_TIMEOUT, connect=settings.WAR_API_CONNECT_TIMEOUT
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.WAR_API_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.WAR_API_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.WAR_API_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def get_shard_semaphore(base_url: str) -> asyncio.Semaphore:
+    if base_url not in _shard_semaphores:
+        _shard_semaphores[base_url] = asyncio.Semaphore(
+            settings.WAR_API_MAX_CONCURRENCY_PER_SHARD
+        )
+    return _shard_semaphores[base_url]
+
+
+async def get_current_war_data(
+    client: httpx.AsyncClient,
+    base_url: str,
+    endpoints: Optional[Iterable[warapiEndpoints]] = None,
+) -> dict:
+    """
+    Fetches `endpoints` (all by default) of `base_url` shard from the external API.
+    Map list is fetched whenever any per-map endpoint is requested.
+    A shard that is down fails the first request, which aborts the poll.
+    """
+    requested = set(warapiEndpoints) if endpoints is None else set(endpoints)
+    map_getters = {
+        warapiEndpoints.map_war_report: get_map_war_reports,
+        warapiEndpoints.static_map_data: get_static_map_datas,
+        warapiEndpoints.dynamic_map_data: get_dynamic_map_datas,
+    }
+    if requested & map_getters.keys():
+        requested.add(warapiEndpoints.map_list)
+
+    try:
+        out_json = {}
+        if warapiEndpoints.war_state in requested:
             out_json[warapiEndpoints.war_state.name] = await get_war_state(
                 client, base_url
             )
+        if warapiEndpoints.map_list in requested:
             out_json[warapiEndpoints.map_list.name] = await get_map_list(
                 client, base_url
             )
 
-            out_json[warapiEndpoints.map_war_report.name] = await get_map_war_reports(
-                client, base_url, out_json[warapiEndpoints.map_list.name]
-            )
-            out_json[warapiEndpoints.static_map_data.name] = await get_static_map_datas(
-                client, base_url, out_json[warapiEndpoints.map_list.name]
-            )
-            out_json[
-                warapiEndpoints.dynamic_map_data.name
-            ] = await get_dynamic_map_datas(
-                client, base_url, out_json[warapiEndpoints.map_list.name]
-            )
+        for endpoint, getter in map_getters.items():
+            if endpoint in requested:
+                out_json[endpoint.name] = await getter(
+                    client, base_url, out_json[warapiEndpoints.map_list.name]
+                )
 
-            return out_json
+        return out_json
 
-        except httpx.HTTPStatusError as e:
-            print(f"HTTP error occurred: {e}")
-            raise
-        except httpx.RequestError as e:
-            print(f"An error occurred while requesting {e.request.url!r}: {e}")
-            raise
+    except httpx.HTTPStatusError as e:
+        print(f"HTTP error occurred: {e}")
+        raise
+    except httpx.RequestError as e:
+        print(f"An error occurred while requesting {e.request.url!r}: {e}")
+        raise
 
 
 def flatten_dict(dict_: List[Dict[Any, Any]]) -> Dict[Any, Any]:
     return {x: y for dct in dict_ for x, y in dct.items()}
 
 
-async def touch_base_url(client: httpx.AsyncClient, base_url: str) -> Any:
-    """
-    Checks if `base_url` server is available
-    """
-    response = await client.get(f"{base_url}")
-    if response.is_server_error:
-        return False
-    else:
-        return True
-
-
 async def get_war_state(client: httpx.AsyncClient, base_url: str) -> Any:
     """
     Gets state of the war
     """
-    return await get_from_endpoint(client, base_url, warapiEndpoints.war_state.value)
+    return await get_from_endpoint(client, base_url, warapiEndpoints.war_state)
 
 
 async def get_map_list(client: httpx.AsyncClient, base_url: str) -> Any:
     """
     Gets list of maps
     """
-    return await get_from_endpoint(client, base_url, warapiEndpoints.map_list.value)
+    return await get_from_endpoint(client, base_url, warapiEndpoints.map_list)
 
 
 async def get_map_war_reports(
@@ -88,6 +127,7 @@ async def get_map_war_reports(
                 base_url,
                 warapiEndpoints.map_war_report.value.format(map_name=map_),
                 map_,
+                warapiEndpoints.map_war_report,
             )
         )
         for map_ in maps
@@ -109,6 +149,7 @@ async def get_static_map_datas(
                 base_url,
                 warapiEndpoints.static_map_data.value.format(map_name=map_),
                 map_,
+                warapiEndpoints.static_map_data,
             )
         )
         for map_ in maps
@@ -130,6 +171,7 @@ async def get_dynamic_map_datas(
                 base_url,
                 warapiEndpoints.dynamic_map_data.value.format(map_name=map_),
                 map_,
+                warapiEndpoints.dynamic_map_data,
             )
         )
         for map_ in maps
@@ -138,16 +180,38 @@ async def get_dynamic_map_datas(
 
 
 async def get_from_endpoint(
-    client: httpx.AsyncClient, base_url: str, endpoint: str
+    client: httpx.AsyncClient, base_url: str, endpoint: warapiEndpoints
 ) -> Any:
-    response = await client.get(f"{base_url}{endpoint}")
+    async with get_shard_semaphore(base_url):
+        response = await client.get(f"{base_url}{endpoint.value}")
     response.raise_for_status()
-    return response.json()
+    return decode_payload(endpoint, response.content)
 
 
 async def get_from_map_endpoint(
-    client: httpx.AsyncClient, base_url: str, endpoint: str, map_: str
+    client: httpx.AsyncClient,
+    base_url: str,
+    endpoint: str,
+    map_: str,
+    endpoint_type: warapiEndpoints,
 ) -> Dict[str, Any]:
-    response = await client.get(f"{base_url}{endpoint}")
+    """
+    Conditional request using ETag of the last stored payload.
+    Returns empty dict if the map didn't change since then.
+    Payload is decoded into the typed struct of `endpoint_type`.
+    """
+    headers = {}
+    etag = version_registry.get_etag(base_url, map_, endpoint_type.name)
+    if etag:
+        headers["If-None-Match"] = etag
+
+    async with get_shard_semaphore(base_url):
+        response = await client.get(f"{base_url}{endpoint}", headers=headers)
+    if response.status_code == httpx.codes.NOT_MODIFIED:
+        return {}
     response.raise_for_status()
-    return {map_: response.json()}
+
+    version_registry.stage(
+        base_url, map_, endpoint_type.name, etag=response.headers.get("ETag")
+    )
+    return {map_: decode_payload(endpoint_type, response.content)}
@@ -0,0 +1,562 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, String
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.core.config import settings
+from src.app.database import crud
+from src.app.database.models import (
+    DynamicMapData,
+    DynamicMapDataItem,
+    MapWarReport,
+    Shard,
+    WarState,
+)
+from src.app.database.session import AsyncSessionLocal
+from src.app.services.retention import Compaction, retention_engine
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # optional, see `archive` extra
+    pa = pc = pq = None
+
+logger = logging.getLogger(__name__)
+
+# history tables moved to the archive
+MODELS: List[Type[Any]] = [WarState, MapWarReport, DynamicMapData]
+
+# columns left out of archived rows, dynamic map data is archived as full snapshots
+_SKIPPED = {"isKeyframe", "deltaOp"}
+
+# snapshots per row group, dynamic map data snapshots hold all items of a hex
+_ROW_GROUP_SIZE: Dict[Type[Any], int] = {DynamicMapData: 200}
+_DEFAULT_ROW_GROUP_SIZE = 20000
+
+# id beyond any row, for cursors past a whole REV
+_MAX_ID = 2**31
+
+Cursor = Tuple[int, int]
+
+
+def _arrow_type(column) -> "pa.DataType":
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int32()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column.type, String):
+        return pa.string()
+    raise TypeError(f"No archive type for column {column}.")
+
+
+def _fields(model: Type[Any]) -> List["pa.Field"]:
+    return [
+        pa.field(x.name, _arrow_type(x))
+        for x in model.__table__.columns
+        if x.name not in _SKIPPED
+    ]
+
+
+def arrow_schema(model: Type[Any]) -> "pa.Schema":
+    """
+    Schema of archived rows of `model`, the rows range endpoints return.
+    """
+    fields = _fields(model)
+    if model is DynamicMapData:
+        items = pa.struct(_fields(DynamicMapDataItem))
+        fields.append(pa.field("mapItems", pa.list_(items)))
+    return pa.schema(fields)
+
+
+def _read_row_group(
+    file: "pq.ParquetFile",
+    index: int,
+    rev_from: int,
+    rev_to: int,
+    filters: Dict[str, Any],
+    cursor: Optional[Cursor],
+) -> List[Dict[str, Any]]:
+    table = file.read_row_group(index)
+    rev = table["REV"]
+    mask = pc.and_(pc.greater_equal(rev, rev_from), pc.less_equal(rev, rev_to))
+    for k, v in filters.items():
+        mask = pc.and_(mask, pc.equal(table[k], v))
+    if cursor is not None:
+        after = pc.or_(
+            pc.greater(rev, cursor[0]),
+            pc.and_(pc.equal(rev, cursor[0]), pc.greater(table["id"], cursor[1])),
+        )
+        mask = pc.and_(mask, after)
+    return table.filter(mask).to_pylist()
+
+
+def _rev_bounds(file: "pq.ParquetFile", index: int) -> Tuple[int, int]:
+    group = file.metadata.row_group(index)
+    column = file.schema_arrow.get_field_index("REV")
+    stats = group.column(column).statistics
+    return stats.min, stats.max
+
+
+def _file_hexes(path: Path, model: Type[Any]) -> List[int]:
+    """
+    Hexes an archived table holds rows of, 0 for models without a hex.
+    """
+    if not hasattr(model, "hex_id"):
+        return [0] if pq.read_metadata(path).num_rows else []
+    column = pq.read_table(path, columns=["hex_id"])["hex_id"]
+    return sorted(x for x in pc.unique(column).to_pylist() if x is not None)
+
+
+def _to_model(model: Type[Any], row: Dict[str, Any]) -> Any:
+    """
+    Transient instance of an archived row, as crud `list_*_REV` return them.
+    """
+    if model is DynamicMapData:
+        items = row.pop("mapItems")
+        out = model(**row, isKeyframe=True)
+        out.mapItems = [DynamicMapDataItem(**x) for x in items]
+        return out
+    return model(**row)
+
+
+class WarArchive:
+    """
+    Cold archive of finished wars. History of a war of a shard, its REV range, is moved from
+    DB to zstd compressed Parquet files `ARCHIVE_DIR/shard_<id>/war_<number>/<table>.parquet`,
+    one row group per batch of snapshots, ordered by REV. A `manifest.json` records the range.
+    Wars are archived oldest first, so archived REVs of a shard are always the range up to
+    `archived_to`, which range queries read from files and the rest from DB.
+    Rows `LatestRow` points at, and the last state of every war, stay in DB for
+    the latest-data endpoints. Dynamic map data is archived as full snapshots, and deltas
+    stored after the range, or kept in DB, are turned into keyframes before anything is deleted.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or settings.ARCHIVE_DIR)
+        # shard id -> manifests of archived wars, ordered by REV
+        self._manifests: Dict[int, List[Dict[str, Any]]] = {}
+
+    def load(self):
+        """
+        Reads manifests of archived wars. Wars written without a manifest are ignored.
+        """
+        self._manifests = {}
+        paths = sorted(self.root.glob("shard_*/war_*/manifest.json"))
+        if paths and pq is None:
+            logger.error("Archived wars can't be read, install the `archive` extra.")
+            return
+        for path in paths:
+            manifest = json.loads(path.read_text())
+            if "hexes" not in manifest:
+                self._backfill_hexes(path, manifest)
+            self._manifests.setdefault(manifest["shard_id"], []).append(manifest)
+        for manifests in self._manifests.values():
+            manifests.sort(key=lambda x: x["rev_from"])
+
+    def _backfill_hexes(self, path: Path, manifest: Dict[str, Any]):
+        """
+        Adds `hexes` to a manifest written before it was recorded, from its files.
+        """
+        manifest["hexes"] = {
+            x.__tablename__: _file_hexes(path.parent / f"{x.__tablename__}.parquet", x)
+            for x in MODELS
+        }
+        try:
+            self._save_manifest(path, manifest)
+        except OSError as e:
+            logger.warning(f"Could not save hexes to {path}: {e}")
+
+    def archived_to(self, shard_id: int) -> Optional[int]:
+        manifests = self._manifests.get(shard_id)
+        return manifests[-1]["rev_to"] if manifests else None
+
+    def _war_dir(self, shard_id: int, war_number: int) -> Path:
+        return self.root / f"shard_{shard_id}" / f"war_{war_number}"
+
+    async def run(self):
+        while True:
+            try:
+                await self.archive_all()
+            except Exception as e:
+                logger.error(f"Archive run failed: {e}", exc_info=True)
+            await asyncio.sleep(settings.ARCHIVE_INTERVAL)
+
+    async def archive_all(self) -> int:
+        """
+        Archives finished wars of every shard. Returns number of archived wars.
+        """
+        async with AsyncSessionLocal() as db:
+            shards: List[Shard] = await crud.list_shards(db, limit=None)
+        archived = 0
+        for shard in shards:
+            archived += await self.archive_shard(shard.id)
+        return archived
+
+    async def archive_shard(self, shard_id: int) -> int:
+        # REV timestamps are UTC
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(
+            hours=settings.ARCHIVE_AFTER_HOURS
+        )
+        async with AsyncSessionLocal() as db:
+            starts = await crud.list_war_starts(db, shard_id)
+            times = await crud.get_rev_times(db, [x[1] for x in starts])
+
+        archived = 0
+        rev_from = 1
+        for (war_number, _), (_, next_start) in zip(starts, starts[1:]):
+            rev_to = next_start - 1
+            manifest = self._find(shard_id, war_number)
+            if manifest is None:
+                if times[next_start] > cutoff:
+                    break
+                if rev_from <= (self.archived_to(shard_id) or 0):
+                    logger.warning(
+                        f"War {war_number} of shard {shard_id} overlaps archived REVs, "
+                        f"not archived."
+                    )
+                    break
+                manifest = await self.write(shard_id, war_number, rev_from, rev_to)
+                archived += 1
+            if not manifest["purged"]:
+                await self.purge(manifest)
+            rev_from = rev_to + 1
+        return archived
+
+    def _find(self, shard_id: int, war_number: int) -> Optional[Dict[str, Any]]:
+        for manifest in self._manifests.get(shard_id, []):
+            if manifest["warNumber"] == war_number:
+                return manifest
+        return None
+
+    def _save_manifest(self, path: Path, manifest: Dict[str, Any]):
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp, path)
+
+    async def write(
+        self, shard_id: int, war_number: int, rev_from: int, rev_to: int
+    ) -> Dict[str, Any]:
+        """
+        Writes history of the war to files, and registers them for reads.
+        Files are written aside and moved in place once complete.
+        """
+        target = self._war_dir(shard_id, war_number)
+        tmp = target.with_name(target.name + ".tmp")
+        await asyncio.to_thread(shutil.rmtree, tmp, True)
+        tmp.mkdir(parents=True)
+
+        rows: Dict[str, int] = {}
+        hexes: Dict[str, List[int]] = {}
+        for model in MODELS:
+            async with AsyncSessionLocal() as db:
+                name = model.__tablename__
+                rows[name], hexes[name] = await self._write_table(
+                    tmp / f"{model.__tablename__}.parquet",
+                    model,
+                    crud.stream_snapshots_REV_range(
+                        db, model, rev_from, rev_to, shard_id=shard_id
+                    ),
+                )
+        manifest = {
+            "shard_id": shard_id,
+            "warNumber": war_number,
+            "rev_from": rev_from,
+            "rev_to": rev_to,
+            "rows": rows,
+            "hexes": hexes,
+            "archived_at": datetime.now(timezone.utc).isoformat(),
+            "purged": False,
+        }
+        self._save_manifest(tmp / "manifest.json", manifest)
+        await asyncio.to_thread(shutil.rmtree, target, True)
+        os.replace(tmp, target)
+
+        self._manifests.setdefault(shard_id, []).append(manifest)
+        self._manifests[shard_id].sort(key=lambda x: x["rev_from"])
+        logger.info(
+            f"Archived war {war_number} of shard {shard_id}, "
+            f"REVs {rev_from}-{rev_to}: {rows}."
+        )
+        return manifest
+
+    async def _write_table(
+        self, path: Path, model: Type[Any], rows: AsyncIterator[Dict[str, Any]]
+    ) -> Tuple[int, List[int]]:
+        """
+        Returns number of written rows and the hexes they are of, 0 for models without a hex.
+        """
+        schema = arrow_schema(model)
+        size = _ROW_GROUP_SIZE.get(model, _DEFAULT_ROW_GROUP_SIZE)
+        writer = pq.ParquetWriter(path, schema, compression="zstd")
+        count = 0
+        hexes: Set[int] = set()
+        batch: List[Dict[str, Any]] = []
+
+        async def flush():
+            table = pa.Table.from_pylist(batch, schema=schema)
+            await asyncio.to_thread(writer.write_table, table)
+            batch.clear()
+
+        try:
+            async for row in rows:
+                batch.append(row)
+                hexes.add(row.get("hex_id", 0))
+                count += 1
+                if len(batch) >= size:
+                    await flush()
+            if batch or not count:
+                await flush()
+        finally:
+            writer.close()
+        return count, sorted(hexes)
+
+    async def purge(self, manifest: Dict[str, Any]):
+        """
+        Deletes archived rows from DB in slices of `RETENTION_REV_CHUNK` REVs,
+        through `retention_engine`, so transactions stay small.
+        """
+        shard_id, war_number = manifest["shard_id"], manifest["warNumber"]
+        rev_from, rev_to = manifest["rev_from"], manifest["rev_to"]
+        deleted = 0
+        for model in MODELS:
+            async with AsyncSessionLocal() as db:
+                kept = await crud.list_latest_row_ids(db, model, shard_id, rev_to)
+                if model is WarState:
+                    last = await crud.get_warstate_latest(
+                        db, shard_id=shard_id, warNumber=war_number
+                    )
+                    if last is not None:
+                        kept.add(last.id)
+                keyframes: List[int] = []
+                if model is DynamicMapData:
+                    keyframes = list(kept) + await crud.list_first_ids_after_REV(
+                        db, model, shard_id, rev_to
+                    )
+            await retention_engine.apply(model, Compaction(keyframes=keyframes))
+
+            for slice_from in range(rev_from, rev_to + 1, settings.RETENTION_REV_CHUNK):
+                slice_to = min(slice_from + settings.RETENTION_REV_CHUNK - 1, rev_to)
+                async with AsyncSessionLocal() as db:
+                    rows = await crud.list_retention_rows(
+                        db, model, shard_id, slice_from, slice_to
+                    )
+                out = Compaction(delete=[x.id for x in rows if x.id not in kept])
+                deleted += await retention_engine.apply(model, out)
+
+        manifest["purged"] = True
+        path = self._war_dir(shard_id, war_number) / "manifest.json"
+        self._save_manifest(path, manifest)
+        logger.info(
+            f"Deleted {deleted} archived snapshots of war {war_number} "
+            f"of shard {shard_id} from DB."
+        )
+
+    async def scan(
+        self,
+        model: Type[Any],
+        rev_from: int,
+        rev_to: int,
+        cursor: Optional[Cursor] = None,
+        **filters,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Archived rows of `shard_id` filter within the REV range as dicts, ordered by REV.
+        Row groups outside the range are skipped by their REV statistics.
+        """
+        shard_id = filters["shard_id"]
+        for manifest in self._manifests.get(shard_id, []):
+            if manifest["rev_to"] < rev_from or manifest["rev_from"] > rev_to:
+                continue
+            path = self._war_dir(shard_id, manifest["warNumber"])
+            file = await asyncio.to_thread(
+                pq.ParquetFile, path / f"{model.__tablename__}.parquet"
+            )
+            for index in range(file.num_row_groups):
+                low, high = _rev_bounds(file, index)
+                if high < rev_from or low > rev_to:
+                    continue
+                if cursor is not None and high < cursor[0]:
+                    continue
+                rows = await asyncio.to_thread(
+                    _read_row_group, file, index, rev_from, rev_to, filters, cursor
+                )
+                for row in rows:
+                    yield row
+
+    async def list_REV(
+        self,
+        db: AsyncSession,
+        model: Type[Any],
+        list_db: Callable[..., Any],
+        datetime_from: datetime,
+        datetime_to: datetime,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[Cursor] = None,
+        **filters,
+    ) -> List[Any]:
+        """
+        Page of rows within the date range, as `list_db` (a crud `list_*_REV`) returns them,
+        read from archive up to `archived_to` of the shard and from DB after it.
+        """
+        archived_to = self.archived_to(filters["shard_id"])
+        if archived_to is None or (cursor is not None and cursor[0] > archived_to):
+            return await list_db(
+                db,
+                datetime_from=datetime_from,
+                datetime_to=datetime_to,
+                skip=skip,
+                limit=limit,
+                cursor=cursor,
+                **filters,
+            )
+
+        rev_from, rev_to = await crud.get_REV_range(db, datetime_from, datetime_to)
+        if rev_from is None:
+            return []
+        page: List[Any] = []
+        rows = self.scan(
+            model, rev_from, min(rev_to, archived_to), cursor=cursor, **filters
+        )
+        async for row in rows:
+            if skip:
+                skip -= 1
+                continue
+            page.append(_to_model(model, row))
+            if len(page) >= limit:
+                return page
+        if rev_to <= archived_to:
+            return page
+        return page + await list_db(
+            db,
+            datetime_from=datetime_from,
+            datetime_to=datetime_to,
+            skip=skip,
+            limit=limit - len(page),
+            cursor=(archived_to, _MAX_ID),
+            **filters,
+        )
+
+    async def stream_REV(
+        self,
+        db: AsyncSession,
+        model: Type[Any],
+        stream_db: Callable[..., AsyncIterator[Dict[str, Any]]],
+        datetime_from: datetime,
+        datetime_to: datetime,
+        **filters,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streams rows within the date range as `stream_db` (a crud `stream_*_REV`) does,
+        from archive up to `archived_to` of the shard and from DB after it.
+        """
+        archived_to = self.archived_to(filters["shard_id"])
+        if archived_to is not None:
+            rev_from, rev_to = await crud.get_REV_range(db, datetime_from, datetime_to)
+            if rev_from is None:
+                return
+            rows = self.scan(model, rev_from, min(rev_to, archived_to), **filters)
+            async for row in rows:
+                yield row
+            if rev_to <= archived_to:
+                return
+        async for row in stream_db(
+            db, datetime_from, datetime_to, after_REV=archived_to, **filters
+        ):
+            yield row
+
+    async def _last_at_REV(
+        self, model: Type[Any], rev: int, keys: Set[int], **filters
+    ) -> List[Dict[str, Any]]:
+        """
+        Archived row with the highest REV up to `rev` of every hex of `keys`. Wars are read
+        newest first, only those up to `rev` holding hexes still missing, each backwards
+        by row groups until its missing hexes are found.
+        """
+        found: Dict[int, Dict[str, Any]] = {}
+        shard_id = filters["shard_id"]
+        for manifest in reversed(self._manifests.get(shard_id, [])):
+            if manifest["rev_from"] > rev:
+                continue
+            wanted = (keys - found.keys()) & set(manifest["hexes"][model.__tablename__])
+            if not wanted:
+                continue
+            path = self._war_dir(shard_id, manifest["warNumber"])
+            file = await asyncio.to_thread(
+                pq.ParquetFile, path / f"{model.__tablename__}.parquet"
+            )
+            for index in reversed(range(file.num_row_groups)):
+                low, _ = _rev_bounds(file, index)
+                if low > rev:
+                    continue
+                rows = await asyncio.to_thread(
+                    _read_row_group, file, index, low, rev, filters, None
+                )
+                for row in reversed(rows):
+                    key = row.get("hex_id", 0)
+                    if key in wanted and key not in found:
+                        found[key] = row
+                if found.keys() >= wanted:
+                    break
+            if found.keys() >= keys:
+                break
+        return [found[x] for x in sorted(found)]
+
+    async def list_at_REV(
+        self,
+        db: AsyncSession,
+        model: Type[Any],
+        list_db: Callable[..., Any],
+        rev: int,
+        **filters,
+    ) -> List[Any]:
+        """
+        Row with the highest REV up to `rev` of every hex, as `list_db`
+        (a crud `list_*_at_REV`) returns them. Hexes whose row is archived,
+        and missing in DB, are looked up in archive.
+        """
+        archived_to = self.archived_to(filters["shard_id"])
+        if archived_to is None:
+            return await list_db(db, rev, **filters)
+        rows = await list_db(db, rev, **filters) if rev > archived_to else []
+
+        keys: Set[int] = set()
+        for manifest in self._manifests[filters["shard_id"]]:
+            if manifest["rev_from"] <= rev:
+                keys.update(manifest["hexes"][model.__tablename__])
+        if "hex_id" in filters:
+            keys &= {filters["hex_id"]}
+        keys -= {getattr(x, "hex_id", 0) for x in rows}
+        if not keys:
+            return rows
+
+        archived = await self._last_at_REV(
+            model, min(rev, archived_to), keys, **filters
+        )
+        rows += [_to_model(model, x) for x in archived]
+        return sorted(rows, key=lambda x: getattr(x, "hex_id", 0))
+
+
+war_archive = WarArchive()
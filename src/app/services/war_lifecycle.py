@@ -0,0 +1,91 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.database import crud
+from src.app.schemas.warapiEndpointEnum import warapiEndpoints
+from src.app.services.identity_registry import identity_registry
+from src.app.services.version_registry import version_registry
+
+
+@dataclass
+class ShardWar:
+    warId: Optional[str] = None
+    warNumber: Optional[int] = None
+    # war of the last stored static map data
+    staticWarNumber: Optional[int] = None
+
+
+class WarLifecycle:
+    """
+    Tracks current war of every shard, keyed by shard url, and whether its static
+    map data was already stored. Static map data is stored once per war, refetched
+    only when a new war starts or when `version` of a hex changes.
+    """
+
+    def __init__(self):
+        self._shards: Dict[str, ShardWar] = {}
+
+    async def warm(self, db: AsyncSession):
+        """
+        Loads current wars and versions of their static map data from DB,
+        so a restart doesn't store static map data again. Needs warm `identity_registry`.
+        """
+        for shard in await crud.list_shards(db, limit=None):
+            warstate = await crud.get_warstate_latest(db, shard_id=shard.id)
+            if warstate is None:
+                continue
+            state = self._shards.setdefault(shard.url, ShardWar())
+            state.warId = warstate.warId
+            state.warNumber = warstate.warNumber
+
+            static_data = await crud.list_static_map_data_latest(
+                db, shard_id=shard.id, warNumber=warstate.warNumber
+            )
+            if static_data:
+                state.staticWarNumber = warstate.warNumber
+            for x in static_data:
+                hex = identity_registry.hexes_by_id.get(x.hex_id)
+                if hex is not None:
+                    version_registry.remember(
+                        shard.url,
+                        hex.name,
+                        warapiEndpoints.static_map_data.name,
+                        x.version,
+                    )
+
+    def current_war(self, shard_url: str) -> Optional[int]:
+        return self._shards.get(shard_url, ShardWar()).warNumber
+
+    def is_new_war(self, shard_url: str, war_number: int) -> bool:
+        current = self.current_war(shard_url)
+        return current is not None and current != war_number
+
+    def needs_static(self, shard_url: str) -> bool:
+        state = self._shards.get(shard_url)
+        return (
+            state is None
+            or state.warNumber is None
+            or state.staticWarNumber != state.warNumber
+        )
+
+    def observe(
+        self,
+        shard_url: str,
+        war_id: Optional[str],
+        war_number: Optional[int],
+        static_stored: bool,
+    ):
+        """
+        Records war and static map data of a committed poll.
+        """
+        state = self._shards.setdefault(shard_url, ShardWar())
+        if war_number is not None:
+            state.warId = war_id
+            state.warNumber = war_number
+        if static_stored:
+            state.staticWarNumber = state.warNumber
+
+
+war_lifecycle = WarLifecycle()
@@ -0,0 +1,90 @@
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.app.core.config import settings
+
+# Size of a hex region in meters. Item coordinates of the War API are normalized to
+# the bounding box of a flat-topped hex, so a hex is HEX_WIDTH wide and HEX_HEIGHT tall.
+HEX_WIDTH = 2200.0
+HEX_HEIGHT = HEX_WIDTH * math.sqrt(3) / 2
+
+# Position of every hex in the world grid, as (column, row) of a flat-topped hex grid
+# centered on Deadlands, rows growing south. Odd columns sit half a row lower.
+# Regions added or moved by an update can be placed by `HEX_LAYOUT_JSON`.
+HEX_LAYOUT: Dict[str, Tuple[float, float]] = {
+    "BasinSionnachHex": (0, -3),
+    "ReachingTrailHex": (0, -2),
+    "CallahansPassageHex": (0, -1),
+    "DeadLandsHex": (0, 0),
+    "UmbralWildwoodHex": (0, 1),
+    "GreatMarchHex": (0, 2),
+    "KalokaiHex": (0, 3),
+    "SpeakingWoodsHex": (-1, -2.5),
+    "MooringCountyHex": (-1, -1.5),
+    "LinnMercyHex": (-1, -0.5),
+    "LochMorHex": (-1, 0.5),
+    "HeartlandsHex": (-1, 1.5),
+    "RedRiverHex": (-1, 2.5),
+    "HowlCountyHex": (1, -2.5),
+    "ViperPitHex": (1, -1.5),
+    "MarbanHollow": (1, -0.5),
+    "DrownedValeHex": (1, 0.5),
+    "ShackledChasmHex": (1, 1.5),
+    "AcrithiaHex": (1, 2.5),
+    "CallumsCapeHex": (-2, -2),
+    "StonecradleHex": (-2, -1),
+    "KingsCageHex": (-2, 0),
+    "SableportHex": (-2, 1),
+    "AshFieldsHex": (-2, 2),
+    "OriginHex": (-2, 3),
+    "ClansheadValleyHex": (2, -2),
+    "WeatheredExpanseHex": (2, -1),
+    "StlicanShelfHex": (2, 0),
+    "EndlessShoreHex": (2, 1),
+    "AllodsBightHex": (2, 2),
+    "TerminusHex": (2, 3),
+    "NevishLineHex": (-3, -2.5),
+    "OarbreakerHex": (-3, -1.5),
+    "FarranacCoastHex": (-3, -0.5),
+    "FishermansRowHex": (-3, 0.5),
+    "WestgateHex": (-3, 1.5),
+    "StemaLandingHex": (-3, 2.5),
+    "MorgensCrossingHex": (3, -2.5),
+    "GodcroftsHex": (3, -1.5),
+    "ClahstraHex": (3, -0.5),
+    "TempestIslandHex": (3, 0.5),
+    "ReaversPassHex": (3, 1.5),
+    "TheFingersHex": (3, 2.5),
+}
+
+
+def hex_origin(hex_name: str) -> Optional[Tuple[float, float]]:
+    """
+    World coordinates in meters of the top left corner of a hex's bounding box,
+    None for a hex of unknown position. World origin is the center of Deadlands.
+    """
+    position = settings.HEX_LAYOUT_JSON.get(hex_name) or HEX_LAYOUT.get(hex_name)
+    if position is None:
+        return None
+    column, row = position
+    return (
+        column * HEX_WIDTH * 0.75 - HEX_WIDTH / 2,
+        row * HEX_HEIGHT - HEX_HEIGHT / 2,
+    )
+
+
+def project(
+    hex_name: str, xs: Sequence[float], ys: Sequence[float]
+) -> Optional[Tuple[List[float], List[float]]]:
+    """
+    World coordinates of a hex's items from their normalized `xs` and `ys`,
+    all items of the hex at once. None for a hex of unknown position.
+    """
+    origin = hex_origin(hex_name)
+    if origin is None:
+        return None
+    left, top = origin
+    return (
+        [left + x * HEX_WIDTH for x in xs],
+        [top + y * HEX_HEIGHT for y in ys],
+    )
@@ -0,0 +1,38 @@
+"""
+Settings need a database and War API urls to load. Without a `.env` file, tests run
+against throwaway defaults; DB-backed tests use their own SQLite engine, see `db`.
+"""
+
+import os
+
+if not os.path.exists(".env"):
+    os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+    os.environ.setdefault("WAR_API_BASE_URLS_JSON", '["http://test"]')
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import pytest  # noqa: E402
+from sqlalchemy.ext.asyncio import (  # noqa: E402
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from src.app.database.models import Base  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    """
+    Sessions of an empty SQLite database with every table, for tests of DB-backed services.
+    MySQL-only statements (`ON DUPLICATE KEY UPDATE`) don't run on it.
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
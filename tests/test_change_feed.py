@@ -0,0 +1,177 @@
+"""
+Change feed: hex subscribers get notifications narrowed to their hexes, and slow
+subscribers are dropped, ending their WebSocket with code 1013 or their SSE stream.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+import msgspec
+import pytest
+from fastapi import HTTPException, status
+
+from src.app.api.v1.endpoints import updates
+from src.app.core.config import settings
+from src.app.services.change_feed import ChangeFeed, _narrow
+from src.app.services.identity_registry import identity_registry
+
+SHARD = 1
+
+
+def notification(rev: int, **hexes: List[int]) -> Dict[str, Any]:
+    return {"shard_id": SHARD, "REV": rev, "warNumber": 130, "war_state": False} | hexes
+
+
+def test_narrow_keeps_only_present_lists():
+    message = _narrow(
+        notification(5, map_war_report=[1, 2, 3], dynamic_map_data=[3, 4]), {3, 9}
+    )
+    assert msgspec.json.decode(message) == notification(
+        5, map_war_report=[3], dynamic_map_data=[3]
+    )
+
+    # endpoints not polled stay left out, rather than showing up empty
+    message = _narrow(notification(5, dynamic_map_data=[3, 4]), {4})
+    assert msgspec.json.decode(message) == notification(5, dynamic_map_data=[4])
+
+
+def test_narrow_skips_polls_of_other_hexes():
+    assert _narrow(notification(5, map_war_report=[1, 2]), {3}) is None
+    assert _narrow(notification(5, map_war_report=[], static_map_data=[]), {3}) is None
+    assert _narrow(notification(5) | {"war_state": True}, {3}) is None
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    feed = ChangeFeed()
+    monkeypatch.setattr(settings, "FEED_QUEUE_SIZE", 2)
+    monkeypatch.setattr(updates, "change_feed", feed)
+    monkeypatch.setitem(identity_registry.shards_by_id, SHARD, object())
+    return feed
+
+
+@pytest.mark.anyio
+async def test_slow_subscriber_is_dropped(feed):
+    slow = feed.subscribe(SHARD)
+    hexes = feed.subscribe(SHARD, [7])
+    for rev in range(1, 4):
+        feed.publish(SHARD, notification(rev, dynamic_map_data=[1]))
+
+    assert slow.dropped
+    assert await slow.get() is None
+    # subscribers of other hexes were not sent anything, so aren't behind
+    assert not hexes.dropped
+    assert feed.subscriber_count(SHARD) == 1
+
+    feed.publish(SHARD, notification(4, dynamic_map_data=[7]))
+    assert msgspec.json.decode(await hexes.get())["REV"] == 4
+
+
+class FakeWebSocket:
+    """
+    Records what the endpoint sends. Sends block while `paused` is clear.
+    """
+
+    def __init__(self):
+        self.accepted = False
+        self.sent: List[Any] = []
+        self.closed: Optional[Tuple[int, Optional[str]]] = None
+        self.paused = asyncio.Event()
+        self.paused.set()
+        self.disconnect = asyncio.Event()
+
+    async def accept(self):
+        self.accepted = True
+
+    async def send_text(self, text: str):
+        await self.paused.wait()
+        self.sent.append(msgspec.json.decode(text))
+
+    async def close(self, code: int = 1000, reason: Optional[str] = None):
+        self.closed = (code, reason)
+
+    async def receive(self) -> Dict[str, Any]:
+        await self.disconnect.wait()
+        return {"type": "websocket.disconnect"}
+
+
+async def until(condition):
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0)
+    raise AssertionError("Condition not reached.")
+
+
+@pytest.mark.anyio
+async def test_websocket_of_slow_client_is_closed_with_1013(feed):
+    websocket = FakeWebSocket()
+    endpoint = asyncio.create_task(updates.subscribe_websocket(websocket, SHARD, None))
+    await until(lambda: feed.subscriber_count(SHARD) == 1)
+    assert websocket.accepted
+
+    feed.publish(SHARD, notification(1, dynamic_map_data=[1]))
+    await until(lambda: websocket.sent)
+    assert websocket.sent[0]["REV"] == 1
+
+    # client stops reading: one send hangs, then the queue fills up
+    websocket.paused.clear()
+    for rev in range(2, 6):
+        feed.publish(SHARD, notification(rev, dynamic_map_data=[1]))
+        await asyncio.sleep(0)
+    assert feed.subscriber_count(SHARD) == 0
+    websocket.paused.set()
+
+    await asyncio.wait_for(endpoint, 1)
+    assert websocket.closed[0] == status.WS_1013_TRY_AGAIN_LATER
+
+
+@pytest.mark.anyio
+async def test_websocket_disconnect_unsubscribes(feed):
+    websocket = FakeWebSocket()
+    endpoint = asyncio.create_task(updates.subscribe_websocket(websocket, SHARD, [3]))
+    await until(lambda: feed.subscriber_count(SHARD) == 1)
+
+    websocket.disconnect.set()
+    await asyncio.wait_for(endpoint, 1)
+    assert feed.subscriber_count(SHARD) == 0
+    # ended by the client, not dropped
+    assert websocket.closed is None
+
+
+@pytest.mark.anyio
+async def test_websocket_of_unknown_shard_is_refused(feed):
+    websocket = FakeWebSocket()
+    await updates.subscribe_websocket(websocket, SHARD + 1, None)
+    assert not websocket.accepted
+    assert websocket.closed[0] == status.WS_1008_POLICY_VIOLATION
+
+
+@pytest.mark.anyio
+async def test_sse_stream_of_slow_client_ends(feed, monkeypatch):
+    monkeypatch.setattr(settings, "FEED_KEEPALIVE", 0.01)
+    response = await updates.subscribe_sse(SHARD, [1])
+    events = response.body_iterator
+    assert feed.subscriber_count(SHARD) == 1
+
+    assert await anext(events) == b": keep-alive\n\n"
+
+    feed.publish(SHARD, notification(1, dynamic_map_data=[1, 2]))
+    event = await anext(events)
+    assert event.startswith(b"event: rev\ndata: ")
+    assert msgspec.json.decode(event.split(b"data: ")[1]) == notification(
+        1, dynamic_map_data=[1]
+    )
+
+    for rev in range(2, 5):
+        feed.publish(SHARD, notification(rev, dynamic_map_data=[1]))
+    assert feed.subscriber_count(SHARD) == 0
+    with pytest.raises(StopAsyncIteration):
+        await anext(events)
+
+
+@pytest.mark.anyio
+async def test_sse_of_unknown_shard_is_404(feed):
+    with pytest.raises(HTTPException) as e:
+        await updates.subscribe_sse(SHARD + 1, None)
+    assert e.value.status_code == 404
@@ -0,0 +1,126 @@
+"""
+Dynamic map data delta encoding: encoding a sequence of polls and replaying it the way
+`crud` does must give back every original snapshot.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+from src.app.database.dynamic_delta import DELTA_REMOVED, apply_delta, item_key
+from src.app.services.delta_encoder import DynamicDeltaEncoder
+
+SHARD, HEX = 1, 7
+
+
+def item(icon: int, x: float, y: float, team: str = "NONE", flags: int = 0):
+    return {
+        "iconType": icon,
+        "x": x,
+        "y": y,
+        "teamId": team,
+        "flags": flags,
+        "viewDirection": 0,
+    }
+
+
+def encode_polls(
+    encoder: DynamicDeltaEncoder, polls: List[List[Dict[str, Any]]]
+) -> List[Tuple[bool, List[Dict[str, Any]]]]:
+    out = []
+    for rev, items in enumerate(polls, start=1):
+        out.append(encoder.encode(SHARD, HEX, rev, [x | {"REV": rev} for x in items]))
+        encoder.commit(SHARD)
+    return out
+
+
+def replay(stored: List[Tuple[bool, List[Dict[str, Any]]]]) -> List[List[Any]]:
+    """
+    Snapshots of stored rows, as `crud.list_dynamic_map_data_REV` rebuilds them.
+    """
+    out = []
+    snapshot: Dict[Any, Dict[str, Any]] = {}
+    for is_keyframe, rows in stored:
+        if is_keyframe:
+            snapshot = {}
+        apply_delta(snapshot, rows)
+        out.append(canonical(snapshot.values()))
+    return out
+
+
+def canonical(items) -> List[Any]:
+    return sorted(
+        (item_key(x), x["teamId"], x["flags"], x["viewDirection"]) for x in items
+    )
+
+
+def check_round_trip(polls, interval: int = 100):
+    stored = encode_polls(DynamicDeltaEncoder(interval), polls)
+    assert replay(stored) == [canonical(x) for x in polls]
+    return stored
+
+
+def test_added_item():
+    a, b = item(1, 0.1, 0.1), item(2, 0.2, 0.2)
+    stored = check_round_trip([[a], [a, b]])
+    assert stored[0][0] is True
+    assert stored[1] == (False, [b | {"REV": 2, "deltaOp": "A"}])
+
+
+def test_removed_item():
+    a, b = item(1, 0.1, 0.1), item(2, 0.2, 0.2)
+    stored = check_round_trip([[a, b], [a]])
+    is_keyframe, rows = stored[1]
+    assert not is_keyframe
+    assert [(item_key(x), x["deltaOp"], x["REV"]) for x in rows] == [
+        (item_key(b), DELTA_REMOVED, 2)
+    ]
+
+
+def test_item_changed_in_place():
+    a, b = item(1, 0.1, 0.1), item(2, 0.2, 0.2)
+    captured = item(2, 0.2, 0.2, team="WARDENS", flags=4)
+    stored = check_round_trip([[a, b], [a, captured], [a, captured]])
+    assert [x["teamId"] for x in stored[1][1]] == ["WARDENS"]
+    # unchanged snapshot stores no rows
+    assert stored[2] == (False, [])
+
+
+def test_duplicate_key_forces_keyframe():
+    a, b = item(1, 0.1, 0.1), item(2, 0.2, 0.2)
+    polls = [[a], [a, b, item(2, 0.2, 0.2, team="WARDENS")], [a, b], [a]]
+    stored = encode_polls(DynamicDeltaEncoder(100), polls)
+    assert [x for x, _ in stored] == [True, True, True, False]
+    # items that can't be keyed are stored and replayed in full
+    assert stored[1][1] == [x | {"REV": 2} for x in polls[1]]
+    assert replay(stored)[2:] == [canonical(x) for x in polls[2:]]
+
+
+def test_keyframe_cadence():
+    polls = [[item(1, 0.1, 0.1, flags=x)] for x in range(7)]
+    stored = check_round_trip(polls, interval=3)
+    assert [x for x, _ in stored] == [True, False, False, True, False, False, True]
+
+
+def test_discarded_encode_is_not_a_base():
+    encoder = DynamicDeltaEncoder(100)
+    a, b, c = item(1, 0.1, 0.1), item(2, 0.2, 0.2), item(3, 0.3, 0.3)
+    stored = encode_polls(encoder, [[a]])
+
+    # poll of REV 2 fails before commit, its rows are never stored
+    encoder.encode(SHARD, HEX, 2, [a, b])
+    encoder.discard(SHARD)
+
+    stored.append(encoder.encode(SHARD, HEX, 3, [a | {"REV": 3}, c | {"REV": 3}]))
+    encoder.commit(SHARD)
+    assert replay(stored) == [canonical([a]), canonical([a, c])]
+    assert [item_key(x) for x in stored[1][1]] == [item_key(c)]
+
+
+def test_hexes_and_shards_are_independent():
+    encoder = DynamicDeltaEncoder(100)
+    a = item(1, 0.1, 0.1)
+    assert encoder.encode(1, 1, 1, [a])[0]
+    assert encoder.encode(2, 1, 1, [a])[0]
+    encoder.commit(1)
+    encoder.commit(2)
+    assert not encoder.encode(1, 1, 2, [a])[0]
+    assert encoder.encode(1, 2, 2, [a])[0]
@@ -0,0 +1,196 @@
+"""
+Conditional requests and content negotiation of cached responses.
+"""
+
+import asyncio
+import gzip
+import time
+from datetime import datetime, timezone
+from typing import Dict
+
+import msgspec
+import pytest
+from fastapi import Request
+
+from src.app.api.v1 import http_cache
+from src.app.api.v1.http_cache import (
+    _etag_matches,
+    _not_modified_since,
+    cached_response,
+    content_encoding,
+)
+from src.app.core.config import settings
+from src.app.services.state_cache import CachedBody, ShardState
+
+MODIFIED = datetime(2025, 3, 1, 12, 30, 15, 250000, tzinfo=timezone.utc)
+
+
+def request(**headers: str) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "headers": [
+                (x.replace("_", "-").encode(), y.encode()) for x, y in headers.items()
+            ],
+        }
+    )
+
+
+@pytest.fixture
+def encoders(monkeypatch):
+    encoders = {"zstd": lambda x: b"zstd:" + x, "gzip": lambda x: gzip.compress(x)}
+    monkeypatch.setattr(http_cache, "ENCODERS", encoders)
+    return encoders
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("gzip, zstd", "zstd"),
+        ("zstd;q=0, gzip", "gzip"),
+        ("zstd; q=0.0, gzip;q=0.5", "gzip"),
+        ("zstd;q=0.1, gzip;q=1", "zstd"),
+        ("GZIP", "gzip"),
+        ("*", "zstd"),
+        ("*;q=0.5, zstd;q=0", "gzip"),
+        ("*;q=0", None),
+        ("gzip;q=0, *;q=0", None),
+        ("gzip;q=high", None),
+    ],
+)
+def test_content_encoding(encoders, header: str, expected: str):
+    assert content_encoding(request(accept_encoding=header)) == expected
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ('W/"war_state-1-5"', True),
+        ('"war_state-1-5"', True),
+        ('W/"war_state-1-4", W/"war_state-1-5"', True),
+        ("*", True),
+        (" * ", True),
+        ('W/"war_state-1-4"', False),
+        ('W/"war_state-1-50"', False),
+        ("", False),
+    ],
+)
+def test_etag_matches(header: str, expected: bool):
+    assert _etag_matches(header, 'W/"war_state-1-5"') is expected
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("Sat, 01 Mar 2025 12:30:15 GMT", True),
+        ("Sat, 01 Mar 2025 12:30:16 GMT", True),
+        ("Sat, 01 Mar 2025 12:30:14 GMT", False),
+        ("Sat, 01 Mar 2025 13:30:15 +0100", True),
+        ("Sat, 01 Mar 2025 12:30:15", True),
+        ("yesterday", False),
+        ("", False),
+    ],
+)
+def test_not_modified_since(header: str, expected: bool):
+    assert _not_modified_since(header, MODIFIED) is expected
+
+
+def shard_state(body: CachedBody) -> ShardState:
+    return ShardState(
+        war_state=body, rev_times={body.rev: MODIFIED.replace(tzinfo=None)}
+    )
+
+
+@pytest.mark.anyio
+async def test_conditional_requests(encoders):
+    body = CachedBody(b'{"warNumber":1}', 5)
+    shard = shard_state(body)
+
+    response = await cached_response(request(), shard, body, "war_state", 1)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    last_modified = response.headers["last-modified"]
+    assert last_modified == "Sat, 01 Mar 2025 12:30:15 GMT"
+
+    for headers in (
+        {"if_none_match": etag},
+        {"if_modified_since": last_modified},
+        # If-None-Match wins over If-Modified-Since
+        {"if_none_match": etag, "if_modified_since": "Sat, 01 Mar 2000 00:00:00 GMT"},
+    ):
+        response = await cached_response(
+            request(**headers), shard, body, "war_state", 1
+        )
+        assert response.status_code == 304
+        assert response.body == b""
+        assert response.headers["etag"] == etag
+
+    response = await cached_response(
+        request(if_none_match='W/"war_state-1-4"', if_modified_since=last_modified),
+        shard,
+        body,
+        "war_state",
+        1,
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_compressed_once_off_event_loop(encoders, monkeypatch):
+    monkeypatch.setattr(settings, "HTTP_COMPRESS_MIN_SIZE", 10)
+    builds: Dict[str, int] = {}
+
+    def slow_gzip(content: bytes) -> bytes:
+        builds["gzip"] = builds.get("gzip", 0) + 1
+        # blocks its thread, not the event loop
+        time.sleep(0.05)
+        return gzip.compress(content)
+
+    encoders["gzip"] = slow_gzip
+    body = CachedBody(b'{"warNumber":1,"padding":"' + b"x" * 100 + b'"}', 5)
+    shard = shard_state(body)
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.001)
+
+    ticking = asyncio.create_task(ticker())
+    responses = await asyncio.gather(
+        *[
+            cached_response(request(accept_encoding="gzip"), shard, body, "x", 1)
+            for _ in range(5)
+        ]
+    )
+    ticking.cancel()
+
+    assert builds == {"gzip": 1}
+    assert ticks > 5
+    assert not body.building
+    for response in responses:
+        assert response.headers["content-encoding"] == "gzip"
+        assert gzip.decompress(response.body) == body.content
+
+    # small bodies are sent as they are
+    small = CachedBody(b"[]", 5)
+    response = await cached_response(
+        request(accept_encoding="gzip"), shard_state(small), small, "x", 1
+    )
+    assert "content-encoding" not in response.headers
+    assert response.body == b"[]"
+
+
+@pytest.mark.anyio
+async def test_msgpack_variant(encoders):
+    body = CachedBody(b'{"warNumber":1}', 5)
+    response = await cached_response(
+        request(), shard_state(body), body, "x", 1, format="msgpack"
+    )
+    assert msgspec.msgpack.decode(response.body) == {"warNumber": 1}
+    assert response.headers["etag"] == 'W/"x-1-5-msgpack"'
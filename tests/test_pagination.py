@@ -0,0 +1,94 @@
+"""
+Cursor pagination: opaque cursors round trip, bad ones are client errors, and (REV, id)
+keyset pages neither skip nor repeat rows of a REV split across pages.
+"""
+
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List, Optional, Tuple
+
+import pytest
+from fastapi import HTTPException, Response
+
+from src.app.api.v1.pagination import (
+    NEXT_CURSOR_HEADER,
+    decode_cursor,
+    encode_cursor,
+    set_next_cursor,
+)
+from src.app.database import crud
+from src.app.database.models import REV, MapWarReport, Shard
+
+
+@pytest.mark.parametrize("rev, id_", [(1, 1), (0, 0), (123456, 2**31 - 1), (7, 10**12)])
+def test_cursor_round_trip(rev: int, id_: int):
+    token = encode_cursor(SimpleNamespace(REV=rev, id=id_))
+    assert "=" not in token
+    assert decode_cursor(token) == (rev, id_)
+
+
+def test_no_cursor():
+    assert decode_cursor(None) is None
+
+
+@pytest.mark.parametrize(
+    "token", ["", "A", "not a cursor", "MTI", "MToyOjM", "YTpi", "w4k6MQ", "é", "__8"]
+)
+def test_malformed_cursor_is_400(token: str):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(token)
+    assert e.value.status_code == 400
+
+
+def test_next_cursor_only_on_full_pages():
+    rows = [SimpleNamespace(REV=5, id=x) for x in range(3)]
+    response = Response()
+    set_next_cursor(response, rows, 3)
+    assert decode_cursor(response.headers[NEXT_CURSOR_HEADER]) == (5, 2)
+
+    for page in (rows[:2], []):
+        response = Response()
+        set_next_cursor(response, page, 3)
+        assert NEXT_CURSOR_HEADER not in response.headers
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("limit", [1, 3, 7, 25])
+async def test_keyset_pages_over_shared_REVs(session_factory, limit: int):
+    start = datetime(2025, 3, 1)
+    rnd = random.Random(limit)
+    async with session_factory() as db:
+        revs = [REV(tmstmp=start + timedelta(minutes=x)) for x in range(5)]
+        db.add_all(revs)
+        await db.flush()
+        db.add(Shard(id=1, REV=revs[0].REV, url="http://test"))
+        # ids don't follow REVs: rows of REVs are inserted in random order
+        rows = [(rev.REV, hex_id) for rev in revs for hex_id in range(1, 12)]
+        rnd.shuffle(rows)
+        db.add_all(MapWarReport(REV=x, shard_id=1, hex_id=y) for x, y in rows)
+        # another shard, interleaved ids
+        db.add_all(MapWarReport(REV=x, shard_id=2, hex_id=y) for x, y in rows[:10])
+        await db.commit()
+
+        date_range = (start, start + timedelta(hours=1))
+        expected = await crud.list_map_war_reports_REV(
+            db, *date_range, limit=1000, shard_id=1
+        )
+        expected_keys = sorted((x.REV, x.id) for x in expected)
+        assert [(x.REV, x.id) for x in expected] == expected_keys
+        assert len(expected_keys) == 55
+
+        seen: List[Tuple[int, int]] = []
+        token: Optional[str] = None
+        while True:
+            page = await crud.list_map_war_reports_REV(
+                db, *date_range, limit=limit, cursor=decode_cursor(token), shard_id=1
+            )
+            seen += [(x.REV, x.id) for x in page]
+            response = Response()
+            set_next_cursor(response, page, limit)
+            token = response.headers.get(NEXT_CURSOR_HEADER)
+            if token is None:
+                break
+    assert seen == expected_keys
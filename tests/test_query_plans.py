@@ -0,0 +1,292 @@
+"""
+Query plan regression tests. Run the CRUD read queries against the configured MariaDB,
+EXPLAIN every SELECT they issue and check the plan the optimizer chose: every data table
+must be read through an index, and each case must use the index it was written for.
+Run against a database holding real history, the optimizer scans near-empty tables:
+
+    uv run pytest tests/test_query_plans.py
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Set, Tuple
+
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.database import crud
+from src.app.database.models import DynamicMapData, Hex, Shard, WarState
+from src.app.database.session import AsyncSessionLocal, engine
+
+if engine.dialect.name != "mysql":
+    pytest.skip("Query plans are checked on MariaDB only.", allow_module_level=True)
+
+# dictionary tables, small enough to be scanned
+SCAN_ALLOWED = {"hex", "shard", "StructureTypes"}
+
+
+@dataclass
+class Case:
+    name: str
+    run: Callable[[AsyncSession, Dict[str, Any]], Awaitable[Any]]
+    # table -> index some read of it must use
+    keys: Dict[str, str] = field(default_factory=dict)
+
+
+async def _drain(rows: AsyncIterator[Any]):
+    async for _ in rows:
+        pass
+
+
+def _range(x: Dict[str, Any]) -> Tuple[datetime, datetime]:
+    return x["from"], x["to"]
+
+
+CASES = [
+    Case(
+        "get_warstate_latest",
+        lambda db, x: crud.get_warstate_latest(db, shard_id=x["shard_id"]),
+        {"LatestRow": "PRIMARY", "WarState": "PRIMARY"},
+    ),
+    Case(
+        "get_warstate_latest of a war",
+        lambda db, x: crud.get_warstate_latest(
+            db, shard_id=x["shard_id"], warNumber=x["war_number"]
+        ),
+        {"WarState": "ix_WarState_shard_war_REV"},
+    ),
+    Case(
+        "list_warstates_REV",
+        lambda db, x: crud.list_warstates_REV(db, *_range(x), shard_id=x["shard_id"]),
+        {"REV": "ix_REV_tmstmp", "WarState": "ix_WarState_shard_REV"},
+    ),
+    Case(
+        "get_map_war_report_latest",
+        lambda db, x: crud.get_map_war_report_latest(
+            db, shard_id=x["shard_id"], hex_id=x["hex_id"]
+        ),
+        {"LatestRow": "PRIMARY", "MapWarReport": "PRIMARY"},
+    ),
+    Case(
+        "list_map_war_report_latest",
+        lambda db, x: crud.list_map_war_report_latest(db, shard_id=x["shard_id"]),
+        {"LatestRow": "PRIMARY", "MapWarReport": "PRIMARY"},
+    ),
+    Case(
+        "list_map_war_reports_REV",
+        lambda db, x: crud.list_map_war_reports_REV(
+            db, *_range(x), shard_id=x["shard_id"]
+        ),
+        {"MapWarReport": "ix_MapWarReport_shard_REV"},
+    ),
+    Case(
+        "list_map_war_reports_REV of a hex, with cursor",
+        lambda db, x: crud.list_map_war_reports_REV(
+            db,
+            *_range(x),
+            cursor=(x["rev"], 0),
+            shard_id=x["shard_id"],
+            hex_id=x["hex_id"],
+        ),
+        {"MapWarReport": "ix_MapWarReport_shard_hex_REV"},
+    ),
+    Case(
+        "stream_map_war_reports_REV",
+        lambda db, x: _drain(
+            crud.stream_map_war_reports_REV(db, *_range(x), shard_id=x["shard_id"])
+        ),
+        {"MapWarReport": "ix_MapWarReport_shard_REV"},
+    ),
+    Case(
+        "get_map_war_report_totals",
+        lambda db, x: crud.get_map_war_report_totals(db, x["shard_id"]),
+        {"LatestRow": "PRIMARY", "MapWarReport": "PRIMARY"},
+    ),
+    Case(
+        "list_map_war_report_rollups",
+        lambda db, x: crud.list_map_war_report_rollups(
+            db, x["shard_id"], 0, 3600, *_range(x)
+        ),
+        {"MapWarReportRollup": "PRIMARY"},
+    ),
+    Case(
+        "list_static_map_data_latest of a war",
+        lambda db, x: crud.list_static_map_data_latest(
+            db, shard_id=x["shard_id"], warNumber=x["war_number"]
+        ),
+        {
+            "StaticMapData": "ix_StaticMapData_shard_war_hex_REV",
+            "StaticMapDataItem": "ix_StaticMapDataItem_parent",
+        },
+    ),
+    Case(
+        "get_dynamic_map_data_latest",
+        lambda db, x: crud.get_dynamic_map_data_latest(
+            db, shard_id=x["shard_id"], hex_id=x["hex_id"]
+        ),
+        {"LatestRow": "PRIMARY", "DynamicMapDataItem": "ix_DynamicMapDataItem_parent"},
+    ),
+    Case(
+        "list_dynamic_map_data_latest",
+        lambda db, x: crud.list_dynamic_map_data_latest(db, shard_id=x["shard_id"]),
+        {"LatestRow": "PRIMARY", "DynamicMapDataItem": "ix_DynamicMapDataItem_parent"},
+    ),
+    Case(
+        "list_dynamic_map_data_REV of a hex",
+        lambda db, x: crud.list_dynamic_map_data_REV(
+            db, *_range(x), shard_id=x["shard_id"], hex_id=x["hex_id"]
+        ),
+        {"DynamicMapData": "ix_DynamicMapData_shard_hex_REV"},
+    ),
+    Case(
+        "list_dynamic_map_data_of_REV",
+        lambda db, x: crud.list_dynamic_map_data_of_REV(
+            db, x["rev"], shard_id=x["shard_id"]
+        ),
+        {"DynamicMapData": "ix_DynamicMapData_shard_REV"},
+    ),
+    Case(
+        "stream_dynamic_map_data_REV",
+        lambda db, x: _drain(
+            crud.stream_dynamic_map_data_REV(db, *_range(x), shard_id=x["shard_id"])
+        ),
+        {
+            "DynamicMapData": "ix_DynamicMapData_shard_REV",
+            "DynamicMapDataItem": "ix_DynamicMapDataItem_parent",
+        },
+    ),
+    Case(
+        "list_warstates_at_REV",
+        lambda db, x: crud.list_warstates_at_REV(db, x["rev"], shard_id=x["shard_id"]),
+        {"WarState": "ix_WarState_shard_REV"},
+    ),
+    Case(
+        "list_map_war_reports_at_REV",
+        lambda db, x: crud.list_map_war_reports_at_REV(
+            db, x["rev"], shard_id=x["shard_id"]
+        ),
+        {"MapWarReport": "ix_MapWarReport_shard_hex_REV"},
+    ),
+    Case(
+        "list_dynamic_map_data_at_REV",
+        lambda db, x: crud.list_dynamic_map_data_at_REV(
+            db, x["rev"], shard_id=x["shard_id"]
+        ),
+        {"DynamicMapData": "ix_DynamicMapData_shard_hex_REV"},
+    ),
+    Case(
+        "list_war_starts",
+        lambda db, x: crud.list_war_starts(db, x["shard_id"]),
+        {"WarState": "ix_WarState_shard_war_REV"},
+    ),
+    Case(
+        "list_first_ids_after_REV",
+        lambda db, x: crud.list_first_ids_after_REV(
+            db, DynamicMapData, x["shard_id"], x["rev"]
+        ),
+        {"DynamicMapData": "ix_DynamicMapData_shard_hex_REV"},
+    ),
+    Case(
+        "list_structure_events_REV",
+        lambda db, x: crud.list_structure_events_REV(
+            db, *_range(x), shard_id=x["shard_id"]
+        ),
+        {"StructureEvent": "ix_StructureEvent_shard_REV"},
+    ),
+    Case(
+        "list_structure_events_REV of a team",
+        lambda db, x: crud.list_structure_events_REV(
+            db, *_range(x), shard_id=x["shard_id"], teamId="WARDENS"
+        ),
+        {"StructureEvent": "ix_StructureEvent_shard_team_REV"},
+    ),
+]
+
+
+async def _sample(db: AsyncSession) -> Dict[str, Any]:
+    """
+    Ids to query with, taken from stored data where there is any.
+    """
+    shard_id = (await db.execute(select(func.min(Shard.id)))).scalar() or 1
+    hex_id = (await db.execute(select(func.min(Hex.id)))).scalar() or 1
+    war_number = (
+        await db.execute(
+            select(func.max(WarState.warNumber)).where(WarState.shard_id == shard_id)
+        )
+    ).scalar() or 1
+    rev = (await db.execute(select(func.max(DynamicMapData.REV)))).scalar() or 1
+    return {
+        "shard_id": shard_id,
+        "hex_id": hex_id,
+        "war_number": war_number,
+        "rev": rev,
+        "to": datetime.now(),
+        "from": datetime.now() - timedelta(days=1),
+    }
+
+
+async def _plans(case: Case) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Runs `case` and returns every SELECT it issued, with its EXPLAIN rows.
+    """
+    statements: List[Tuple[str, Any]] = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    try:
+        async with AsyncSessionLocal() as db:
+            sample = await _sample(db)
+        event.listen(engine.sync_engine, "before_cursor_execute", listener)
+        try:
+            async with AsyncSessionLocal() as db:
+                await case.run(db, sample)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", listener)
+
+        out = []
+        async with engine.connect() as conn:
+            for statement, parameters in statements:
+                result = await conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+                out.append((statement, [dict(x) for x in result.mappings().all()]))
+        return out
+    finally:
+        # every test runs its own event loop, pooled connections can't outlive it
+        await engine.dispose()
+
+
+def full_scans(plan: List[Dict[str, Any]]) -> List[str]:
+    """
+    Data tables the chosen plan reads by a full scan.
+    """
+    return [
+        row["table"]
+        for row in plan
+        if row["type"] == "ALL"
+        and row["table"] not in SCAN_ALLOWED
+        and not str(row["table"]).startswith("<")  # derived tables and subqueries
+    ]
+
+
+@pytest.mark.parametrize("case", CASES, ids=[x.name for x in CASES])
+def test_query_plan(case: Case):
+    plans = asyncio.run(_plans(case))
+    assert plans, "Case issued no SELECT."
+
+    for statement, plan in plans:
+        tables = full_scans(plan)
+        assert not tables, (
+            f"Full scan of {', '.join(tables)}: {' '.join(statement.split())}"
+        )
+
+    used: Dict[str, Set[Any]] = {}
+    for _, plan in plans:
+        for row in plan:
+            used.setdefault(row["table"], set()).add(row["key"])
+    for table, key in case.keys.items():
+        assert key in used.get(table, set()), (
+            f"{table} is read by {sorted(map(str, used.get(table, [])))}, not {key}."
+        )
@@ -0,0 +1,67 @@
+"""
+Rollup buckets: alignment of bucket starts and resolution picked for a time range.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.app.core.config import settings
+from src.app.services.report_rollups import bucket_start, pick_resolution
+
+T = datetime(2025, 3, 1, 12, 35, 17, 250000)
+
+
+@pytest.mark.parametrize(
+    "resolution, expected",
+    [
+        (300, datetime(2025, 3, 1, 12, 35)),
+        (3600, datetime(2025, 3, 1, 12)),
+        (86400, datetime(2025, 3, 1)),
+    ],
+)
+def test_bucket_start(resolution: int, expected: datetime):
+    assert bucket_start(T, resolution) == expected
+    # REV timestamps are UTC, aware ones land in the same bucket
+    assert bucket_start(T.replace(tzinfo=timezone.utc), resolution) == expected
+
+
+@pytest.mark.parametrize("resolution", [300, 3600, 86400])
+def test_bucket_boundaries(resolution: int):
+    start = datetime(2025, 3, 1)
+    step = timedelta(seconds=resolution)
+    assert bucket_start(start, resolution) == start
+    assert bucket_start(start + step, resolution) == start + step
+    assert bucket_start(start + step - timedelta(microseconds=1), resolution) == start
+    assert bucket_start(start - timedelta(microseconds=1), resolution) == start - step
+
+
+@pytest.mark.parametrize(
+    "points, expected",
+    [
+        (0, 300),
+        (500, 300),
+        (500 + 1 / 300, 3600),
+        (500 * 12, 3600),
+        (500 * 12 + 1 / 300, 86400),
+        (500 * 288, 86400),
+        # coarsest resolution even if it gives more points
+        (500 * 288 * 10, 86400),
+    ],
+)
+def test_pick_resolution(monkeypatch, points: float, expected: int):
+    monkeypatch.setattr(settings, "ROLLUP_MAX_POINTS", 500)
+    start = datetime(2025, 3, 1)
+    end = start + timedelta(seconds=points * 300)
+    assert pick_resolution(start, end) == expected
+
+
+def test_pick_resolution_follows_max_points(monkeypatch):
+    start = datetime(2025, 3, 1)
+    week = start + timedelta(days=7)
+    monkeypatch.setattr(settings, "ROLLUP_MAX_POINTS", 2016)
+    assert pick_resolution(start, week) == 300
+    monkeypatch.setattr(settings, "ROLLUP_MAX_POINTS", 168)
+    assert pick_resolution(start, week) == 3600
+    monkeypatch.setattr(settings, "ROLLUP_MAX_POINTS", 167)
+    assert pick_resolution(start, week) == 86400
@@ -0,0 +1,216 @@
+"""
+Retention: thinning keeps the last snapshot of every hex in every bucket, never deletes the
+newest snapshot of a hex and leaves history of kept delta snapshots replayable.
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Dict, List
+
+import pytest
+from sqlalchemy import select
+
+from src.app.core.config import RetentionTier, settings
+from src.app.database import crud
+from src.app.database.models import (
+    REV,
+    DynamicMapData,
+    DynamicMapDataItem,
+    MapWarReport,
+    RetentionWatermark,
+    Shard,
+    WarState,
+)
+from src.app.services import retention
+from src.app.services.report_rollups import bucket_start
+from src.app.services.retention import (
+    RetentionEngine,
+    compact_slice,
+    tier_cutoff,
+)
+
+HOUR = 3600
+T0 = datetime(2025, 3, 1, 12)
+
+
+def row(id_: int, hex_id: int, minutes: float, is_keyframe: bool = True):
+    return SimpleNamespace(
+        id=id_,
+        hex_id=hex_id,
+        REV=id_,
+        tmstmp=T0 + timedelta(minutes=minutes),
+        isKeyframe=is_keyframe,
+    )
+
+
+def compact(model, rows, keep_every: int = HOUR, chunk: int = 1000):
+    open_buckets = {}
+    delete, keyframes = [], []
+    for i in range(0, len(rows), chunk):
+        out = compact_slice(
+            model, rows[i : i + chunk], keep_every, open_buckets, i + chunk >= len(rows)
+        )
+        delete += out.delete
+        keyframes += out.keyframes
+    return delete, keyframes
+
+
+@pytest.mark.parametrize("chunk", [1, 2, 1000])
+def test_keeps_last_snapshot_per_hex_and_bucket(chunk: int):
+    rows = [
+        row(1, 1, 0),
+        row(2, 2, 5),
+        row(3, 1, 10),
+        row(4, 1, 59),
+        row(5, 2, 61),
+        row(6, 1, 70),
+        row(7, 1, 130),
+    ]
+    delete, _ = compact(MapWarReport, rows, chunk=chunk)
+    assert sorted(delete) == [1, 3]
+
+
+def test_newest_snapshot_of_hex_is_never_deleted():
+    rnd = random.Random(1)
+    rows = []
+    minutes = 0.0
+    for id_ in range(1, 500):
+        minutes += rnd.random() * 20
+        rows.append(row(id_, rnd.randint(1, 6), minutes))
+
+    for chunk in (7, 64, 1000):
+        delete, _ = compact(MapWarReport, rows, chunk=chunk)
+        kept = [x for x in rows if x.id not in set(delete)]
+        newest: Dict[int, int] = {x.hex_id: x.id for x in rows}
+        assert set(newest.values()) <= {x.id for x in kept}
+        buckets = [(x.hex_id, bucket_start(x.tmstmp, HOUR)) for x in kept]
+        assert len(buckets) == len(set(buckets))
+        assert set(buckets) == {(x.hex_id, bucket_start(x.tmstmp, HOUR)) for x in rows}
+
+
+def test_kept_delta_snapshot_becomes_keyframe():
+    rows = [row(1, 1, 0), row(2, 1, 10, False), row(3, 1, 70, False)]
+    delete, keyframes = compact(DynamicMapData, rows)
+    assert delete == [1]
+    assert keyframes == [2]
+    # nothing deleted before it, no need to materialize
+    assert compact(DynamicMapData, [row(1, 1, 0, False)]) == ([], [])
+
+
+def test_cutoff_is_bucket_of_war_start():
+    tier = RetentionTier(after_hours=24, keep_every=HOUR, finished_wars_only=True)
+    now = T0 + timedelta(days=10, minutes=30)
+    assert tier_cutoff(now, tier) == T0 + timedelta(days=9)
+    war_start = T0 + timedelta(days=2, minutes=40)
+    assert tier_cutoff(now, tier, war_start) == T0 + timedelta(days=2)
+    tier.finished_wars_only = False
+    assert tier_cutoff(now, tier, war_start) == T0 + timedelta(days=9)
+
+
+@pytest.fixture
+def engine(session_factory, monkeypatch):
+    async def upsert_retention_watermark(db, model, shard_id, keep_every, rev):
+        await db.merge(
+            RetentionWatermark(
+                entity=model.__tablename__,
+                shard_id=shard_id,
+                keep_every=keep_every,
+                REV=rev,
+            )
+        )
+
+    monkeypatch.setattr(retention, "AsyncSessionLocal", session_factory)
+    monkeypatch.setattr(crud, "upsert_retention_watermark", upsert_retention_watermark)
+    monkeypatch.setattr(settings, "RETENTION_PAUSE", 0)
+    monkeypatch.setattr(settings, "RETENTION_REV_CHUNK", 2)
+    monkeypatch.setattr(settings, "RETENTION_BATCH_SIZE", 2)
+    return RetentionEngine()
+
+
+def start() -> datetime:
+    # whole hour, long enough ago for every tier used here
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return bucket_start(now - timedelta(days=3), HOUR)
+
+
+async def add_revs(db, times: List[datetime]) -> List[int]:
+    revs = [REV(tmstmp=x) for x in times]
+    db.add_all(revs)
+    await db.flush()
+    return [x.REV for x in revs]
+
+
+@pytest.mark.anyio
+async def test_finished_war_bucket_is_thinned_once(session_factory, engine):
+    hour = start()
+    minutes = [-30, 10, 20, 30, 40, 120]
+    wars = [1, 1, 1, 2, 2, 2]
+    async with session_factory() as db:
+        revs = await add_revs(db, [hour + timedelta(minutes=x) for x in minutes])
+        db.add(Shard(id=1, REV=revs[0], url="http://test"))
+        for rev, war in zip(revs, wars):
+            db.add(WarState(REV=rev, shard_id=1, warNumber=war, conquestStartTime=hour))
+            db.add(MapWarReport(REV=rev, shard_id=1, hex_id=1))
+        await db.commit()
+
+    tier = RetentionTier(after_hours=0, keep_every=HOUR, finished_wars_only=True)
+    # war 2 started mid-bucket, the bucket is left whole while war 2 runs
+    assert await engine.compact(MapWarReport, 1, tier) == 0
+
+    async with session_factory() as db:
+        (rev,) = await add_revs(db, [hour + timedelta(minutes=180)])
+        db.add(WarState(REV=rev, shard_id=1, warNumber=3, conquestStartTime=hour))
+        db.add(MapWarReport(REV=rev, shard_id=1, hex_id=1))
+        await db.commit()
+    assert await engine.compact(MapWarReport, 1, tier) == 3
+
+    async with session_factory() as db:
+        kept = (await db.execute(select(MapWarReport.REV))).scalars().all()
+    assert sorted(kept) == [revs[0], revs[4], revs[5], rev]
+
+
+@pytest.mark.anyio
+async def test_history_replays_after_thinning(session_factory, engine):
+    hour = start()
+    a, b, c, d = [
+        {"iconType": icon, "x": 0.1 * icon, "y": 0.1, "flags": 0, "teamId": "NONE"}
+        for icon in (11, 12, 13, 14)
+    ]
+    captured = b | {"teamId": "WARDENS"}
+    # (minutes, is keyframe, stored items)
+    polls = [
+        (0, True, [a, b]),
+        (10, False, [c | {"deltaOp": "A"}]),
+        (20, False, [a | {"deltaOp": "R"}, captured | {"deltaOp": "A"}]),
+        (130, False, [d | {"deltaOp": "A"}]),
+    ]
+    async with session_factory() as db:
+        revs = await add_revs(db, [hour + timedelta(minutes=x) for x, _, _ in polls])
+        db.add(Shard(id=1, REV=revs[0], url="http://test"))
+        for rev, (_, is_keyframe, items) in zip(revs, polls):
+            parent = DynamicMapData(
+                REV=rev, shard_id=1, hex_id=1, isKeyframe=is_keyframe
+            )
+            db.add(parent)
+            await db.flush()
+            db.add_all(
+                DynamicMapDataItem(REV=rev, DynamicMapData_id=parent.id, **x)
+                for x in items
+            )
+        await db.commit()
+
+    tier = RetentionTier(after_hours=0, keep_every=HOUR)
+    assert await engine.compact(DynamicMapData, 1, tier) == 2
+
+    async with session_factory() as db:
+        data = await crud.list_dynamic_map_data_REV(
+            db, hour, hour + timedelta(days=1), shard_id=1
+        )
+
+    def items(x):
+        return sorted((y.iconType, y.teamId) for y in x.mapItems)
+
+    assert [(x.REV, x.isKeyframe) for x in data] == [(revs[2], True), (revs[3], False)]
+    assert items(data[0]) == [(12, "WARDENS"), (13, "NONE")]
+    assert items(data[1]) == [(12, "WARDENS"), (13, "NONE"), (14, "NONE")]
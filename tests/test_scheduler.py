@@ -0,0 +1,160 @@
+"""
+Poll scheduling: ticks stay on their interval grid when polls start late or overrun,
+and a crashing shard pipeline is restarted. Time is simulated.
+"""
+
+import asyncio
+from types import SimpleNamespace
+from typing import List, Set, Tuple
+
+import pytest
+
+from src.app.core.config import settings
+from src.app.schemas.warapiEndpointEnum import warapiEndpoints
+from src.app.services import scheduler
+from src.app.services.scheduler import PollScheduler, next_tick
+from src.app.services.war_lifecycle import war_lifecycle
+
+WAR_STATE = warapiEndpoints.war_state
+REPORT = warapiEndpoints.map_war_report
+
+
+@pytest.mark.parametrize(
+    "previous, now, expected",
+    [
+        (0, 0, 10),  # polled on time
+        (0, 3, 10),
+        (0, 10, 20),  # poll ended right on the next tick
+        (0, 14, 20),  # started late, back on the grid
+        (0, 25, 30),  # overran two ticks, they are skipped
+        (100, 95, 100),  # not due yet
+    ],
+)
+def test_next_tick(previous: float, now: float, expected: float):
+    assert next_tick(previous, 10, now) == expected
+
+
+class Stop(BaseException):
+    """
+    Ends a simulated run, not caught by the scheduler.
+    """
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+        # extra seconds sleeps overshoot by, one entry per sleep
+        self.late: List[float] = []
+
+    def time(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float):
+        self.now += delay + (self.late.pop(0) if self.late else 0.0)
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(
+        scheduler,
+        "asyncio",
+        SimpleNamespace(
+            get_running_loop=lambda: clock,
+            sleep=clock.sleep,
+            Semaphore=asyncio.Semaphore,
+            TimeoutError=asyncio.TimeoutError,
+            wait_for=asyncio.wait_for,
+            gather=asyncio.gather,
+        ),
+    )
+    monkeypatch.setattr(war_lifecycle, "needs_static", lambda _: False)
+    return clock
+
+
+def polls_of(
+    clock: Clock, durations: List[float], count: int
+) -> Tuple[PollScheduler, List[Tuple[float, Set[warapiEndpoints]]]]:
+    polls: List[Tuple[float, Set[warapiEndpoints]]] = []
+    poller = PollScheduler(None, ["http://test"], {WAR_STATE: 10, REPORT: 30})
+
+    async def poll_shard(base_url, endpoints):
+        polls.append((clock.now, set(endpoints)))
+        if len(polls) >= count:
+            raise Stop()
+        clock.now += durations.pop(0) if durations else 0.0
+
+    poller.poll_shard = poll_shard
+    return poller, polls
+
+
+@pytest.mark.anyio
+async def test_late_tick_keeps_schedule(clock):
+    poller, polls = polls_of(clock, [], 5)
+    # wakes up 4 seconds late once
+    clock.late = [4.0]
+    with pytest.raises(Stop):
+        await poller.run_shard("http://test")
+    assert polls == [
+        (0, {WAR_STATE, REPORT}),
+        (14, {WAR_STATE}),
+        (20, {WAR_STATE}),
+        (30, {WAR_STATE, REPORT}),
+        (40, {WAR_STATE}),
+    ]
+
+
+@pytest.mark.anyio
+async def test_overrunning_poll_skips_ticks(clock):
+    # first poll takes 25 seconds, ticks at 10 and 20 are skipped, not polled in a burst
+    poller, polls = polls_of(clock, [25.0], 4)
+    with pytest.raises(Stop):
+        await poller.run_shard("http://test")
+    assert polls == [
+        (0, {WAR_STATE, REPORT}),
+        (30, {WAR_STATE, REPORT}),
+        (40, {WAR_STATE}),
+        (50, {WAR_STATE}),
+    ]
+
+
+@pytest.mark.anyio
+async def test_crashed_shard_is_restarted(clock, monkeypatch):
+    monkeypatch.setattr(settings, "SHARD_RESTART_DELAY", 5.0)
+    poller = PollScheduler(None, ["http://a", "http://b"], {WAR_STATE: 10})
+    runs: List[Tuple[str, float]] = []
+
+    async def run_shard(base_url):
+        runs.append((base_url, clock.now))
+        if base_url == "http://b":
+            # healthy shard keeps polling
+            await asyncio.Event().wait()
+        if len([x for x in runs if x[0] == base_url]) >= 3:
+            raise Stop()
+        raise RuntimeError("War API answered garbage.")
+
+    poller.run_shard = run_shard
+    healthy = asyncio.create_task(poller.supervise_shard("http://b"))
+    with pytest.raises(Stop):
+        await poller.supervise_shard("http://a")
+    assert [x for x in runs if x[0] == "http://a"] == [
+        ("http://a", 0),
+        ("http://a", 5),
+        ("http://a", 10),
+    ]
+    assert not healthy.done()
+    healthy.cancel()
+    await asyncio.gather(healthy, return_exceptions=True)
+
+
+@pytest.mark.anyio
+async def test_hanging_poll_times_out(monkeypatch):
+    monkeypatch.setattr(settings, "SHARD_POLL_TIMEOUT", 0.01)
+
+    async def fetch_and_store_war_data(client, base_url, endpoints):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(scheduler, "fetch_and_store_war_data", fetch_and_store_war_data)
+    poller = PollScheduler(None, ["http://test"], {WAR_STATE: 10})
+    assert await poller.poll_shard("http://test", {WAR_STATE}) is None
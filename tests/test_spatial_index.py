@@ -0,0 +1,143 @@
+"""
+Spatial index: grid queries across cell and hex borders, and hex placement in the world.
+"""
+
+import math
+import random
+from typing import Any, Dict, List
+
+import pytest
+
+from src.app.core.config import settings
+from src.app.services.spatial_index import SpatialGrid, world_items
+from src.app.services.world_map import HEX_HEIGHT, HEX_WIDTH, hex_origin, project
+
+
+def item(hex_id: int, x: float, y: float) -> Dict[str, Any]:
+    return {"hex_id": hex_id, "worldX": x, "worldY": y}
+
+
+def ids(items) -> List[Any]:
+    return sorted((x["hex_id"], x["worldX"], x["worldY"]) for x in items)
+
+
+@pytest.fixture
+def items() -> List[Dict[str, Any]]:
+    rnd = random.Random(3)
+    return [
+        item(hex_id, rnd.uniform(-500, 500), rnd.uniform(-500, 500))
+        for hex_id in (1, 2, 3)
+        for _ in range(200)
+    ]
+
+
+def grid_of(items: List[Dict[str, Any]], cell_size: float = 100) -> SpatialGrid:
+    grid = SpatialGrid(cell_size)
+    for hex_id in {x["hex_id"] for x in items}:
+        grid.replace_hex(hex_id, [x for x in items if x["hex_id"] == hex_id])
+    return grid
+
+
+def test_bbox_on_cell_borders():
+    border = [item(1, 100, 100), item(2, 100, -0.0), item(1, -100, 0), item(2, 0, 0)]
+    grid = grid_of(border)
+    assert ids(grid.bbox(0, 0, 100, 100)) == ids([border[0], border[1], border[3]])
+    assert ids(grid.bbox(-100, -100, 0, 0)) == ids(border[2:])
+    assert ids(grid.bbox(100.5, 0, 200, 200)) == []
+    assert ids(grid.bbox(-1e6, -1e6, 1e6, 1e6)) == ids(border)
+
+
+@pytest.mark.parametrize(
+    "box",
+    [
+        (-50, -50, 50, 50),
+        (-250.5, 99.9, -0.1, 300),
+        (0, 0, 0, 0),
+        (-1e5, -1e5, 1e5, 1e5),  # larger than the map
+        (400, -500, 600, -400),
+    ],
+)
+def test_bbox_matches_scan(items, box):
+    x_min, y_min, x_max, y_max = box
+    expected = [
+        x
+        for x in items
+        if x_min <= x["worldX"] <= x_max and y_min <= x["worldY"] <= y_max
+    ]
+    assert ids(grid_of(items).bbox(*box)) == ids(expected)
+
+
+@pytest.mark.parametrize("center, r", [((0, 0), 150), ((95, -205), 60), ((0, 0), 0)])
+def test_radius_nearest_first(items, center, r):
+    x, y = center
+    result = grid_of(items).radius(x, y, r)
+    distances = [d for d, _ in result]
+    assert distances == sorted(distances)
+    for distance, found in result:
+        assert distance == math.hypot(found["worldX"] - x, found["worldY"] - y)
+    expected = [
+        x_ for x_ in items if math.hypot(x_["worldX"] - x, x_["worldY"] - y) <= r
+    ]
+    assert ids(x for _, x in result) == ids(expected)
+
+
+def test_replace_hex_keeps_other_hexes(items):
+    grid = grid_of(items)
+    # hexes 1 and 2 share cells, hex 1 moves away
+    moved = [item(1, 5000, 5000)]
+    grid.replace_hex(1, moved)
+    assert ids(grid.bbox(-500, -500, 500, 500)) == ids(
+        x for x in items if x["hex_id"] != 1
+    )
+    assert ids(grid.bbox(4900, 4900, 5100, 5100)) == ids(moved)
+
+    grid.replace_hex(2, [])
+    grid.replace_hex(3, [])
+    assert ids(grid.bbox(-1e6, -1e6, 1e6, 1e6)) == ids(moved)
+    # cells of removed hexes don't linger
+    assert set(grid._cells) == {grid._cell(5000, 5000)}
+
+
+def test_hex_origins():
+    assert hex_origin("DeadLandsHex") == (-HEX_WIDTH / 2, -HEX_HEIGHT / 2)
+    assert hex_origin("KingsCageHex") == pytest.approx(
+        (-2 * 0.75 * HEX_WIDTH - HEX_WIDTH / 2, -HEX_HEIGHT / 2)
+    )
+    assert hex_origin("ViperPitHex") == pytest.approx(
+        (0.75 * HEX_WIDTH - HEX_WIDTH / 2, -2 * HEX_HEIGHT)
+    )
+    assert hex_origin("NoSuchHex") is None
+    # center of Deadlands is the world origin
+    assert project("DeadLandsHex", [0.5], [0.5]) == ([0.0], [0.0])
+    assert project("NoSuchHex", [0.5], [0.5]) is None
+
+
+def test_hex_layout_override(monkeypatch):
+    monkeypatch.setattr(settings, "HEX_LAYOUT_JSON", {"NewHex": (0, 4)})
+    assert hex_origin("NewHex") == pytest.approx(
+        (-HEX_WIDTH / 2, 4 * HEX_HEIGHT - HEX_HEIGHT / 2)
+    )
+
+
+def test_neighbouring_hexes_share_edges():
+    # lower right edge of Deadlands is the upper left edge of Drowned Vale
+    dead_lands = project("DeadLandsHex", [1.0, 0.75], [0.5, 1.0])
+    drowned_vale = project("DrownedValeHex", [0.25, 0.0], [0.0, 0.5])
+    for a, b in zip(dead_lands, drowned_vale):
+        assert a == pytest.approx(b)
+
+
+def test_radius_across_hex_border():
+    # items on both sides of the vertex Deadlands shares with Drowned Vale
+    grid = SpatialGrid(settings.SPATIAL_CELL_SIZE)
+    for hex_id, name, xs, ys in [
+        (1, "DeadLandsHex", [0.99, 0.5], [0.5, 0.5]),
+        (2, "DrownedValeHex", [0.26, 0.5], [0.01, 0.5]),
+    ]:
+        items = [{"x": x, "y": y, "teamId": "NONE"} for x, y in zip(xs, ys)]
+        grid.replace_hex(
+            hex_id, world_items("dynamic", name, ({"hex_id": hex_id}, items))
+        )
+
+    result = grid.radius(HEX_WIDTH / 2, 0, 50)
+    assert [(x["hex_id"], x["x"]) for _, x in result] == [(1, 0.99), (2, 0.26)]
@@ -0,0 +1,107 @@
+"""
+State cache: hexes left out of the map list of a shard are dropped from cached responses.
+"""
+
+from datetime import datetime, timedelta
+
+import msgspec
+import pytest
+
+from src.app.database.models import REV, LatestRow, MapWarReport, Shard, WarState
+from src.app.services.state_cache import (
+    CachedBody,
+    ShardState,
+    StateCache,
+    _join,
+    prune_hexes,
+)
+
+
+def test_prune_hexes():
+    reports = {x: CachedBody(f'{{"hex_id":{x}}}'.encode(), x) for x in (1, 2, 3)}
+    state = ShardState(map_war_reports=reports, map_war_reports_all=_join(reports))
+
+    pruned = prune_hexes(state, [1, 2], 10)
+    assert pruned.map_war_reports.keys() == {1, 2}
+    assert msgspec.json.decode(pruned.map_war_reports_all.content) == [
+        {"hex_id": 1},
+        {"hex_id": 2},
+    ]
+    # the list changed at the pruning poll, not at its newest hex
+    assert pruned.map_war_reports_all.rev == 10
+    # cached state is replaced, not changed in place
+    assert state.map_war_reports.keys() == {1, 2, 3}
+
+    assert prune_hexes(state, [1, 2, 3, 4], 10).map_war_reports_all is (
+        state.map_war_reports_all
+    )
+
+
+def report(rev: int, hex_id: int) -> MapWarReport:
+    return MapWarReport(
+        REV=rev,
+        shard_id=1,
+        hex_id=hex_id,
+        totalEnlistments=0,
+        colonialCasualties=0,
+        wardenCasualties=0,
+        dayOfWar=1,
+        version=rev,
+    )
+
+
+async def store(db, rows):
+    """
+    Adds snapshots and points `LatestRow` at them, as the ingestor does.
+    """
+    db.add_all(rows)
+    await db.flush()
+    for x in rows:
+        await db.merge(
+            LatestRow(
+                shard_id=x.shard_id,
+                hex_id=getattr(x, "hex_id", 0),
+                entity=x.__tablename__,
+                row_id=x.id,
+                REV=x.REV,
+            )
+        )
+    await db.commit()
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("cached", [True, False])
+async def test_refresh_drops_hexes_of_previous_war(session_factory, cached: bool):
+    start = datetime(2025, 3, 1)
+    async with session_factory() as db:
+        revs = [REV(tmstmp=start + timedelta(minutes=x)) for x in range(2)]
+        db.add_all(revs)
+        await db.flush()
+        first, second = revs[0].REV, revs[1].REV
+        db.add(Shard(id=1, REV=first, url="http://test"))
+        await store(
+            db,
+            [WarState(REV=first, shard_id=1, warNumber=1, conquestStartTime=start)]
+            + [report(first, x) for x in (1, 2, 3)],
+        )
+
+        cache = StateCache()
+        if cached:
+            await cache.warm(db, [1])
+            assert cache.get(1).map_war_reports.keys() == {1, 2, 3}
+
+        # war 2 drops hex 3 from the map list
+        await store(
+            db,
+            [WarState(REV=second, shard_id=1, warNumber=2, conquestStartTime=start)]
+            + [report(second, x) for x in (1, 2)],
+        )
+        await cache.refresh(db, 1, second, [1, 2])
+
+    state = cache.get(1)
+    assert state.war_number == 2
+    assert state.map_war_reports.keys() == {1, 2}
+    reports = msgspec.json.decode(state.map_war_reports_all.content)
+    assert [(x["hex_id"], x["REV"]) for x in reports] == [(1, second), (2, second)]
+    assert state.map_war_reports_all.rev == second
+    assert state.rev_times.keys() == {second}
@@ -0,0 +1,214 @@
+"""
+Range reads spanning archived wars and DB: every REV is returned once and in order,
+by pages, cursors and streams, and point-in-time reads only open the wars they need.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional, Tuple
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from sqlalchemy import select  # noqa: E402
+
+from src.app.core.config import settings  # noqa: E402
+from src.app.database import crud  # noqa: E402
+from src.app.database.models import REV, MapWarReport, Shard, WarState  # noqa: E402
+from src.app.services import retention, war_archive  # noqa: E402
+from src.app.services.war_archive import WarArchive  # noqa: E402
+
+# (warNumber, hexes) per REV: war 1 has hexes 1-3, later wars only hexes 1 and 2
+WARS = [1] * 4 + [2] * 4 + [3] * 4
+HEXES = {1: [1, 2, 3], 2: [1, 2], 3: [1, 2]}
+
+Row = Tuple[int, int, int]
+
+
+def key(x: Any) -> Row:
+    if isinstance(x, dict):
+        return x["REV"], x["id"], x["hex_id"]
+    return x.REV, x.id, x.hex_id
+
+
+@pytest.fixture
+async def archive(session_factory, tmp_path, monkeypatch):
+    for module in (war_archive, retention):
+        monkeypatch.setattr(module, "AsyncSessionLocal", session_factory)
+    monkeypatch.setattr(settings, "ARCHIVE_AFTER_HOURS", 0)
+    monkeypatch.setattr(settings, "RETENTION_PAUSE", 0)
+    # row groups end within a REV
+    monkeypatch.setattr(war_archive, "_DEFAULT_ROW_GROUP_SIZE", 2)
+
+    start = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=30)
+    async with session_factory() as db:
+        revs = [REV(tmstmp=start + timedelta(hours=x)) for x in range(len(WARS))]
+        db.add_all(revs)
+        await db.flush()
+        db.add(Shard(id=1, REV=revs[0].REV, url="http://test"))
+        for rev, war in zip(revs, WARS):
+            db.add(
+                WarState(
+                    REV=rev.REV, shard_id=1, warNumber=war, conquestStartTime=start
+                )
+            )
+            for hex_id in HEXES[war]:
+                db.add(
+                    MapWarReport(
+                        REV=rev.REV,
+                        shard_id=1,
+                        hex_id=hex_id,
+                        colonialCasualties=rev.REV * 10 + hex_id,
+                    )
+                )
+        await db.commit()
+        stored = (
+            await db.execute(
+                select(MapWarReport).order_by(MapWarReport.REV, MapWarReport.id)
+            )
+        ).scalars()
+        expected = [key(x) for x in stored]
+
+    out = WarArchive(str(tmp_path / "archive"))
+    assert await out.archive_shard(1) == 2
+    async with session_factory() as db:
+        in_db = (await db.execute(select(MapWarReport.REV))).scalars().all()
+    assert min(in_db) == 9
+    assert out.archived_to(1) == 8
+
+    # manifests are read back the way the app loads them
+    loaded = WarArchive(str(tmp_path / "archive"))
+    loaded.load()
+    return loaded, expected, start
+
+
+def date_range(start: datetime, rev_from: int, rev_to: int):
+    return start + timedelta(hours=rev_from - 1), start + timedelta(hours=rev_to - 1)
+
+
+def between(expected: List[Row], rev_from: int, rev_to: int) -> List[Row]:
+    return [x for x in expected if rev_from <= x[0] <= rev_to]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("revs", [(1, 12), (3, 10), (8, 9), (2, 7), (9, 12)])
+@pytest.mark.parametrize("limit", [1, 4, 5, 100])
+async def test_pages_by_cursor(session_factory, archive, revs, limit: int):
+    archive_, expected, start = archive
+    rows: List[Row] = []
+    cursor: Optional[Tuple[int, int]] = None
+    async with session_factory() as db:
+        while True:
+            page = await archive_.list_REV(
+                db,
+                MapWarReport,
+                crud.list_map_war_reports_REV,
+                *date_range(start, *revs),
+                limit=limit,
+                cursor=cursor,
+                shard_id=1,
+            )
+            rows += [key(x) for x in page]
+            if len(page) < limit:
+                break
+            cursor = key(page[-1])[:2]
+    assert rows == between(expected, *revs)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("limit", [1, 4, 7])
+async def test_pages_by_skip(session_factory, archive, limit: int):
+    archive_, expected, start = archive
+    rows: List[Row] = []
+    async with session_factory() as db:
+        while True:
+            page = await archive_.list_REV(
+                db,
+                MapWarReport,
+                crud.list_map_war_reports_REV,
+                *date_range(start, 2, 11),
+                skip=len(rows),
+                limit=limit,
+                shard_id=1,
+            )
+            rows += [key(x) for x in page]
+            if len(page) < limit:
+                break
+    assert rows == between(expected, 2, 11)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("revs", [(1, 12), (6, 9), (1, 8), (9, 12)])
+async def test_stream(session_factory, archive, revs):
+    archive_, expected, start = archive
+    async with session_factory() as db:
+        rows = [
+            key(x)
+            async for x in archive_.stream_REV(
+                db,
+                MapWarReport,
+                crud.stream_map_war_reports_REV,
+                *date_range(start, *revs),
+                shard_id=1,
+            )
+        ]
+    assert rows == between(expected, *revs)
+
+
+@pytest.mark.anyio
+async def test_hex_filter(session_factory, archive):
+    archive_, expected, start = archive
+    async with session_factory() as db:
+        page = await archive_.list_REV(
+            db,
+            MapWarReport,
+            crud.list_map_war_reports_REV,
+            *date_range(start, 1, 12),
+            shard_id=1,
+            hex_id=3,
+        )
+    assert [key(x) for x in page] == [x for x in expected if x[2] == 3]
+
+
+@pytest.mark.anyio
+async def test_at_REV_opens_only_wars_holding_missing_hexes(
+    session_factory, archive, monkeypatch
+):
+    archive_, expected, _ = archive
+    opened: List[str] = []
+    parquet_file = pq.ParquetFile
+
+    def counting(path, *args, **kwargs):
+        opened.append(path.parent.name)
+        return parquet_file(path, *args, **kwargs)
+
+    monkeypatch.setattr(pq, "ParquetFile", counting)
+
+    def last_of(rev: int) -> List[Row]:
+        out = {}
+        for x in expected:
+            if x[0] <= rev:
+                out[x[2]] = x
+        return [out[x] for x in sorted(out)]
+
+    async with session_factory() as db:
+        # hexes 1 and 2 are in DB, hex 3 only in war 1
+        rows = await archive_.list_at_REV(
+            db, MapWarReport, crud.list_map_war_reports_at_REV, 10, shard_id=1
+        )
+        assert [key(x) for x in rows] == last_of(10)
+        assert opened == ["war_1"]
+
+        opened.clear()
+        rows = await archive_.list_at_REV(
+            db, MapWarReport, crud.list_map_war_reports_at_REV, 6, shard_id=1
+        )
+        assert [key(x) for x in rows] == last_of(6)
+        assert opened == ["war_2", "war_1"]
+
+        opened.clear()
+        rows = await archive_.list_at_REV(
+            db, MapWarReport, crud.list_map_war_reports_at_REV, 3, shard_id=1
+        )
+        assert [key(x) for x in rows] == last_of(3)
+        assert opened == ["war_1"]